@@ -0,0 +1,32 @@
+# Saving of benchmark reports and comparison with the previous run of the same benchmark
+import datetime
+import json
+import pathlib
+import statistics
+
+RESULTS_DIR = pathlib.Path(__file__).parent / 'results'
+
+
+def percentile(values: list[float], percent: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1]
+
+
+def compare(report: dict):
+    previous_runs = sorted(RESULTS_DIR.glob(f'{report["name"]}-*.json'))
+    if not previous_runs:
+        return
+    previous = json.loads(previous_runs[-1].read_text(encoding='utf-8'))
+    print(f'Compared to {previous_runs[-1].name}:')
+    for key, value in report.items():
+        if isinstance(value, float) and isinstance(previous.get(key), (int, float)) and previous[key]:
+            change = (value - previous[key]) / previous[key] * 100
+            print(f'  {key:<28} {previous[key]:>14.4f} -> {value:>14.4f} ({change:+.1f}%)')
+
+
+def save(report: dict) -> pathlib.Path:
+    RESULTS_DIR.mkdir(exist_ok=True)
+    path = RESULTS_DIR / f'{report["name"]}-{datetime.datetime.now():%Y%m%d-%H%M%S}.json'
+    path.write_text(json.dumps(report, indent=2), encoding='utf-8')
+    return path
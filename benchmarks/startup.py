@@ -0,0 +1,58 @@
+# Measures how long the monitor takes to start, every scenario runs in a fresh interpreter, e.g.:
+# PYTHONPATH=src python benchmarks/startup.py --runs 20
+import argparse
+import datetime
+import json
+import pathlib
+import subprocess
+import sys
+import time
+
+from reports import compare, percentile, save
+
+SETTINGS = pathlib.Path(__file__).parent.parent / 'example_settings.yaml'
+
+SCENARIOS = {
+    # bare interpreter, the floor for everything else
+    'python': ['-c', 'pass'],
+    'help': ['-m', 'monitor.main', '--help'],
+    'validate': ['-m', 'monitor.main', '--settings', str(SETTINGS), '--validate'],
+    # everything a real run imports before the loop starts
+    'import_monitor': ['-c', 'import monitor.monitor, monitor.sharded_monitor'],
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Startup time benchmark of the monitor')
+    parser.add_argument('--runs', type=int, default=10, help='Number of runs of every scenario')
+    parser.add_argument('--name', default='startup', help='Name of the run in the results directory')
+    return parser.parse_args()
+
+
+def measure(arguments: list[str], runs: int) -> list[float]:
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *arguments], check=True, stdout=subprocess.DEVNULL)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def main():
+    args = parse_args()
+    report: dict = {
+        'name': args.name,
+        'finished_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'parameters': vars(args),
+    }
+    for scenario, arguments in SCENARIOS.items():
+        durations = measure(arguments, args.runs)
+        report[f'{scenario}_p50_seconds'] = percentile(durations, 50)
+        report[f'{scenario}_p90_seconds'] = percentile(durations, 90)
+    print(json.dumps(report, indent=2))
+    compare(report)
+    print(f'Saved to {save(report)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# Measures how long settings with large lists of websites take to load and how much memory they take, every load
+# runs in a fresh interpreter, e.g.:
+# PYTHONPATH=src python benchmarks/targets_load.py --sizes 1000 10000 100000
+import argparse
+import csv
+import datetime
+import json
+import pathlib
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+from reports import compare, percentile, save
+
+DB_SETTINGS = {'period': 5, 'max_batch_size': 1000}
+# websites in the settings file itself, with the loader used before and the libyaml one,
+# and the same websites as targets in separate files
+SCENARIOS = ('yaml_loader', 'yaml_csafe', 'csv', 'jsonl')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Load time benchmark of large website lists')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='Numbers of websites to load')
+    parser.add_argument('--runs', type=int, default=3, help='Number of runs of every scenario')
+    parser.add_argument('--name', default='targets_load', help='Name of the run in the results directory')
+    parser.add_argument('--measure', nargs=2, metavar=('SCENARIO', 'PATH'), help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def website(index: int) -> dict:
+    row = {'url': f'https://site-{index}.example.com/page', 'period': 5 + index % 295}
+    if index % 2:
+        row['regexp'] = f'marker-{index}'
+    return row
+
+
+def write_files(directory: pathlib.Path, size: int) -> dict[str, pathlib.Path]:
+    websites = [website(index) for index in range(size)]
+    inline = directory / 'inline.yaml'
+    inline.write_text(yaml.safe_dump({'db': DB_SETTINGS, 'websites': websites}), encoding='utf-8')
+    with open(directory / 'targets.csv', 'w', newline='', encoding='utf-8') as targets_file:
+        writer = csv.DictWriter(targets_file, fieldnames=['url', 'period', 'regexp'])
+        writer.writeheader()
+        writer.writerows(websites)
+    (directory / 'targets.jsonl').write_text(''.join(json.dumps(row) + '\n' for row in websites), encoding='utf-8')
+    paths = {'yaml_loader': inline, 'yaml_csafe': inline}
+    for source in ('csv', 'jsonl'):
+        settings = {'db': DB_SETTINGS, 'targets': {'source': source, 'path': str(directory / f'targets.{source}')}}
+        paths[source] = directory / f'{source}.yaml'
+        paths[source].write_text(yaml.safe_dump(settings), encoding='utf-8')
+    return paths
+
+
+def measure(scenario: str, path: str):
+    # imports are not a part of the load, startup benchmark covers them
+    from monitor.main import read_settings  # pylint: disable = import-outside-toplevel
+    from monitor.serializers import MonitorSettings  # pylint: disable = import-outside-toplevel
+
+    start = time.perf_counter()
+    if scenario == 'yaml_loader':
+        with open(path, 'r', encoding='utf-8') as settings_file:
+            settings = MonitorSettings(**yaml.load(stream=settings_file, Loader=yaml.Loader))
+    else:
+        settings = read_settings(path)
+    duration = time.perf_counter() - start
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({'seconds': duration, 'rss_mb': rss, 'websites': len(settings.websites)}))
+
+
+def run(scenario: str, path: pathlib.Path) -> dict:
+    output = subprocess.run(
+        [sys.executable, __file__, '--measure', scenario, str(path)], check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    args = parse_args()
+    if args.measure:
+        measure(*args.measure)
+        return
+    report: dict = {
+        'name': args.name,
+        'finished_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'parameters': vars(args),
+    }
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            paths = write_files(pathlib.Path(directory), size)
+            for scenario in SCENARIOS:
+                runs = [run(scenario, paths[scenario]) for _ in range(args.runs)]
+                assert all(result['websites'] == size for result in runs)
+                report[f'{scenario}_{size}_p50_seconds'] = percentile([result['seconds'] for result in runs], 50)
+                report[f'{scenario}_{size}_max_rss_mb'] = float(max(result['rss_mb'] for result in runs))
+    print(json.dumps(report, indent=2))
+    compare(report)
+    print(f'Saved to {save(report)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+# Runs the monitor against a local web farm and reports how much it sustains, e.g.:
+# python benchmarks/throughput.py --urls 5000 --period 5 --duration 60
+import argparse
+import datetime
+import json
+import os
+import random
+import resource
+import signal
+import socket
+import tempfile
+import time
+import urllib.parse
+
+import dotenv
+
+from monitor.monitor import Monitor
+from monitor.serializers import MonitorSettings, DbConnectionSettings, MonitoringResult, RollupResult, SinkType
+from monitor.sink import Sink
+from monitor.utils import LOOPS, setup_loop
+from monitor.worker import DbWorker
+from monitor.worker.website_worker import FETCH_DURATION
+from reports import compare, percentile, save
+from web_farm import start_farm, MARKER
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Throughput and latency benchmark of the monitor')
+    parser.add_argument('--urls', type=int, default=1000, help='Number of monitored URLs')
+    parser.add_argument('--hosts', type=int, default=10, help='Number of web farm ports the URLs are spread over')
+    parser.add_argument('--period', type=float, default=5, help='Check period of every URL')
+    parser.add_argument('--duration', type=int, default=30, help='Benchmark duration, seconds')
+    parser.add_argument('--latency', type=float, default=0.05, help='Mean response latency of the farm, seconds')
+    parser.add_argument('--body-size', type=int, default=16 * 1024, help='Response body size, bytes')
+    parser.add_argument('--regexp-ratio', type=float, default=0.5, help='Share of URLs checked with a regexp')
+    parser.add_argument('--error-ratio', type=float, default=0.05, help='Share of URLs answering with 500')
+    parser.add_argument('--hang-ratio', type=float, default=0.01, help='Share of URLs never answering')
+    parser.add_argument('--sink', choices=('stub', *SinkType), default='stub',
+                        help='Where results go, stub measures the monitor without any storage costs')
+    parser.add_argument('--sink-path', default=None,
+                        help='Database file or directory of the local sinks, a temporary one by default')
+    parser.add_argument('--envfile', default='.test.env', help='Postgres credentials for the postgres sink')
+    parser.add_argument('--name', default='throughput', help='Name of the run in the results directory')
+    parser.add_argument('--loop', choices=LOOPS, default='asyncio', help='Event loop implementation')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def get_free_ports(count: int) -> list[int]:
+    sockets = []
+    for _ in range(count):
+        server_socket = socket.socket(socket.AF_INET, type=socket.SOCK_STREAM)
+        server_socket.bind(('127.0.0.1', 0))
+        sockets.append(server_socket)
+    ports = [server_socket.getsockname()[1] for server_socket in sockets]
+    for server_socket in sockets:
+        server_socket.close()
+    return ports
+
+
+def make_websites(args, ports: list[int]) -> list[dict]:
+    rng = random.Random(args.seed)
+    websites = []
+    for i in range(args.urls):
+        query = {
+            'latency': round(rng.expovariate(1 / args.latency), 4) if args.latency else 0,
+            'status': 500 if rng.random() < args.error_ratio else 200,
+            'size': args.body_size,
+            'hang': int(rng.random() < args.hang_ratio),
+        }
+        website = {
+            'url': f'http://127.0.0.1:{ports[i % len(ports)]}/site/{i}?{urllib.parse.urlencode(query)}',
+            'period': args.period,
+        }
+        if rng.random() < args.regexp_ratio:
+            website['regexp'] = MARKER.decode()
+        websites.append(website)
+    return websites
+
+
+def get_rss() -> int:
+    try:
+        with open('/proc/self/statm', encoding='utf-8') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # max RSS is the best we can get without procfs, it's in kilobytes on linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Recorder:
+    def __init__(self):
+        self.results: list[MonitoringResult] = []
+        self.write_latencies: list[float] = []
+        self.flush_times: list[float] = []
+
+    def record(self, entries: list[MonitoringResult], flush_time: float):
+        now = datetime.datetime.now()
+        self.results.extend(entries)
+        self.write_latencies.extend((now - entry.timestamp).total_seconds() for entry in entries)
+        self.flush_times.append(flush_time)
+
+
+class StubSink(Sink):
+    # measures the monitor without any storage costs
+    async def write(self, entries: list[MonitoringResult]):
+        pass
+
+    async def write_rollups(self, results: list[RollupResult]):
+        pass
+
+
+class BenchmarkDbWorker(DbWorker):
+    recorder = Recorder()
+
+    async def _write(self, entries: list[MonitoringResult]):
+        start = time.monotonic()
+        await super()._write(entries)
+        self.recorder.record(entries, time.monotonic() - start)
+
+
+class BenchmarkMonitor(Monitor):
+    stub = True
+
+    def _setup_sink(self) -> Sink:
+        if self.stub:
+            return StubSink()
+        return super()._setup_sink()
+
+    def _setup_db_workers(self) -> list[DbWorker]:
+        return [
+            BenchmarkDbWorker(
+                connection_settings=self._db_connection_settings,
+                worker_settings=self._settings.db,
+                queue=self._queue,
+                name=f'BenchmarkDbWorker-{i}',
+                sink=self._sink,
+            )
+            for i in range(self._settings.db.writers)
+        ]
+
+
+def get_jitter(results: list[MonitoringResult], period: float) -> list[float]:
+    # deviation of the actual interval between two checks of the same URL from the configured period
+    by_url: dict[str, list[datetime.datetime]] = {}
+    for result in results:
+        by_url.setdefault(result.url, []).append(result.timestamp)
+    jitter = []
+    for timestamps in by_url.values():
+        timestamps.sort()
+        intervals = ((later - earlier).total_seconds() for earlier, later in zip(timestamps, timestamps[1:]))
+        jitter.extend(abs(interval - period) for interval in intervals)
+    return jitter
+
+
+def make_report(args, monitor: Monitor, recorder: Recorder, duration: float, rss_delta: int) -> dict:
+    jitter = get_jitter(recorder.results, args.period)
+    # checks are counted as they are made, rows only once the sink has written them, so a sink that falls behind
+    # shows up as the difference of the two
+    checks = FETCH_DURATION.count
+    return {
+        'name': args.name,
+        'finished_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'parameters': vars(args),
+        'checks': checks,
+        'checks_per_second': checks / duration,
+        'expected_checks_per_second': args.urls / args.period,
+        'db_rows': len(recorder.results),
+        'db_rows_per_second': len(recorder.results) / duration,
+        'jitter_p50': percentile(jitter, 50),
+        'jitter_p99': percentile(jitter, 99),
+        'scheduling_lag_mean': monitor.scheduler.lag.mean,
+        'scheduling_lag_max': monitor.scheduler.lag.max,
+        'latency_to_db_p50': percentile(recorder.write_latencies, 50),
+        'latency_to_db_p99': percentile(recorder.write_latencies, 99),
+        'flush_time_p50': percentile(recorder.flush_times, 50),
+        'flush_time_p99': percentile(recorder.flush_times, 99),
+        'rss_per_url_bytes': rss_delta / args.urls,
+    }
+
+
+def main():
+    args = parse_args()
+    ports = get_free_ports(args.hosts)
+    farm = start_farm('127.0.0.1', ports)
+    time.sleep(1)
+
+    temporary_directory = tempfile.TemporaryDirectory()  # pylint: disable = consider-using-with
+    db_settings: dict = {'period': 1, 'max_batch_size': 1000}
+    if args.sink in (SinkType.SQLITE, SinkType.FILES):
+        default_path = os.path.join(temporary_directory.name, 'results.db' if args.sink == SinkType.SQLITE else '')
+        db_settings.update(sink=args.sink, path=args.sink_path or default_path)
+    settings = MonitorSettings(
+        db=db_settings,
+        websites=make_websites(args, ports),
+        scheduler={'concurrency': 1000},
+        http={'limit': 1000},
+    )
+    db_connection_settings = None
+    if args.sink == SinkType.POSTGRES:
+        dotenv.load_dotenv(args.envfile)
+        db_connection_settings = DbConnectionSettings()
+    BenchmarkMonitor.stub = args.sink == 'stub'
+
+    setup_loop(args.loop)
+    rss_before = get_rss()
+    monitor = BenchmarkMonitor(settings=settings, db_connection_settings=db_connection_settings)
+    signal.signal(signal.SIGALRM, lambda _signum, _stack_frame: monitor.stop())
+    signal.alarm(args.duration)
+    start = time.monotonic()
+    monitor.run()
+    duration = time.monotonic() - start
+    rss_delta = get_rss() - rss_before
+    farm.terminate()
+    temporary_directory.cleanup()
+
+    report = make_report(args, monitor, BenchmarkDbWorker.recorder, duration, rss_delta)
+    print(json.dumps(report, indent=2))
+    compare(report)
+    print(f'Saved to {save(report)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+# Local stand-in for the websites: every request is answered according to its query parameters, e.g.
+# /site/1?latency=0.05&status=200&size=1024&hang=0
+import asyncio
+import multiprocessing
+
+from aiohttp import web
+
+MARKER = b'benchmark marker'
+
+
+async def handle(request: web.Request) -> web.Response:
+    query = request.query
+    if query.get('hang') == '1':
+        # never answers, the monitor has to time out
+        await asyncio.sleep(3600)
+    await asyncio.sleep(float(query.get('latency', 0)))
+    size = int(query.get('size', 0))
+    return web.Response(status=int(query.get('status', 200)), body=b'x' * size + MARKER)
+
+
+async def serve(host: str, ports: list[int]):
+    app = web.Application()
+    app.router.add_get('/{tail:.*}', handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    for port in ports:
+        await web.TCPSite(runner, host=host, port=port, backlog=4096).start()
+    await asyncio.Event().wait()
+
+
+def run_farm(host: str, ports: list[int]):
+    asyncio.run(serve(host, ports))
+
+
+def start_farm(host: str, ports: list[int]) -> multiprocessing.Process:
+    # separate process, so the farm doesn't eat CPU of the monitor under test
+    process = multiprocessing.get_context('spawn').Process(target=run_farm, args=(host, ports), daemon=True)
+    process.start()
+    return process
@@ -0,0 +1,27 @@
+from .pool import ConnectionPool
+from .schema import (
+    Schema,
+    PartitionedSchema,
+    create_schema,
+    schema_lock,
+    insert_statement,
+    Columns,
+    COLUMN_TYPES,
+    TABLE_NAME,
+    PARTITIONED_TABLE_NAME,
+    URLS_TABLE_NAME,
+)
+
+__all__ = [
+    'ConnectionPool',
+    'Schema',
+    'PartitionedSchema',
+    'create_schema',
+    'schema_lock',
+    'insert_statement',
+    'Columns',
+    'COLUMN_TYPES',
+    'TABLE_NAME',
+    'PARTITIONED_TABLE_NAME',
+    'URLS_TABLE_NAME',
+]
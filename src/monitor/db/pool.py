@@ -0,0 +1,69 @@
+import asyncio
+import contextlib
+from typing import AsyncIterator, Optional
+
+import aiopg
+import psycopg2
+
+from monitor.serializers import DbWorkerSettings
+from monitor.utils import logger
+
+# errors after which the connection (and most likely the whole pool) is not usable anymore
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class ConnectionPool:
+    def __init__(self, dsn: str, settings: DbWorkerSettings):
+        self._dsn = dsn
+        self._settings = settings
+        self._pool: Optional[aiopg.Pool] = None
+        self._lock = asyncio.Lock()
+
+    async def _get_pool(self) -> aiopg.Pool:
+        # lock, so concurrent users don't open a pool each
+        async with self._lock:
+            if self._pool is None or self._pool.closed:
+                logger.info('Opening DB connection pool')
+                self._pool = await aiopg.create_pool(
+                    dsn=self._dsn,
+                    minsize=self._settings.pool_min_size,
+                    maxsize=self._settings.pool_max_size,
+                    pool_recycle=self._settings.pool_recycle,
+                )
+        return self._pool
+
+    @contextlib.asynccontextmanager
+    async def cursor(self) -> AsyncIterator[aiopg.Cursor]:
+        try:
+            pool = await self._get_pool()
+            async with pool.acquire() as conn:
+                async with conn.cursor() as cursor:
+                    yield cursor
+        except CONNECTION_ERRORS:
+            # server has gone away or the network broke, start over with a fresh pool next time
+            await self.reset()
+            raise
+
+    async def check(self) -> bool:
+        try:
+            async with self.cursor() as cursor:
+                await cursor.execute('SELECT 1')
+        except psycopg2.Error as error:
+            logger.error('DB health check failed. %s: %s', error.__class__.__name__, error)
+            return False
+        return True
+
+    async def reset(self):
+        if self._pool is None:
+            return
+        pool, self._pool = self._pool, None
+        # connections may be in use or broken, so don't wait for them to be released gracefully
+        pool.terminate()
+        await pool.wait_closed()
+
+    async def close(self):
+        if self._pool is None:
+            return
+        pool, self._pool = self._pool, None
+        pool.close()
+        await pool.wait_closed()
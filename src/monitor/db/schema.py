@@ -0,0 +1,214 @@
+import contextlib
+import datetime
+import enum
+from typing import AsyncIterator, Iterable, Sequence
+
+import aiopg
+
+from monitor.serializers import DbWorkerSettings, InsertMode, MonitoringResult, PartitionInterval, SchemaMode
+from monitor.utils import logger
+
+TABLE_NAME = 'monitoring'
+PARTITIONED_TABLE_NAME = 'monitoring_partitioned'
+URLS_TABLE_NAME = 'urls'
+
+# any constant works, it only has to be the same for everybody who changes the schema
+SCHEMA_LOCK_ID = 0x6d6f6e69
+
+
+class Columns(enum.StrEnum):
+    URL = enum.auto()
+    TIME_STAMP = enum.auto()
+    STATUS_CODE = enum.auto()
+    RESPONSE_TIME = enum.auto()
+    REGEXP_MATCH = enum.auto()
+    DNS_TIME = enum.auto()
+    CONNECT_TIME = enum.auto()
+    TTFB = enum.auto()
+    BODY_TIME = enum.auto()
+
+
+COLUMN_TYPES = {
+    Columns.URL: 'VARCHAR(256)',
+    Columns.TIME_STAMP: 'timestamp',
+    Columns.STATUS_CODE: 'INT',
+    Columns.RESPONSE_TIME: 'FLOAT',
+    Columns.REGEXP_MATCH: 'BOOLEAN',
+    Columns.DNS_TIME: 'FLOAT',
+    Columns.CONNECT_TIME: 'FLOAT',
+    Columns.TTFB: 'FLOAT',
+    Columns.BODY_TIME: 'FLOAT',
+}
+
+# partitioned table refers to the urls table instead of storing the url on every row
+PARTITIONED_COLUMN_TYPES: dict[str, str] = {
+    'url_id': 'INT',
+    **{column: column_type for column, column_type in COLUMN_TYPES.items() if column != Columns.URL},
+}
+
+
+@contextlib.asynccontextmanager
+async def schema_lock(cursor: aiopg.Cursor) -> AsyncIterator[None]:
+    # CREATE ... IF NOT EXISTS isn't safe when several writers run it at the same time
+    await cursor.execute('SELECT pg_advisory_lock(%s)', (SCHEMA_LOCK_ID,))
+    try:
+        yield
+    finally:
+        await cursor.execute('SELECT pg_advisory_unlock(%s)', (SCHEMA_LOCK_ID,))
+
+
+def insert_statement(table: str, column_types: dict, rows: Sequence[tuple], mode: InsertMode) -> tuple[str, list]:
+    # values are always passed as parameters, so there is no hand-made escaping of the data
+    columns = ','.join(column_types)
+    if mode == InsertMode.UNNEST:
+        # statement doesn't depend on the batch size, postgres turns the arrays back into rows
+        arrays = ','.join(f'%s::{column_type}[]' for column_type in column_types.values())
+        command = f'INSERT INTO {table} ({columns}) SELECT * FROM unnest({arrays})'
+        return command, [list(column) for column in zip(*rows)]
+
+    placeholders = '(' + ','.join(['%s'] * len(column_types)) + ')'
+    command = f'INSERT INTO {table} ({columns}) VALUES ' + ','.join([placeholders] * len(rows))
+    return command, [value for row in rows for value in row]
+
+
+def partition_bounds(day: datetime.date, interval: PartitionInterval) -> tuple[datetime.date, datetime.date]:
+    if interval == PartitionInterval.DAY:
+        return day, day + datetime.timedelta(days=1)
+    start = day.replace(day=1)
+    # 32 days after the first day of a month is always somewhere in the next one
+    return start, (start + datetime.timedelta(days=32)).replace(day=1)
+
+
+def partition_name(start: datetime.date) -> str:
+    return f'{PARTITIONED_TABLE_NAME}_p{start:%Y%m%d}'
+
+
+class Schema:
+    # single plain table, every row carries its url
+    def __init__(self, settings: DbWorkerSettings):
+        self._settings = settings
+
+    async def setup(self, cursor: aiopg.Cursor):
+        columns = ', '.join(f'{column} {column_type}' for column, column_type in COLUMN_TYPES.items())
+        async with schema_lock(cursor):
+            await cursor.execute(f'CREATE TABLE IF NOT EXISTS {TABLE_NAME} ({columns})')
+            # tables created before some of the columns were introduced
+            for column, column_type in COLUMN_TYPES.items():
+                await cursor.execute(f'ALTER TABLE {TABLE_NAME} ADD COLUMN IF NOT EXISTS {column} {column_type}')
+
+    async def insert(self, cursor: aiopg.Cursor, rows: list[MonitoringResult]):
+        # results are tuples with fields in the order of columns already
+        await cursor.execute(*insert_statement(TABLE_NAME, COLUMN_TYPES, rows, self._settings.insert_mode))
+
+
+class PartitionedSchema(Schema):
+    # table partitioned by time, so old data is dropped by partitions and queries only touch the relevant ones
+    def __init__(self, settings: DbWorkerSettings):
+        super().__init__(settings)
+        self._url_ids: dict[str, int] = {}
+        # lower bounds of the partitions known to exist
+        self._partitions: set[datetime.date] = set()
+
+    async def setup(self, cursor: aiopg.Cursor):
+        columns = ', '.join(f'{column} {column_type}' for column, column_type in PARTITIONED_COLUMN_TYPES.items())
+        async with schema_lock(cursor):
+            await cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {URLS_TABLE_NAME} (id SERIAL PRIMARY KEY, url TEXT NOT NULL UNIQUE)'
+            )
+            await cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {PARTITIONED_TABLE_NAME} ({columns}) '
+                f'PARTITION BY RANGE ({Columns.TIME_STAMP})'
+            )
+            # btree serves "one url over time" queries, tiny BRIN is enough to skip blocks by time in wide scans
+            await cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {PARTITIONED_TABLE_NAME}_url_id_time_stamp_idx '
+                f'ON {PARTITIONED_TABLE_NAME} (url_id, {Columns.TIME_STAMP})'
+            )
+            await cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {PARTITIONED_TABLE_NAME}_time_stamp_brin_idx '
+                f'ON {PARTITIONED_TABLE_NAME} USING brin ({Columns.TIME_STAMP})'
+            )
+            self._partitions = await self._existing_partitions(cursor)
+        # DB might have been recreated, so nothing cached before can be trusted
+        self._url_ids.clear()
+        await self._ensure_partitions(cursor, [datetime.date.today()])
+
+    async def insert(self, cursor: aiopg.Cursor, rows: list[MonitoringResult]):
+        # results may come from the spill long after they were made, no point to bring back dropped partitions
+        rows = [row for row in rows if not self._expired(row.timestamp.date())]
+        if not rows:
+            return
+        await self._resolve_urls(cursor, {row.url for row in rows})
+        await self._ensure_partitions(cursor, {row.timestamp.date() for row in rows})
+        # url is replaced with its id, the rest of the fields are in the order of columns already
+        values = [(self._url_ids[row.url], *row[1:]) for row in rows]
+        await cursor.execute(
+            *insert_statement(PARTITIONED_TABLE_NAME, PARTITIONED_COLUMN_TYPES, values, self._settings.insert_mode)
+        )
+
+    async def _resolve_urls(self, cursor: aiopg.Cursor, urls: set[str]):
+        # sorted, so concurrent writers lock the same new urls in the same order
+        missing = sorted(url for url in urls if url not in self._url_ids)
+        if not missing:
+            return
+        await cursor.execute(
+            f'INSERT INTO {URLS_TABLE_NAME} (url) SELECT unnest(%s::text[]) ON CONFLICT (url) DO NOTHING', (missing,)
+        )
+        await cursor.execute(f'SELECT url, id FROM {URLS_TABLE_NAME} WHERE url = ANY(%s)', (missing,))
+        self._url_ids.update(await cursor.fetchall())
+
+    async def _existing_partitions(self, cursor: aiopg.Cursor) -> set[datetime.date]:
+        await cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE parent.relname = %s',
+            (PARTITIONED_TABLE_NAME,),
+        )
+        partitions = set()
+        for (name,) in await cursor.fetchall():
+            try:
+                partitions.add(datetime.datetime.strptime(name.rsplit('_p', 1)[-1], '%Y%m%d').date())
+            except ValueError:
+                # partitions attached by hand are left alone
+                continue
+        return partitions
+
+    async def _ensure_partitions(self, cursor: aiopg.Cursor, days: Iterable[datetime.date]):
+        interval = self._settings.partition_interval
+        missing = {partition_bounds(day, interval) for day in days}
+        missing = {(start, end) for start, end in missing if start not in self._partitions}
+        if not missing:
+            return
+        async with schema_lock(cursor):
+            for start, end in sorted(missing):
+                logger.info('Creating partition %s', partition_name(start))
+                await cursor.execute(
+                    f'CREATE TABLE IF NOT EXISTS {partition_name(start)} PARTITION OF {PARTITIONED_TABLE_NAME} '
+                    'FOR VALUES FROM (%s) TO (%s)',
+                    (start.isoformat(), end.isoformat()),
+                )
+                self._partitions.add(start)
+            # new partition means the time has moved on, so some of the old ones may be due for removal
+            await self._drop_expired(cursor)
+
+    async def _drop_expired(self, cursor: aiopg.Cursor):
+        for start in sorted(self._partitions):
+            if not self._expired(start):
+                continue
+            logger.info('Dropping expired partition %s', partition_name(start))
+            await cursor.execute(f'DROP TABLE IF EXISTS {partition_name(start)}')
+            self._partitions.discard(start)
+
+    def _expired(self, day: datetime.date) -> bool:
+        # partition is expired only when all of its rows are older than retention
+        if self._settings.retention_days is None:
+            return False
+        _, end = partition_bounds(day, self._settings.partition_interval)
+        return end <= datetime.date.today() - datetime.timedelta(days=self._settings.retention_days)
+
+
+def create_schema(settings: DbWorkerSettings) -> Schema:
+    if settings.schema_mode == SchemaMode.PARTITIONED:
+        return PartitionedSchema(settings)
+    return Schema(settings)
@@ -0,0 +1,19 @@
+from .circuit_breaker import CircuitBreaker, BreakerState
+from .host_limiter import HostLimiter
+from .matcher import StreamingMatcher
+from .regexp_engine import RegexpEngine, ProcessRegexpEngine, create_regexp_engine
+from .session_pool import SessionPool
+from .tracing import PhaseTimer, create_trace_config
+
+__all__ = [
+    'SessionPool',
+    'HostLimiter',
+    'CircuitBreaker',
+    'BreakerState',
+    'StreamingMatcher',
+    'RegexpEngine',
+    'ProcessRegexpEngine',
+    'create_regexp_engine',
+    'PhaseTimer',
+    'create_trace_config',
+]
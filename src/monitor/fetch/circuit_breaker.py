@@ -0,0 +1,75 @@
+import enum
+import logging
+
+from monitor.metrics import registry
+from monitor.serializers import BreakerSettings
+from monitor.utils import logger
+
+BREAKER_TRANSITIONS = registry.counter(
+    'monitor_breaker_transitions_total', 'State changes of circuit breakers of websites', ('from_state', 'to_state')
+)
+
+
+class BreakerState(enum.StrEnum):
+    # website is checked with its own period
+    CLOSED = enum.auto()
+    # website keeps failing, so it is checked less often
+    OPEN = enum.auto()
+    # check of a failing website is running, it decides whether the circuit closes or stays open
+    HALF_OPEN = enum.auto()
+
+
+# open circuits are worth a warning, probes run all the time while a website is down
+TRANSITION_LOG_LEVELS = {
+    BreakerState.CLOSED: logging.INFO,
+    BreakerState.OPEN: logging.WARNING,
+    BreakerState.HALF_OPEN: logging.DEBUG,
+}
+
+
+class CircuitBreaker:
+    # After a number of failures in a row the circuit opens and every next failed check stretches the period,
+    # the first successful check closes the circuit and brings the period back.
+    def __init__(self, settings: BreakerSettings, name: str):
+        self._settings = settings
+        self._name = name
+        self._state = BreakerState.CLOSED
+        self._failures = 0
+        self._backoff = 1.0
+
+    @property
+    def state(self) -> BreakerState:
+        return self._state
+
+    def period(self, period: float) -> float:
+        if self._state == BreakerState.CLOSED:
+            return period
+        # websites configured with a longer period than the cap are never checked more often because of it
+        return min(period * self._backoff, max(self._settings.max_period, period))
+
+    def before_check(self):
+        if self._state == BreakerState.OPEN:
+            self._move(BreakerState.HALF_OPEN)
+
+    def record(self, success: bool):
+        if success:
+            self._failures = 0
+            if self._state != BreakerState.CLOSED:
+                self._backoff = 1.0
+                self._move(BreakerState.CLOSED)
+            return
+        self._failures += 1
+        if self._state == BreakerState.HALF_OPEN:
+            self._backoff *= self._settings.backoff
+            self._move(BreakerState.OPEN)
+        elif self._state == BreakerState.CLOSED and self._failures >= self._settings.failures:
+            self._backoff = self._settings.backoff
+            self._move(BreakerState.OPEN)
+
+    def _move(self, state: BreakerState):
+        logger.log(
+            TRANSITION_LOG_LEVELS[state], 'Circuit of %s: %s -> %s after %s failures in a row',
+            self._name, self._state, state, self._failures,
+        )
+        BREAKER_TRANSITIONS.inc(labels=(self._state, state))
+        self._state = state
@@ -0,0 +1,43 @@
+import asyncio
+import collections
+import time
+
+from monitor.metrics import registry
+
+HOST_WAIT = registry.histogram('monitor_host_wait_seconds', 'Time checks wait for a free slot of their host')
+
+
+class HostLimiter:
+    # Caps the number of concurrent checks of every host, the rest of the checks of the host wait in line.
+    # Unlike limit_per_host of the connector, the waiting happens before the request and its timeout start.
+    def __init__(self, limit: int):
+        self._limit = limit
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        # holders and waiters of every host, the semaphore is dropped as soon as nobody uses it
+        self._users: collections.Counter[str] = collections.Counter()
+
+    def __len__(self) -> int:
+        return len(self._semaphores)
+
+    async def acquire(self, host: str):
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._semaphores[host] = asyncio.Semaphore(self._limit)
+        self._users[host] += 1
+        start = time.monotonic()
+        try:
+            await semaphore.acquire()
+        except asyncio.CancelledError:
+            self._forget(host)
+            raise
+        HOST_WAIT.observe(time.monotonic() - start)
+
+    def release(self, host: str):
+        self._semaphores[host].release()
+        self._forget(host)
+
+    def _forget(self, host: str):
+        self._users[host] -= 1
+        if not self._users[host]:
+            del self._users[host]
+            del self._semaphores[host]
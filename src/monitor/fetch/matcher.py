@@ -0,0 +1,48 @@
+import codecs
+import re
+import time
+from typing import Optional
+
+from monitor.metrics import registry
+
+from .regexp_engine import RegexpEngine
+
+REGEXP_DURATION = registry.histogram('monitor_regexp_duration_seconds', 'Duration of a single regexp search')
+
+
+class StreamingMatcher:
+    def __init__(self, regexp: re.Pattern, overlap: int, engine: RegexpEngine, encoding: str = 'utf-8'):
+        self._regexp = regexp
+        self._overlap = overlap
+        self._engine = engine
+        try:
+            self._decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        except LookupError:
+            self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        # decoded text that isn't searched yet, starting with the end of the previously searched text,
+        # so matches crossing the chunk border aren't lost
+        self._buffer = ''
+
+    async def feed(self, chunk: bytes) -> Optional[bool]:
+        # False means there is no answer yet and more of the body is worth feeding
+        self._buffer += self._decoder.decode(chunk)
+        # small chunks are collected into batches, so the engine isn't bothered for every one of them
+        if len(self._buffer) < self._engine.batch_size:
+            return False
+        return await self._search()
+
+    async def finish(self) -> Optional[bool]:
+        # flushes whatever is left in the decoder, e.g. an incomplete character at the end of the body
+        self._buffer += self._decoder.decode(b'', True)
+        return await self._search()
+
+    async def _search(self) -> Optional[bool]:
+        text = self._buffer
+        start = time.monotonic()
+        found = await self._engine.search(self._regexp, text)
+        REGEXP_DURATION.observe(time.monotonic() - start)
+        if found is not False:
+            # either found or the search took too long, the rest of the body won't change that
+            return found
+        self._buffer = text[-self._overlap:] if self._overlap else ''
+        return False
@@ -0,0 +1,202 @@
+import asyncio
+import functools
+import itertools
+import multiprocessing
+import multiprocessing.connection
+import multiprocessing.pool
+import multiprocessing.synchronize
+import os
+import re
+from typing import Optional
+
+from monitor.serializers import RegexpSettings, RegexpEngineType
+from monitor.utils import logger
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile(pattern: str, flags: int) -> re.Pattern:
+    return re.compile(pattern, flags)
+
+
+# pool processes report on the events pipe when they are up and when they start a search
+READY = -1
+# events pipe and its lock, set up in every pool process
+_reporter: dict = {}
+
+
+def _init_process(events: multiprocessing.connection.Connection, lock: multiprocessing.synchronize.Lock):
+    _reporter.update(events=events, lock=lock)
+    _report(READY)
+
+
+def _report(event: int):
+    # processes share the pipe, so messages are sent one at a time
+    with _reporter['lock']:
+        _reporter['events'].send(event)
+
+
+def _search(search_id: int, pattern: str, flags: int, text: str) -> bool:
+    # runs in a pool process, where every pattern is compiled only once
+    regexp = _compile(pattern, flags)
+    # time spent waiting for a free process doesn't count, the budget starts here
+    _report(search_id)
+    return regexp.search(text) is not None
+
+
+class RegexpEngine:
+    # default engine, searches in the default thread pool of the loop
+    def __init__(self, batch_size: int = 64 * 1024):
+        self._batch_size = batch_size
+
+    @property
+    def batch_size(self) -> int:
+        # minimal amount of characters worth to be sent for a search at once
+        return self._batch_size
+
+    async def search(self, regexp: re.Pattern, text: str) -> Optional[bool]:
+        # None means the search took too long and it's not known whether the regexp is there
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, regexp.search, text) is not None
+
+    def close(self):
+        pass
+
+
+def _resolve(future: asyncio.Future, result: Optional[bool]):
+    if not future.done():
+        future.set_result(result)
+
+
+def _reject(future: asyncio.Future, error: BaseException):
+    if not future.done():
+        future.set_exception(error)
+
+
+class PoolRestarted(Exception):
+    # search was lost along with the pool, which was replaced because of another search
+    pass
+
+
+class _SearchPool:
+    # pool of processes along with the searches sent to it and the pipe its processes report on
+    # pylint: disable = too-many-instance-attributes
+    def __init__(self, processes: int):
+        context = multiprocessing.get_context('spawn')
+        self.events, self._writer = context.Pipe(duplex=False)
+        # multiprocessing pool rather than an executor, since it is able to terminate a runaway search
+        self.pool = context.Pool(
+            processes=processes, initializer=_init_process, initargs=(self._writer, context.Lock())
+        )
+        # processes start right away, searches are sent once all of them are up
+        self.starting = processes
+        self.ready = asyncio.Event()
+        # loop that reads the events, set with the first search
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.searches: dict[int, asyncio.Future] = {}
+        self.deadlines: dict[int, asyncio.TimerHandle] = {}
+
+    def finish(self, search_id: int) -> Optional[asyncio.Future]:
+        deadline = self.deadlines.pop(search_id, None)
+        if deadline is not None:
+            deadline.cancel()
+        return self.searches.pop(search_id, None)
+
+    def discard(self):
+        # searches still running are lost, they are made again in the pool that replaces this one
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.remove_reader(self.events.fileno())
+        for search_id in list(self.searches):
+            future = self.finish(search_id)
+            if future is not None:
+                _reject(future, PoolRestarted())
+
+    def terminate(self):
+        self.pool.terminate()
+        self.events.close()
+        self._writer.close()
+
+
+class ProcessRegexpEngine(RegexpEngine):
+    # searches in separate processes, so heavy patterns neither hold the GIL nor stall the loop
+    def __init__(self, settings: RegexpSettings):
+        super().__init__(batch_size=settings.batch_size)
+        self._timeout = settings.timeout
+        self._processes = settings.processes or os.cpu_count() or 1
+        # processes are spawned right away, so they are warm by the time the first body arrives
+        self._pool = _SearchPool(self._processes)
+        self._search_ids = itertools.count()
+
+    async def search(self, regexp: re.Pattern, text: str) -> Optional[bool]:
+        while True:
+            try:
+                return await self._search(regexp, text)
+            except PoolRestarted:
+                continue
+
+    def close(self):
+        self._pool.discard()
+        self._pool.terminate()
+
+    async def _search(self, regexp: re.Pattern, text: str) -> Optional[bool]:
+        loop = asyncio.get_running_loop()
+        pool = self._pool
+        if pool.loop is None:
+            pool.loop = loop
+            loop.add_reader(pool.events.fileno(), self._read_events, pool)
+        await pool.ready.wait()
+        if pool is not self._pool:
+            raise PoolRestarted()
+
+        search_id = next(self._search_ids)
+        future = loop.create_future()
+        pool.searches[search_id] = future
+        # callbacks are called from the result handler thread of the pool
+        pool.pool.apply_async(
+            _search,
+            (search_id, regexp.pattern, regexp.flags, text),
+            callback=lambda result: loop.call_soon_threadsafe(self._finish, pool, search_id, result),
+            error_callback=lambda error: loop.call_soon_threadsafe(self._fail, pool, search_id, error),
+        )
+        found = await future
+        if found is None:
+            logger.warning('Regexp %r took longer than %s seconds, result is unknown', regexp.pattern, self._timeout)
+        return found
+
+    def _read_events(self, pool: _SearchPool):
+        loop = asyncio.get_running_loop()
+        while pool.events.poll():
+            event = pool.events.recv()
+            if event == READY:
+                pool.starting -= 1
+                if pool.starting <= 0:
+                    pool.ready.set()
+            elif event in pool.searches:
+                pool.deadlines[event] = loop.call_later(self._timeout, self._expire, pool, event)
+
+    def _finish(self, pool: _SearchPool, search_id: int, result: bool):
+        future = pool.finish(search_id)
+        if future is not None:
+            _resolve(future, result)
+
+    def _fail(self, pool: _SearchPool, search_id: int, error: BaseException):
+        future = pool.finish(search_id)
+        if future is not None:
+            _reject(future, error)
+
+    def _expire(self, pool: _SearchPool, search_id: int):
+        # the search itself can't be interrupted and would keep its process busy until it's done, so the whole pool
+        # is replaced, other searches lost along with it are made again in the new one
+        future = pool.finish(search_id)
+        if future is not None:
+            _resolve(future, None)
+        if pool is self._pool:
+            self._pool = _SearchPool(self._processes)
+            pool.discard()
+            # terminate waits for the processes to exit, so it's done aside from the loop
+            asyncio.get_running_loop().run_in_executor(None, pool.terminate)
+
+
+def create_regexp_engine(settings: RegexpSettings) -> RegexpEngine:
+    if settings.engine == RegexpEngineType.PROCESS:
+        return ProcessRegexpEngine(settings)
+    return RegexpEngine(batch_size=settings.batch_size)
@@ -0,0 +1,34 @@
+import ssl
+from typing import Optional
+
+import aiohttp
+
+from monitor.serializers import HttpSettings
+from .tracing import create_trace_config
+
+
+# One session (hence one connection pool and one SSL context) shared by all website workers
+class SessionPool:
+    def __init__(self, settings: HttpSettings):
+        self._settings = settings
+        self._ssl_context: ssl.SSLContext | bool = ssl.create_default_context() if settings.verify_ssl else False
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # session has to be created inside the running loop, hence it is created lazily
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self._settings.limit,
+                limit_per_host=self._settings.limit_per_host,
+                keepalive_timeout=self._settings.keepalive_timeout,
+                ttl_dns_cache=self._settings.dns_cache_ttl,
+                ssl=self._ssl_context,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, trace_configs=[create_trace_config()])
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,62 @@
+import time
+from typing import Optional
+
+import aiohttp
+
+
+class PhaseTimer:
+    # Monotonic timestamps of the phases of a single request, filled in by the trace config hooks
+    def __init__(self):
+        self._marks: dict[str, float] = {}
+
+    def mark(self, event: str):
+        self._marks[event] = time.monotonic()
+
+    def between(self, start: str, end: str) -> Optional[float]:
+        if start not in self._marks or end not in self._marks:
+            return None
+        return self._marks[end] - self._marks[start]
+
+    @property
+    def dns_time(self) -> Optional[float]:
+        # None when the address was cached or the connection was reused
+        return self.between('dns_start', 'dns_end')
+
+    @property
+    def connect_time(self) -> Optional[float]:
+        # TCP and TLS handshakes, aiohttp resolves the host while creating the connection, so DNS is subtracted
+        connect_time = self.between('connect_start', 'connect_end')
+        if connect_time is None:
+            return None
+        return connect_time - (self.dns_time or 0)
+
+    @property
+    def ttfb(self) -> Optional[float]:
+        # from the moment the connection is ready to the response headers
+        start = 'connect_end' if 'connect_end' in self._marks else 'request_start'
+        return self.between(start, 'headers')
+
+    @property
+    def body_time(self) -> Optional[float]:
+        return self.between('headers', 'body_end')
+
+
+def _mark(event: str):
+    async def hook(_session: aiohttp.ClientSession, context, _params):
+        timer = context.trace_request_ctx
+        if isinstance(timer, PhaseTimer):
+            timer.mark(event)
+    return hook
+
+
+def create_trace_config() -> aiohttp.TraceConfig:
+    # timer of a request is passed as `trace_request_ctx`
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(_mark('request_start'))
+    trace_config.on_dns_resolvehost_start.append(_mark('dns_start'))
+    trace_config.on_dns_resolvehost_end.append(_mark('dns_end'))
+    trace_config.on_connection_create_start.append(_mark('connect_start'))
+    trace_config.on_connection_create_end.append(_mark('connect_end'))
+    # sent as soon as the response headers are received
+    trace_config.on_request_end.append(_mark('headers'))
+    return trace_config
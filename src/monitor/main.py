@@ -1,16 +1,18 @@
 # pragma: nocover
 
 import argparse
+import datetime
 import logging
-import signal
 import sys
+from typing import TYPE_CHECKING
 
-import dotenv
-import yaml
+from monitor.utils import logger, LOOPS, setup_loop, setup_reload, setup_shutdown
 
-from monitor.monitor import Monitor
-from monitor.serializers import MonitorSettings, DbConnectionSettings
-from monitor.utils import logger
+# Only what `--help` needs is imported upfront, the rest is imported once it's clear what is going to be run,
+# so validating settings doesn't load the HTTP and DB stack.
+# pylint: disable = import-outside-toplevel
+if TYPE_CHECKING:
+    from monitor.serializers import MonitorSettings, DbConnectionSettings
 
 
 def parse_args():
@@ -20,49 +22,142 @@ def parse_args():
                         help='Set logging level to DEBUG')
     parser.add_argument('--envfile', required=False, help='Path to environment file with credentials of postgres',
                         default='.test.env')
+    parser.add_argument('--processes', required=False, type=int, default=1,
+                        help='Number of processes to split the websites between')
+    parser.add_argument('--loop', required=False, choices=LOOPS, default='asyncio',
+                        help='Event loop implementation, uvloop falls back to asyncio when it is not installed')
+    parser.add_argument('--validate', required=False, action='store_true',
+                        help='Only check the settings file and exit')
     return parser.parse_args()
 
 
-def setup_shutdown(monitor: Monitor):
-    def sig_handler(_signum, _stack_frame):
-        monitor.stop()
+def parse_report_args(argv: list[str]):
+    # separate command with arguments of its own, `monitor --settings ...` still runs the monitor
+    from monitor.report import REPORT_FORMATS
+    from monitor.serializers import SchemaMode
+
+    now = datetime.datetime.now()
+    parser = argparse.ArgumentParser(prog='monitor report', description='Availability and response times per url')
+    parser.add_argument('--since', required=False, type=datetime.datetime.fromisoformat,
+                        default=now - datetime.timedelta(days=1),
+                        help='Start of the reported period in ISO format, a day ago by default')
+    parser.add_argument('--until', required=False, type=datetime.datetime.fromisoformat, default=now,
+                        help='End of the reported period in ISO format, now by default')
+    parser.add_argument('--url', required=False, action='append', dest='urls',
+                        help='Url to report on, can be repeated, all urls by default')
+    parser.add_argument('--schema', required=False, type=SchemaMode, choices=list(SchemaMode),
+                        default=SchemaMode.PLAIN, help='Schema mode the results were written with')
+    parser.add_argument('--summary', required=False, action='store_true',
+                        help='Refresh the hourly summary and use it for whole hours, percentiles are approximate')
+    parser.add_argument('--format', required=False, choices=REPORT_FORMATS, default='csv', dest='report_format',
+                        help='Output format')
+    parser.add_argument('--verbose', required=False, action='store_true',
+                        help='Set logging level to DEBUG')
+    parser.add_argument('--envfile', required=False, help='Path to environment file with credentials of postgres',
+                        default='.test.env')
+    return parser.parse_args(argv)
 
-    signal.signal(signalnum=signal.SIGINT, handler=sig_handler)
 
+def read_settings(path: str) -> 'MonitorSettings':
+    import yaml
 
-def main():
-    # I don't really want to pull here neither YAML, nor pydantic exceptions
-    # pylint: disable = broad-exception-caught
-    args = parse_args()
+    from monitor.serializers import MonitorSettings
 
-    logger_level = logging.DEBUG if args.verbose else logging.INFO
-    logger.setLevel(logger_level)
+    # libyaml is many times faster than the pure python loader, settings are plain data, so the safe one is enough
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    with open(path, 'r', encoding='utf-8') as settings_file:
+        yaml_settings = yaml.load(stream=settings_file, Loader=loader)
+    logger.debug('Parsed settings: %s', yaml_settings)
+    settings = MonitorSettings(**yaml_settings)
+    if settings.targets is not None:
+        from monitor.targets import load_targets
+
+        websites = [*settings.websites, *load_targets(settings.targets)]
+        settings = settings.model_copy(update={'websites': websites})
+    return settings
+
+
+def load_environment(envfile: str):
+    import dotenv
+
+    dotenv.load_dotenv(envfile)
+
+
+def read_db_connection_settings() -> 'DbConnectionSettings':
+    # I don't really want to pull here pydantic exceptions
+    # pylint: disable = broad-exception-caught
+    from monitor.serializers import DbConnectionSettings
 
     try:
-        with open(args.settings, 'r', encoding='utf-8') as settings_file:
-            yaml_settings = yaml.load(stream=settings_file, Loader=yaml.Loader)
+        # all the fields come from the environment
+        return DbConnectionSettings()  # type: ignore[call-arg]
     except Exception as error:
-        logger.error('Failed to read settings file. %s: %s', error.__class__.__name__, error)
+        logger.error('Failed to get DB connection settings. %s: %s', error.__class__.__name__, error)
         sys.exit(1)
 
-    logger.debug('Parsed settings: %s', yaml_settings)
 
-    dotenv.load_dotenv(args.envfile)
+def report(argv: list[str]):
+    args = parse_report_args(argv)
+    logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    load_environment(args.envfile)
+    db_connection_settings = read_db_connection_settings()
 
+    from monitor.report import Report, TimeRange, write_report
+
+    monitor_report = Report(dsn=db_connection_settings.dsn, schema_mode=args.schema, urls=args.urls)
     try:
-        settings = MonitorSettings(**yaml_settings)
-    except Exception as error:
-        logger.error('Failed to parse settings file. %s: %s', error.__class__.__name__, error)
-        sys.exit(1)
+        results = monitor_report.results(TimeRange(args.since, args.until), summary=args.summary)
+        write_report(results, sys.stdout, args.report_format)
+    finally:
+        monitor_report.close()
+
+
+def main():
+    # I don't really want to pull here neither YAML, nor pydantic exceptions
+    # pylint: disable = broad-exception-caught
+    if sys.argv[1:2] == ['report']:
+        report(sys.argv[2:])
+        return
+
+    args = parse_args()
+
+    logger_level = logging.DEBUG if args.verbose else logging.INFO
+    logger.setLevel(logger_level)
+    # targets may be read from the DB, so credentials are needed to read the settings already
+    load_environment(args.envfile)
 
     try:
-        db_connection_settings = DbConnectionSettings()
+        settings = read_settings(args.settings)
     except Exception as error:
-        logger.error('Failed to get DB connection settings. %s: %s', error.__class__.__name__, error)
+        logger.error('Failed to read settings file. %s: %s', error.__class__.__name__, error)
         sys.exit(1)
 
-    monitor = Monitor(settings=settings, db_connection_settings=db_connection_settings)
+    if args.validate:
+        logger.info('Settings are valid, %s websites', len(settings.websites))
+        return
+
+    from monitor.serializers import SinkType
+
+    # local sinks run without a database server, so there are no credentials to read
+    db_connection_settings = read_db_connection_settings() if settings.db.sink == SinkType.POSTGRES else None
+
+    from monitor.monitor import Monitor
+    from monitor.sharded_monitor import ShardedMonitor
+
+    loop = setup_loop(args.loop)
+    monitor: Monitor | ShardedMonitor
+    if args.processes > 1:
+        monitor = ShardedMonitor(
+            settings=settings,
+            db_connection_settings=db_connection_settings,
+            processes=args.processes,
+            loop=loop,
+        )
+    else:
+        monitor = Monitor(settings=settings, db_connection_settings=db_connection_settings)
     setup_shutdown(monitor)
+    # SIGHUP re-reads the same file, websites are updated without restarting the monitor
+    setup_reload(monitor, lambda: read_settings(args.settings))
 
     monitor.run()
 
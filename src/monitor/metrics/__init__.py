@@ -0,0 +1,11 @@
+from .registry import Counter, Gauge, Histogram, Registry, registry
+from .server import MetricsServer
+
+__all__ = [
+    'Counter',
+    'Gauge',
+    'Histogram',
+    'Registry',
+    'registry',
+    'MetricsServer',
+]
@@ -0,0 +1,146 @@
+import math
+from typing import Callable, Optional
+
+Labels = tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+def _format_labels(names: Labels, values: Labels, extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:  # pylint: disable = too-few-public-methods
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+    def render(self) -> list[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}', *self._samples()]
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError  # pragma: nocover
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, labels: Labels = ()):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, labels: Labels = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def _samples(self) -> list[str]:
+        return [
+            f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+            for labels, value in self._values.items()
+        ]
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[Labels, float] = {}
+        # for values that are cheaper to read when asked, e.g. queue size
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, labels: Labels = ()):
+        self._values[labels] = value
+
+    def set_function(self, function: Callable[[], float]):
+        self._function = function
+
+    def get(self, labels: Labels = ()) -> float:
+        if self._function is not None:
+            return self._function()
+        return self._values.get(labels, 0)
+
+    def _samples(self) -> list[str]:
+        if self._function is not None:
+            return [f'{self.name} {_format_value(self._function())}']
+        return [
+            f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+            for labels, value in self._values.items()
+        ]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self._buckets = (*sorted(buckets), math.inf)
+        self._counts = [0] * len(self._buckets)
+        self._sum = 0.0
+
+    @property
+    def count(self) -> int:
+        return self._counts[-1]
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    def observe(self, value: float):
+        self._sum += value
+        for i, bound in enumerate(self._buckets):
+            # buckets are cumulative
+            if value <= bound:
+                self._counts[i] += 1
+
+    def _samples(self) -> list[str]:
+        samples = [
+            f'{self.name}_bucket{{le="{_format_value(bound)}"}} {count}'
+            for bound, count in zip(self._buckets, self._counts)
+        ]
+        samples.append(f'{self.name}_sum {_format_value(self._sum)}')
+        samples.append(f'{self.name}_count {self.count}')
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def counter(self, name: str, documentation: str, labelnames: Labels = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Labels = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f'Metric {metric.name} is already registered')
+        self._metrics[metric.name] = metric
+        return metric
+
+
+registry = Registry()
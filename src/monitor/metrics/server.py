@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+from aiohttp import web
+
+from monitor.serializers import MetricsSettings
+from monitor.utils import logger
+from .registry import registry
+
+LOOP_LAG = registry.gauge('monitor_event_loop_lag_seconds', 'How late the event loop wakes up a sleeping coroutine')
+
+
+class MetricsServer:  # pylint: disable = too-few-public-methods
+    # Serves the metrics in the Prometheus text format and keeps an eye on the event loop lag
+    def __init__(self, settings: MetricsSettings):
+        self._settings = settings
+
+    async def run(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self._handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, host=self._settings.host, port=self._settings.port).start()
+            logger.info('Serving metrics on http://%s:%s/metrics', self._settings.host, self._settings.port)
+            await self._measure_loop_lag()
+        except asyncio.CancelledError:
+            logger.info('Metrics server is stopped')
+        finally:
+            await runner.cleanup()
+
+    async def _measure_loop_lag(self):
+        interval = self._settings.loop_lag_interval
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(interval)
+            LOOP_LAG.set(max(time.monotonic() - start - interval, 0))
+
+    @staticmethod
+    async def _handle(_request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(), content_type='text/plain', charset='utf-8')
@@ -1,44 +1,204 @@
 import asyncio
+import itertools
+import multiprocessing.connection
+from typing import Callable, Optional
 
-from monitor.serializers import MonitorSettings, DbConnectionSettings
+from monitor.fetch import SessionPool, HostLimiter, create_regexp_engine
+from monitor.metrics import MetricsServer, registry
+from monitor.rollup import Rollup
+from monitor.serializers import MonitorSettings, DbConnectionSettings, WebsiteSetting
+from monitor.sink import Sink, create_sink
+from monitor.spill import ResultsQueue, SpillLog, SpillingQueue
 from monitor.utils import logger
-from monitor.worker import WebsiteWorker, DbWorker
+from monitor.worker import WebsiteWorker, DbWorker, Scheduler
+
+QUEUE_DEPTH = registry.gauge('monitor_queue_depth', 'Number of results waiting to be written')
 
 
 class Monitor:
-    def __init__(self, settings: MonitorSettings, db_connection_settings: DbConnectionSettings):
+    # monitor is the place where all the parts are wired together, so it naturally holds quite a few of them
+    # pylint: disable = too-many-instance-attributes
+
+    def __init__(self, settings: MonitorSettings, db_connection_settings: Optional[DbConnectionSettings] = None):
         self._settings = settings
         self._db_connection_settings = db_connection_settings
-        self._queue: asyncio.Queue = asyncio.Queue(maxsize=len(settings.websites) * 2)
+        self._queue = self._setup_queue()
+        QUEUE_DEPTH.set_function(self._queue.qsize)
+        self._session_pool = SessionPool(settings.http)
+        self._regexp_engine = create_regexp_engine(settings.regexp)
+        self._sink = self._setup_sink()
+        limiter = HostLimiter(settings.http.checks_per_host) if settings.http.checks_per_host else None
+        self._scheduler = Scheduler(settings=settings.scheduler, limiter=limiter)
+        self._rollup = Rollup(settings.rollup) if settings.rollup is not None else None
+        self._worker_ids = itertools.count()
 
         self._website_workers = self._setup_website_workers()
+        # workers which are scheduled, the rest of them are fetched for by these ones
+        self._leaders: set[WebsiteWorker] = set()
+        self._regroup()
         self._db_workers = self._setup_db_workers()
         self._tasks: list[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reloads: Optional[multiprocessing.connection.Connection] = None
+        # reloads are applied one at a time, so the latest settings are applied last
+        self._reload_lock = asyncio.Lock()
+        self._reload_tasks: set[asyncio.Task] = set()
 
-    def _setup_db_workers(self) -> list[DbWorker]:
-        worker = DbWorker(
-            connection_settings=self._db_connection_settings,
-            worker_settings=self._settings.db,
-            queue=self._queue
+    @property
+    def scheduler(self) -> Scheduler:
+        return self._scheduler
+
+    def _queue_size(self, websites: int) -> int:
+        # a couple of results of every website, and at least a full batch for every writer, so the queue
+        # isn't unbounded for a shard started without websites
+        return max(websites * 2, self._settings.db.max_batch_size * self._settings.db.writers)
+
+    def _setup_queue(self) -> ResultsQueue:
+        maxsize = self._queue_size(len(self._settings.websites))
+        if self._settings.spill is None:
+            return ResultsQueue(maxsize=maxsize)
+        return SpillingQueue(
+            spill=SpillLog(self._settings.spill), maxsize=maxsize, batch_size=self._settings.db.max_batch_size
         )
-        return [worker]
 
-    def _setup_website_workers(self) -> list[WebsiteWorker]:
+    def _setup_sink(self) -> Sink:
+        # connection settings are needed only by the postgres sink
+        return create_sink(self._settings.db, self._db_connection_settings, rollups=self._settings.rollup is not None)
+
+    def _setup_db_workers(self) -> list[DbWorker]:
         workers = []
-        for i, setting in enumerate(self._settings.websites):
-            worker = WebsiteWorker(settings=setting, queue=self._queue, name=f'WebsiteWorker-{i}')
+        for i in range(self._settings.db.writers):
+            worker = DbWorker(
+                connection_settings=self._db_connection_settings,
+                worker_settings=self._settings.db,
+                queue=self._queue,
+                name=f'DbWorker-{i}',
+                sink=self._sink,
+                rollup=self._rollup,
+            )
             workers.append(worker)
         return workers
 
+    def _setup_website_workers(self) -> list[WebsiteWorker]:
+        return [self._add_website_worker(setting) for setting in self._settings.websites]
+
+    def _add_website_worker(self, setting: WebsiteSetting) -> WebsiteWorker:
+        worker = WebsiteWorker(
+            settings=setting,
+            queue=self._queue,
+            name=f'WebsiteWorker-{next(self._worker_ids)}',
+            session_pool=self._session_pool,
+            regexp_engine=self._regexp_engine,
+            rollup=self._rollup,
+            breaker=self._settings.breaker,
+        )
+        return worker
+
+    def _regroup(self):
+        # checks of the same url share a request, the most frequent of them is scheduled and fetches for the rest
+        groups: dict[tuple, list[WebsiteWorker]] = {}
+        for worker in self._website_workers:
+            groups.setdefault((str(worker.settings.url), worker.settings.check_mode), []).append(worker)
+        leaders = set()
+        for group in groups.values():
+            # current leader keeps its place when periods are equal, so its schedule isn't reset
+            leader, *followers = sorted(group, key=lambda worker: (worker.settings.period, worker not in self._leaders))
+            leader.set_followers(followers)
+            for follower in followers:
+                follower.set_followers([])
+            leaders.add(leader)
+        for worker in self._leaders - leaders:
+            self._scheduler.remove(worker)
+        for worker in leaders - self._leaders:
+            self._scheduler.add(worker)
+        self._leaders = leaders
+
+    def reload_from(self, load_settings: Callable[[], Optional[MonitorSettings]]):
+        # usually called from a signal handler, which may interrupt the loop anywhere, so the changes are applied
+        # by the loop itself in between the tasks; e.g. targets are read from a DB for a while, so settings are
+        # loaded in a thread and the checks go on
+        if self._loop is None:
+            if (settings := load_settings()) is not None:
+                self._apply_settings(settings)
+        else:
+            self._loop.call_soon_threadsafe(self._start_reload, load_settings)
+
+    def _start_reload(self, load_settings: Callable[[], Optional[MonitorSettings]]):
+        task = asyncio.create_task(self._load_settings(load_settings))
+        # loop keeps only weak references to the tasks
+        self._reload_tasks.add(task)
+        task.add_done_callback(self._reload_tasks.discard)
+
+    async def _load_settings(self, load_settings: Callable[[], Optional[MonitorSettings]]):
+        async with self._reload_lock:
+            settings = await asyncio.to_thread(load_settings)
+            if settings is not None:
+                self._apply_settings(settings)
+
+    def receive_reloads(self, reloads: multiprocessing.connection.Connection):
+        # settings sent by another process, e.g. to a shard by its parent, they are read by the loop as they come
+        self._reloads = reloads
+
+    def _receive_settings(self, reloads: multiprocessing.connection.Connection):
+        try:
+            settings = reloads.recv()
+        except EOFError:
+            # sender is gone, nothing is going to come anymore
+            if self._loop is not None:
+                self._loop.remove_reader(reloads.fileno())
+            return
+        self._apply_settings(settings)
+
+    def _apply_settings(self, settings: MonitorSettings):
+        if settings.model_dump(exclude={'websites'}) != self._settings.model_dump(exclude={'websites'}):
+            logger.warning('Only websites are reloaded, restart the monitor to apply the rest of the settings')
+        # the same url may be checked with different regexps or even several times with the same one
+        running: dict[tuple, list[WebsiteWorker]] = {}
+        for worker in self._website_workers:
+            running.setdefault(worker.key, []).append(worker)
+        workers = []
+        added = retuned = 0
+        for setting in settings.websites:
+            same = running.get((str(setting.url), setting.regexp))
+            if same:
+                worker = same.pop()
+                if worker.settings != setting:
+                    worker.update(setting)
+                    retuned += 1
+            else:
+                worker = self._add_website_worker(setting)
+                added += 1
+            workers.append(worker)
+        removed = [worker for left in running.values() for worker in left]
+        self._website_workers = workers
+        self._regroup()
+        self._queue.resize(self._queue_size(len(workers)))
+        self._settings = self._settings.model_copy(update={'websites': settings.websites})
+        logger.info('Settings reloaded: %s websites added, %s removed, %s retuned', added, len(removed), retuned)
+
     def run(self):
         asyncio.run(self._run())
 
     async def _run(self):
         logger.info('Running monitor')
-        for worker in [*self._db_workers, *self._website_workers]:
-            task = asyncio.create_task(worker.run())
+        self._loop = asyncio.get_running_loop()
+        if self._reloads is not None:
+            self._loop.add_reader(self._reloads.fileno(), self._receive_settings, self._reloads)
+        # website workers aren't run on their own, all the checks are dispatched by the scheduler
+        runnables: list = [*self._db_workers, self._scheduler]
+        if self._settings.metrics is not None:
+            runnables.append(MetricsServer(self._settings.metrics))
+        for runnable in runnables:
+            task = asyncio.create_task(runnable.run())
             self._tasks.append(task)
-        await asyncio.gather(*self._tasks)
+        try:
+            await asyncio.gather(*self._tasks)
+        finally:
+            await self._session_pool.close()
+            await self._sink.close()
+            self._regexp_engine.close()
+            if isinstance(self._queue, SpillingQueue):
+                self._queue.close()
         logger.info('Monitor completed')
 
     def stop(self):
@@ -0,0 +1,10 @@
+from .queries import TimeRange, SUMMARY_TABLE_NAME
+from .report import Report, REPORT_FORMATS, write_report
+
+__all__ = [
+    'Report',
+    'REPORT_FORMATS',
+    'write_report',
+    'TimeRange',
+    'SUMMARY_TABLE_NAME',
+]
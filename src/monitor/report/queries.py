@@ -0,0 +1,198 @@
+import datetime
+import math
+from typing import NamedTuple, Optional
+
+from monitor.db import Columns, TABLE_NAME, PARTITIONED_TABLE_NAME, URLS_TABLE_NAME
+from monitor.serializers import SchemaMode
+
+SUMMARY_TABLE_NAME = 'monitoring_summary'
+SUMMARY_COLUMN_TYPES = {
+    'url': 'TEXT',
+    'hour': 'timestamp',
+    'status_code': 'INT',
+    'bucket': 'INT',
+    'checks': 'BIGINT',
+    'total_response_time': 'FLOAT',
+    'min_response_time': 'FLOAT',
+    'max_response_time': 'FLOAT',
+}
+
+# buckets of response times are the same as in the rollup sketch, so are the guarantees on percentiles
+SUMMARY_ACCURACY = 0.01
+# response times that are practically zero, they don't have a log() bucket
+ZERO_BUCKET = -2 ** 31
+MIN_RESPONSE_TIME = 1e-9
+
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+class TimeRange(NamedTuple):
+    start: datetime.datetime
+    end: datetime.datetime
+
+
+def log_gamma(accuracy: float = SUMMARY_ACCURACY) -> float:
+    return math.log((1 + accuracy) / (1 - accuracy))
+
+
+def raw_rows(schema_mode: SchemaMode, name: str, urls: bool) -> str:
+    # time range goes right next to the table, so postgres skips partitions and BRIN ranges outside of it
+    time_stamp = f'results.{Columns.TIME_STAMP}'
+    condition = f'{time_stamp} >= %({name}_start)s AND {time_stamp} < %({name}_end)s'
+    columns = f'{time_stamp}, results.{Columns.STATUS_CODE}, results.{Columns.RESPONSE_TIME}'
+    if schema_mode == SchemaMode.PARTITIONED:
+        url = f'{URLS_TABLE_NAME}.url'
+        source = f'{PARTITIONED_TABLE_NAME} results JOIN {URLS_TABLE_NAME} ON {URLS_TABLE_NAME}.id = results.url_id'
+    else:
+        url = f'results.{Columns.URL}'
+        source = f'{TABLE_NAME} results'
+    if urls:
+        condition += f' AND {url} = ANY(%(urls)s)'
+    return f'SELECT {url} AS url, {columns} FROM {source} WHERE {condition}'
+
+
+def bucket_expression() -> str:
+    return (
+        f'CASE WHEN {Columns.RESPONSE_TIME} < {MIN_RESPONSE_TIME} THEN {ZERO_BUCKET} '
+        f'ELSE ceil(ln({Columns.RESPONSE_TIME}) / %(log_gamma)s)::INT END'
+    )
+
+
+def percentile_columns(count: int) -> str:
+    return ', '.join(f'percentiles[{index}]' for index in range(1, count + 1))
+
+
+def exact_report(schema_mode: SchemaMode, urls: bool) -> str:
+    # Everything is aggregated by postgres, only a row per url comes back. Source is read twice instead of being
+    # materialized, so nothing of the size of the raw data is kept around even on the server.
+    percentiles = ', '.join(str(level) for level in PERCENTILES)
+    return f'''
+        WITH source AS NOT MATERIALIZED ({raw_rows(schema_mode, 'raw', urls)}),
+        latencies AS (
+            SELECT url, count(*) AS checks, count(*) FILTER (WHERE {Columns.STATUS_CODE} < 400) AS available,
+                min({Columns.RESPONSE_TIME}) AS min_response_time,
+                max({Columns.RESPONSE_TIME}) AS max_response_time,
+                avg({Columns.RESPONSE_TIME}) AS mean_response_time,
+                percentile_cont(ARRAY[{percentiles}]) WITHIN GROUP (ORDER BY {Columns.RESPONSE_TIME}) AS percentiles
+            FROM source GROUP BY url
+        ),
+        statuses AS (
+            SELECT url, jsonb_object_agg({Columns.STATUS_CODE}, checks) AS statuses
+            FROM (SELECT url, {Columns.STATUS_CODE}, count(*) AS checks FROM source GROUP BY 1, 2) counts
+            GROUP BY url
+        )
+        SELECT url, %(raw_start)s, %(raw_end)s, checks, available::FLOAT / checks, statuses,
+            min_response_time, max_response_time, mean_response_time, {percentile_columns(len(PERCENTILES))}
+        FROM latencies JOIN statuses USING (url)
+        ORDER BY url
+    '''
+
+
+def bucketed_raw_rows(schema_mode: SchemaMode, name: str, urls: bool) -> str:
+    return f'''
+        SELECT url, date_trunc('hour', {Columns.TIME_STAMP}) AS hour, {Columns.STATUS_CODE},
+            {bucket_expression()} AS bucket, count(*) AS checks,
+            sum({Columns.RESPONSE_TIME}) AS total_response_time,
+            min({Columns.RESPONSE_TIME}) AS min_response_time,
+            max({Columns.RESPONSE_TIME}) AS max_response_time
+        FROM ({raw_rows(schema_mode, name, urls)}) raw
+        GROUP BY 1, 2, 3, 4
+    '''
+
+
+def summary_rows(urls: bool) -> str:
+    condition = 'hour >= %(summary_start)s AND hour < %(summary_end)s'
+    if urls:
+        condition += ' AND url = ANY(%(urls)s)'
+    return f'SELECT {", ".join(SUMMARY_COLUMN_TYPES)} FROM {SUMMARY_TABLE_NAME} WHERE {condition}'
+
+
+def summary_report(schema_mode: SchemaMode, urls: bool) -> str:
+    # Whole hours come from the summary, the edges of the range from the raw rows bucketed the same way.
+    # Percentiles are found by the running count of the merged buckets, same as the sketch does it.
+    percentiles = ', '.join(
+        f'min(bucket) FILTER (WHERE seen > {level} * (total - 1))' for level in PERCENTILES
+    )
+    bucket_values = ', '.join(
+        f'CASE WHEN percentiles[{index}] = {ZERO_BUCKET} THEN 0 ELSE least(greatest('
+        f'2 * exp(percentiles[{index}] * %(log_gamma)s) / (exp(%(log_gamma)s) + 1), '
+        'min_response_time), max_response_time) END'
+        for index in range(1, len(PERCENTILES) + 1)
+    )
+    return f'''
+        WITH buckets AS (
+            {summary_rows(urls)}
+            UNION ALL {bucketed_raw_rows(schema_mode, 'head', urls)}
+            UNION ALL {bucketed_raw_rows(schema_mode, 'tail', urls)}
+        ),
+        ranked AS (
+            SELECT url, bucket, sum(checks) OVER (PARTITION BY url ORDER BY bucket) AS seen,
+                sum(checks) OVER (PARTITION BY url) AS total
+            FROM (SELECT url, bucket, sum(checks) AS checks FROM buckets GROUP BY 1, 2) merged
+        ),
+        quantiles AS (
+            SELECT url, ARRAY[{percentiles}] AS percentiles FROM ranked GROUP BY url
+        ),
+        latencies AS (
+            SELECT url, sum(checks) AS checks, coalesce(sum(checks) FILTER (WHERE {Columns.STATUS_CODE} < 400), 0)
+                    AS available,
+                min(min_response_time) AS min_response_time,
+                max(max_response_time) AS max_response_time,
+                sum(total_response_time) / sum(checks) AS mean_response_time
+            FROM buckets GROUP BY url
+        ),
+        statuses AS (
+            SELECT url, jsonb_object_agg({Columns.STATUS_CODE}, checks) AS statuses
+            FROM (SELECT url, {Columns.STATUS_CODE}, sum(checks) AS checks FROM buckets GROUP BY 1, 2) counts
+            GROUP BY url
+        )
+        SELECT url, %(head_start)s, %(tail_end)s, checks, available::FLOAT / checks, statuses,
+            min_response_time, max_response_time, mean_response_time, {bucket_values}
+        FROM latencies JOIN statuses USING (url) JOIN quantiles USING (url)
+        ORDER BY url
+    '''
+
+
+def create_summary() -> list[str]:
+    columns = ', '.join(f'{column} {column_type}' for column, column_type in SUMMARY_COLUMN_TYPES.items())
+    return [
+        f'CREATE TABLE IF NOT EXISTS {SUMMARY_TABLE_NAME} ({columns})',
+        f'CREATE INDEX IF NOT EXISTS {SUMMARY_TABLE_NAME}_hour_url_idx ON {SUMMARY_TABLE_NAME} (hour, url)',
+    ]
+
+
+def refresh_summary(schema_mode: SchemaMode) -> list[str]:
+    # hours from the start on are summarized again, so the ones which were still being written get completed
+    return [
+        f'DELETE FROM {SUMMARY_TABLE_NAME} WHERE hour >= %(refresh_start)s',
+        f'INSERT INTO {SUMMARY_TABLE_NAME} ({", ".join(SUMMARY_COLUMN_TYPES)}) '
+        + bucketed_raw_rows(schema_mode, 'refresh', urls=False),
+    ]
+
+
+def floor_hour(moment: datetime.datetime) -> datetime.datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def ceil_hour(moment: datetime.datetime) -> datetime.datetime:
+    floor = floor_hour(moment)
+    return floor if floor == moment else floor + datetime.timedelta(hours=1)
+
+
+def split_range(
+        report_range: TimeRange,
+        coverage: Optional[TimeRange],
+) -> tuple[TimeRange, TimeRange, TimeRange]:
+    # (head, summary, tail): only whole hours covered by the summary are taken from it
+    nothing = TimeRange(report_range.end, report_range.end)
+    if coverage is None:
+        return report_range, nothing, nothing
+    start = max(ceil_hour(report_range.start), coverage.start)
+    end = min(floor_hour(report_range.end), coverage.end)
+    if start >= end:
+        return report_range, nothing, nothing
+    return (
+        TimeRange(report_range.start, start),
+        TimeRange(start, end),
+        TimeRange(end, report_range.end),
+    )
@@ -0,0 +1,101 @@
+import csv
+import datetime
+import json
+from typing import Iterable, Iterator, Optional, TextIO
+
+import psycopg2
+
+from monitor.serializers import RollupResult, SchemaMode
+from monitor.utils import logger
+from .queries import (
+    SUMMARY_TABLE_NAME,
+    TimeRange,
+    create_summary,
+    exact_report,
+    floor_hour,
+    log_gamma,
+    refresh_summary,
+    split_range,
+    summary_report,
+)
+
+REPORT_FORMATS = ('csv', 'jsonl')
+# summarized hours that are summarized again on every refresh, for results written late, e.g. from the spill
+SUMMARY_LOOKBACK = datetime.timedelta(hours=1)
+# not the one of the schema setup, so a long refresh doesn't hold up writers
+SUMMARY_LOCK_ID = 0x73756d6d
+
+
+class Report:
+    # Plain synchronous connection, there is nothing to do concurrently while postgres aggregates.
+    # Rows are streamed by a server-side cursor, so even with a lot of urls only a page of them is in memory.
+    def __init__(self, dsn: str, schema_mode: SchemaMode, urls: Optional[list[str]] = None, fetch_size: int = 1000):
+        self._connection = psycopg2.connect(dsn)
+        self._schema_mode = schema_mode
+        self._urls = urls
+        self._fetch_size = fetch_size
+
+    def close(self):
+        self._connection.close()
+
+    def refresh_summary(self, since: datetime.datetime) -> Optional[TimeRange]:
+        # only whole hours are summarized, so the summary is never a mix of complete and partial ones
+        end = floor_hour(datetime.datetime.now())
+        with self._connection, self._connection.cursor() as cursor:
+            # the lock is released with the transaction, so concurrent reports don't summarize the same hours twice
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', (SUMMARY_LOCK_ID,))
+            for statement in create_summary():
+                cursor.execute(statement)
+            cursor.execute(f'SELECT max(hour) FROM {SUMMARY_TABLE_NAME}')
+            [(last,)] = cursor.fetchall()
+            start = floor_hour(since) if last is None else last - SUMMARY_LOOKBACK
+            if start < end:
+                logger.info('Summarizing results from %s to %s', start, end)
+                parameters = {'refresh_start': start, 'refresh_end': end, 'log_gamma': log_gamma()}
+                for statement in refresh_summary(self._schema_mode):
+                    cursor.execute(statement, parameters)
+            cursor.execute(f'SELECT min(hour), max(hour) FROM {SUMMARY_TABLE_NAME}')
+            [(first, last)] = cursor.fetchall()
+        if first is None:
+            return None
+        return TimeRange(first, last + datetime.timedelta(hours=1))
+
+    def results(self, report_range: TimeRange, summary: bool = False) -> Iterator[RollupResult]:
+        query, parameters = self._query(report_range, summary)
+        with self._connection, self._connection.cursor(name='monitor_report') as cursor:
+            cursor.itersize = self._fetch_size
+            cursor.execute(query, parameters)
+            for url, start, end, checks, availability, statuses, *response_times in cursor:
+                # sums come back as numerics and json keys are always strings
+                yield RollupResult(
+                    url,
+                    start,
+                    end,
+                    int(checks),
+                    availability,
+                    {int(status): int(count) for status, count in statuses.items()},
+                    *response_times,
+                )
+
+    def _query(self, report_range: TimeRange, summary: bool) -> tuple[str, dict]:
+        parameters: dict = {'urls': self._urls, 'log_gamma': log_gamma()}
+        if not summary:
+            # exact percentiles, postgres sorts response times of every url
+            parameters['raw_start'], parameters['raw_end'] = report_range
+            return exact_report(self._schema_mode, urls=self._urls is not None), parameters
+        coverage = self.refresh_summary(report_range.start)
+        for name, time_range in zip(('head', 'summary', 'tail'), split_range(report_range, coverage)):
+            parameters[f'{name}_start'], parameters[f'{name}_end'] = time_range
+        return summary_report(self._schema_mode, urls=self._urls is not None), parameters
+
+
+def write_report(results: Iterable[RollupResult], stream: TextIO, report_format: str):
+    # rows are written as they come, so the output starts before the whole report is ready
+    if report_format == 'jsonl':
+        for result in results:
+            stream.write(json.dumps(result._asdict(), default=str) + '\n')
+        return
+    writer = csv.writer(stream)
+    writer.writerow(RollupResult._fields)
+    for result in results:
+        writer.writerow((*result[:5], json.dumps(result.statuses), *result[6:]))
@@ -0,0 +1,9 @@
+from .rollup import Rollup, ROLLUP_TABLE_NAME, ROLLUP_COLUMN_TYPES
+from .sketch import Sketch
+
+__all__ = [
+    'Rollup',
+    'ROLLUP_TABLE_NAME',
+    'ROLLUP_COLUMN_TYPES',
+    'Sketch',
+]
@@ -0,0 +1,115 @@
+import collections
+import datetime
+import json
+import time
+from typing import Optional
+
+import aiopg
+
+from monitor.db import insert_statement, schema_lock
+from monitor.metrics import registry
+from monitor.serializers import InsertMode, MonitoringResult, RollupResult, RollupSettings
+from .sketch import Sketch
+
+ROLLUP_TABLE_NAME = 'monitoring_rollup'
+ROLLUP_COLUMN_TYPES = {
+    'url': 'VARCHAR(256)',
+    'window_start': 'timestamp',
+    'window_end': 'timestamp',
+    'checks': 'INT',
+    'availability': 'FLOAT',
+    'statuses': 'JSONB',
+    'min_response_time': 'FLOAT',
+    'max_response_time': 'FLOAT',
+    'mean_response_time': 'FLOAT',
+    'p50_response_time': 'FLOAT',
+    'p90_response_time': 'FLOAT',
+    'p99_response_time': 'FLOAT',
+}
+
+ROLLUP_WINDOWS = registry.counter('monitor_rollup_windows_total', 'Rollup windows written to DB')
+
+
+class Window:  # pylint: disable = too-few-public-methods
+    # aggregates of a single url within a single window
+    def __init__(self, accuracy: float):
+        self.statuses: collections.Counter[int] = collections.Counter()
+        self.available = 0
+        self.response_times = Sketch(accuracy)
+
+    def add(self, result: MonitoringResult):
+        self.statuses[result.status_code] += 1
+        if result.status_code < 400:
+            self.available += 1
+        self.response_times.add(result.response_time)
+
+
+class Rollup:
+    # Shared by all the workers of a monitor: website workers add results, DB workers flush the closed windows.
+    # Results that come after their window was flushed make another partial row of the same window.
+    def __init__(self, settings: RollupSettings):
+        self._settings = settings
+        # open windows by their start, so closing one is a single pop
+        self._windows: dict[float, dict[str, Window]] = {}
+        # closed windows that failed to be written
+        self._pending: list[RollupResult] = []
+
+    @property
+    def raw_rows(self) -> bool:
+        return self._settings.raw_rows
+
+    def add(self, result: MonitoringResult):
+        length = self._settings.window
+        start = result.timestamp.timestamp() // length * length
+        windows = self._windows.setdefault(start, {})
+        window = windows.get(result.url)
+        if window is None:
+            window = windows[result.url] = Window(self._settings.accuracy)
+        window.add(result)
+
+    def pop_closed(self, now: Optional[float] = None) -> list[RollupResult]:
+        now = time.time() if now is None else now
+        results, self._pending = self._pending, []
+        closing = [start for start in self._windows if start + self._settings.window + self._settings.grace <= now]
+        for start in sorted(closing):
+            for url, window in self._windows.pop(start).items():
+                results.append(self._summarize(url, start, window))
+        return results
+
+    def restore(self, results: list[RollupResult]):
+        # kept until DB is back, in front of everything closed meanwhile
+        self._pending = results + self._pending
+
+    def _summarize(self, url: str, start: float, window: Window) -> RollupResult:
+        response_times = window.response_times
+        return RollupResult(
+            url=url,
+            window_start=datetime.datetime.fromtimestamp(start),
+            window_end=datetime.datetime.fromtimestamp(start + self._settings.window),
+            checks=response_times.count,
+            availability=window.available / response_times.count,
+            statuses=dict(window.statuses),
+            min_response_time=response_times.min,
+            max_response_time=response_times.max,
+            mean_response_time=response_times.total / response_times.count,
+            p50_response_time=response_times.quantile(0.5),
+            p90_response_time=response_times.quantile(0.9),
+            p99_response_time=response_times.quantile(0.99),
+        )
+
+    @staticmethod
+    async def setup(cursor: aiopg.Cursor):
+        columns = ', '.join(f'{column} {column_type}' for column, column_type in ROLLUP_COLUMN_TYPES.items())
+        async with schema_lock(cursor):
+            await cursor.execute(f'CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE_NAME} ({columns})')
+            await cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {ROLLUP_TABLE_NAME}_url_window_start_idx '
+                f'ON {ROLLUP_TABLE_NAME} (url, window_start)'
+            )
+
+    @staticmethod
+    async def insert(cursor: aiopg.Cursor, results: list[RollupResult]):
+        rows = [(*result[:5], json.dumps(result.statuses), *result[6:]) for result in results]
+        # there are much fewer rollups than raw rows, so they always go in the array form
+        await cursor.execute(*insert_statement(ROLLUP_TABLE_NAME, ROLLUP_COLUMN_TYPES, rows, InsertMode.UNNEST))
+        ROLLUP_WINDOWS.inc(len(results))
@@ -0,0 +1,46 @@
+import collections
+import math
+from typing import Optional
+
+# values below that are counted as zeros, log() of them makes no sense
+MIN_VALUE = 1e-9
+
+
+class Sketch:
+    # log-bucketed histogram (same idea as DDSketch): any quantile is within the relative accuracy of the true value,
+    # while memory depends only on the range of the values, not on their number
+    def __init__(self, accuracy: float = 0.01):
+        self._log_gamma = math.log((1 + accuracy) / (1 - accuracy))
+        self._buckets: collections.Counter[int] = collections.Counter()
+        self._zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value < MIN_VALUE:
+            self._zeros += 1
+        else:
+            # bucket i holds values in (gamma^(i-1), gamma^i]
+            self._buckets[math.ceil(math.log(value) / self._log_gamma)] += 1
+
+    def quantile(self, level: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = level * (self.count - 1)
+        seen = self._zeros
+        if rank < seen:
+            return 0.0
+        gamma = math.exp(self._log_gamma)
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen > rank:
+                # point of the bucket with the same relative distance to both of its bounds
+                value = 2 * gamma ** index / (gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
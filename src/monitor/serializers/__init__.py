@@ -1,10 +1,51 @@
 from .monitoring_result import MonitoringResult
-from .settings import MonitorSettings, WebsiteSetting, DbConnectionSettings, DbWorkerSettings
+from .rollup_result import RollupResult
+from .settings import (
+    MonitorSettings,
+    WebsiteSetting,
+    CheckMode,
+    DbConnectionSettings,
+    DbWorkerSettings,
+    HttpSettings,
+    SchedulerSettings,
+    SpreadPolicy,
+    InsertMode,
+    SinkType,
+    FileFormat,
+    SchemaMode,
+    PartitionInterval,
+    RegexpSettings,
+    RegexpEngineType,
+    SpillSettings,
+    MetricsSettings,
+    RollupSettings,
+    BreakerSettings,
+    TargetsSettings,
+    TargetsSource,
+)
 
 __all__ = [
     'WebsiteSetting',
+    'CheckMode',
     'MonitorSettings',
     'MonitoringResult',
+    'RollupResult',
     'DbConnectionSettings',
     'DbWorkerSettings',
+    'HttpSettings',
+    'SchedulerSettings',
+    'SpreadPolicy',
+    'InsertMode',
+    'SinkType',
+    'FileFormat',
+    'SchemaMode',
+    'PartitionInterval',
+    'RegexpSettings',
+    'RegexpEngineType',
+    'SpillSettings',
+    'MetricsSettings',
+    'RollupSettings',
+    'BreakerSettings',
+    'TargetsSettings',
+    'TargetsSource',
 ]
@@ -1,11 +1,17 @@
-from typing import Optional
+from typing import NamedTuple, Optional
 from datetime import datetime
-import pydantic
 
 
-class MonitoringResult(pydantic.BaseModel):
+# Plain tuple rather than a pydantic model: it's created for every single check and isn't validated anyway.
+# Fields go in the same order as the columns of the monitoring table, so a result is a ready to insert row.
+class MonitoringResult(NamedTuple):
     url: str
     timestamp: datetime
     status_code: int
     response_time: float
     regexp_match: Optional[bool]
+    # phases of the request, None if a phase didn't happen, e.g. DNS and connect for a reused connection
+    dns_time: Optional[float] = None
+    connect_time: Optional[float] = None
+    ttfb: Optional[float] = None
+    body_time: Optional[float] = None
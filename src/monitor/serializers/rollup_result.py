@@ -0,0 +1,19 @@
+from typing import NamedTuple, Optional
+from datetime import datetime
+
+
+# Aggregate of all results of one url within a window, fields go in the order of columns of the rollup table.
+class RollupResult(NamedTuple):
+    url: str
+    window_start: datetime
+    window_end: datetime
+    checks: int
+    availability: float
+    # number of results per status code
+    statuses: dict[int, int]
+    min_response_time: float
+    max_response_time: float
+    mean_response_time: float
+    p50_response_time: Optional[float]
+    p90_response_time: Optional[float]
+    p99_response_time: Optional[float]
@@ -1,23 +1,236 @@
-from typing import List
+import enum
+from typing import List, Optional
 
 import pydantic
 import pydantic_settings
 
 
+class CheckMode(enum.StrEnum):
+    # plain GET, body is read only to look for the regexp
+    GET = enum.auto()
+    # status only, nothing to look for the regexp in
+    HEAD = enum.auto()
+    # GET with validators of the previous response, on 304 the previous regexp result is reused
+    CONDITIONAL = enum.auto()
+
+
 class WebsiteSetting(pydantic.BaseModel):
     url: pydantic.AnyUrl
     period: float = pydantic.Field(ge=5, le=300)
     regexp: str = ''
+    # body is read in chunks until the regexp is found, but not further than that
+    max_body_bytes: int = pydantic.Field(default=1024 * 1024, gt=0)
+    # number of characters kept from the previous chunk, so matches crossing chunk borders are found
+    regexp_overlap: int = pydantic.Field(default=1024, ge=0)
+    check_mode: CheckMode = CheckMode.GET
+    # how long a single check may take, the whole period by default
+    timeout: Optional[float] = pydantic.Field(default=None, gt=0)
+
+    @pydantic.model_validator(mode='after')
+    def check_regexp_needs_body(self) -> 'WebsiteSetting':
+        if self.check_mode == CheckMode.HEAD and self.regexp:
+            raise ValueError('regexp can not be checked with HEAD requests')
+        return self
+
+    @pydantic.model_validator(mode='after')
+    def check_timeout_fits_period(self) -> 'WebsiteSetting':
+        if self.timeout is not None and self.timeout > self.period:
+            raise ValueError('timeout can not be longer than period')
+        return self
+
+
+class InsertMode(enum.StrEnum):
+    # whole batch is sent as one array per column and expanded by postgres with unnest()
+    UNNEST = enum.auto()
+    # parameterized multi-row INSERT ... VALUES
+    VALUES = enum.auto()
+
+
+class SchemaMode(enum.StrEnum):
+    # single table with the url stored on every row
+    PLAIN = enum.auto()
+    # table partitioned by time_stamp, urls are stored once in a dictionary table
+    PARTITIONED = enum.auto()
+
+
+class PartitionInterval(enum.StrEnum):
+    DAY = enum.auto()
+    MONTH = enum.auto()
+
+
+class SinkType(enum.StrEnum):
+    POSTGRES = enum.auto()
+    # local database file, for nodes without a database server
+    SQLITE = enum.auto()
+    # directory of files, a new one every roll_interval
+    FILES = enum.auto()
+
+
+class FileFormat(enum.StrEnum):
+    # need pyarrow, CSV is used without it
+    PARQUET = enum.auto()
+    # stream format, files can be read while they are still being written
+    ARROW = enum.auto()
+    CSV = enum.auto()
 
 
 class DbWorkerSettings(pydantic.BaseModel):
+    # max time the first entry of a batch waits for the batch to fill up
     period: float = pydantic.Field(ge=0, le=300)
-    max_batch_size: int
+    max_batch_size: int = pydantic.Field(gt=0)
+    # number of concurrent writers consuming the results queue
+    writers: int = pydantic.Field(default=1, gt=0)
+    insert_mode: InsertMode = InsertMode.UNNEST
+    pool_min_size: int = pydantic.Field(default=1, ge=0)
+    pool_max_size: int = pydantic.Field(default=10, gt=0)
+    # seconds after which a connection is reopened, -1 means never
+    pool_recycle: float = -1
+    schema_mode: SchemaMode = SchemaMode.PLAIN
+    partition_interval: PartitionInterval = PartitionInterval.MONTH
+    # partitions older than that are dropped, None keeps everything
+    retention_days: Optional[int] = pydantic.Field(default=None, gt=0)
+    sink: SinkType = SinkType.POSTGRES
+    # database file of the sqlite sink, directory of the files sink
+    path: Optional[str] = None
+    # best of the available ones by default
+    file_format: Optional[FileFormat] = None
+    # seconds after which the files sink starts a new file
+    roll_interval: float = pydantic.Field(default=3600, ge=1)
+    # seconds between attempts to reach the DB again, doubled after every failed one up to the max
+    retry_interval: float = pydantic.Field(default=1, gt=0)
+    max_retry_interval: float = pydantic.Field(default=60, gt=0)
+
+    @pydantic.model_validator(mode='after')
+    def check_pool_size(self) -> 'DbWorkerSettings':
+        if self.pool_min_size > self.pool_max_size:
+            raise ValueError('pool_min_size must not be greater than pool_max_size')
+        return self
+
+    @pydantic.model_validator(mode='after')
+    def check_path(self) -> 'DbWorkerSettings':
+        if self.sink != SinkType.POSTGRES and not self.path:
+            raise ValueError(f'path is required for the {self.sink} sink')
+        return self
+
+
+class HttpSettings(pydantic.BaseModel):
+    # 0 means no limit, same as in aiohttp
+    limit: int = pydantic.Field(default=100, ge=0)
+    limit_per_host: int = pydantic.Field(default=0, ge=0)
+    keepalive_timeout: float = pydantic.Field(default=15, ge=0)
+    verify_ssl: bool = True
+    # max number of concurrent checks of a host, 0 means no limit;
+    # unlike limit_per_host, checks wait for their host before the request timeout starts
+    checks_per_host: int = pydantic.Field(default=0, ge=0)
+    # DNS results are shared by all the checks through the connector, None keeps them forever
+    dns_cache_ttl: Optional[int] = pydantic.Field(default=60, gt=0)
+
+
+class SpreadPolicy(enum.StrEnum):
+    # every check runs right away and then once per period, so checks with equal periods run all at once
+    NONE = enum.auto()
+    # first run is shifted by a hash of the check, so it is the same between restarts and across shards
+    HASH = enum.auto()
+    # checks of the same period are shifted one after another to fill the gaps left by the previous ones
+    EVEN = enum.auto()
+
+
+class SchedulerSettings(pydantic.BaseModel):
+    # number of checks that may run at the same time
+    concurrency: int = pydantic.Field(default=100, gt=0)
+    # how first runs are spread across the period, later runs keep the same phase
+    spread: SpreadPolicy = SpreadPolicy.NONE
+
+
+class RegexpEngineType(enum.StrEnum):
+    # default thread pool of the loop
+    THREAD = enum.auto()
+    # separate processes, for heavy patterns and big pages
+    PROCESS = enum.auto()
+
+
+class RegexpSettings(pydantic.BaseModel):
+    engine: RegexpEngineType = RegexpEngineType.THREAD
+    # number of processes for the process engine, number of CPUs if not set
+    processes: Optional[int] = pydantic.Field(default=None, gt=0)
+    # max time a single search may take in the process engine, from the moment a process starts it;
+    # a search that takes longer has no result, so the regexp match of the check is null
+    timeout: float = pydantic.Field(default=1, gt=0)
+    # amount of characters searched at once
+    batch_size: int = pydantic.Field(default=64 * 1024, gt=0)
+
+
+class SpillSettings(pydantic.BaseModel):
+    # results are spilled to this directory when the queue is full or the DB is not available
+    directory: str
+    max_bytes: int = pydantic.Field(default=1024 ** 3, gt=0)
+    segment_bytes: int = pydantic.Field(default=16 * 1024 ** 2, gt=0)
+    compress: bool = False
+
+
+class MetricsSettings(pydantic.BaseModel):
+    host: str = '127.0.0.1'
+    port: int = pydantic.Field(default=9100, gt=0, lt=65536)
+    # how often the event loop lag is measured
+    loop_lag_interval: float = pydantic.Field(default=1, gt=0)
+
+
+class RollupSettings(pydantic.BaseModel):
+    # length of an aggregation window in seconds
+    window: float = pydantic.Field(default=60, gt=0)
+    # results are timestamped when a check starts, so they keep coming for a while after the window ends
+    grace: float = pydantic.Field(default=30, ge=0)
+    # whether raw results are written next to the rollups
+    raw_rows: bool = True
+    # relative accuracy of the response time percentiles
+    accuracy: float = pydantic.Field(default=0.01, gt=0, lt=1)
+
+
+class BreakerSettings(pydantic.BaseModel):
+    # consecutive failed checks (no response or a timeout) after which a website is checked less often
+    failures: int = pydantic.Field(default=3, gt=0)
+    # period is multiplied by that after every failed check of such a website
+    backoff: float = pydantic.Field(default=2, gt=1)
+    # checks of a failing website are never less frequent than that
+    max_period: float = pydantic.Field(default=600, ge=5)
+
+
+class TargetsSource(enum.StrEnum):
+    # a website per line, columns are named as the fields of a website in the settings file
+    CSV = enum.auto()
+    # a website per line as a JSON object
+    JSONL = enum.auto()
+    # table with the same columns, credentials are the same as of the results DB
+    POSTGRES = enum.auto()
+
+
+class TargetsSettings(pydantic.BaseModel):
+    # large lists of websites are kept apart from the settings file, they are read and validated by batches
+    source: TargetsSource
+    # file for csv and jsonl
+    path: Optional[str] = None
+    table: str = pydantic.Field(default='targets', pattern=r'^[A-Za-z_][A-Za-z0-9_.]*$')
+    batch_size: int = pydantic.Field(default=10000, gt=0)
+
+    @pydantic.model_validator(mode='after')
+    def check_path(self) -> 'TargetsSettings':
+        if self.source != TargetsSource.POSTGRES and not self.path:
+            raise ValueError(f'path is required for {self.source} targets')
+        return self
 
 
 class MonitorSettings(pydantic.BaseModel):
-    websites: List[WebsiteSetting]
+    # websites of the settings file go before the targets
+    websites: List[WebsiteSetting] = []
+    targets: Optional[TargetsSettings] = None
     db: DbWorkerSettings
+    http: HttpSettings = pydantic.Field(default_factory=HttpSettings)
+    scheduler: SchedulerSettings = pydantic.Field(default_factory=SchedulerSettings)
+    regexp: RegexpSettings = pydantic.Field(default_factory=RegexpSettings)
+    spill: Optional[SpillSettings] = None
+    metrics: Optional[MetricsSettings] = None
+    rollup: Optional[RollupSettings] = None
+    breaker: Optional[BreakerSettings] = None
 
 
 class DbConnectionSettings(pydantic_settings.BaseSettings):
@@ -0,0 +1,102 @@
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import zlib
+from typing import Callable, Optional
+
+from monitor.monitor import Monitor
+from monitor.serializers import MonitorSettings, DbConnectionSettings
+from monitor.utils import logger, setup_loop, setup_shutdown
+
+
+def get_shard(url: str, shards: int) -> int:
+    # stable between runs (unlike hash()), so a website always ends up in the same process
+    return zlib.crc32(url.encode()) % shards
+
+
+def shard_settings(settings: MonitorSettings, shard: int, shards: int) -> MonitorSettings:
+    websites = [website for website in settings.websites if get_shard(str(website.url), shards) == shard]
+    update: dict = {'websites': websites}
+    if settings.spill is not None:
+        # processes can't share a spill, so each one gets a directory of its own
+        spill_directory = os.path.join(settings.spill.directory, f'shard-{shard}')
+        update['spill'] = settings.spill.model_copy(update={'directory': spill_directory})
+    if settings.metrics is not None:
+        # same goes for the port of the metrics endpoint
+        update['metrics'] = settings.metrics.model_copy(update={'port': settings.metrics.port + shard})
+    return settings.model_copy(update=update)
+
+
+def run_shard(
+        settings: MonitorSettings,
+        db_connection_settings: Optional[DbConnectionSettings],
+        logger_level: int,
+        reloads: multiprocessing.connection.Connection,
+        loop: str,
+):
+    # spawned process starts from scratch, so the logger and the loop have to be configured again
+    logger.setLevel(logger_level)
+    setup_loop(loop)
+    monitor = Monitor(settings=settings, db_connection_settings=db_connection_settings)
+    setup_shutdown(monitor)
+    # new settings of the shard come through the pipe only, a hangup of the whole process group must not kill it
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    monitor.receive_reloads(reloads)
+    monitor.run()
+
+
+class ShardedMonitor:
+    # Splits websites between several processes, each of them runs a usual monitor with its own loop and DB writers
+    def __init__(
+            self,
+            settings: MonitorSettings,
+            db_connection_settings: Optional[DbConnectionSettings],
+            processes: int,
+            loop: str = 'asyncio',
+    ):
+        self._settings = settings
+        self._db_connection_settings = db_connection_settings
+        self._shards = processes
+        self._loop = loop
+        self._processes: list[multiprocessing.Process] = []
+        self._reloads: list[multiprocessing.connection.Connection] = []
+
+    def run(self):
+        logger.info('Running monitor in %s processes', self._shards)
+        context = multiprocessing.get_context('spawn')
+        for shard in range(self._shards):
+            settings = shard_settings(self._settings, shard, self._shards)
+            # shard is started even without websites, as they may come with reloaded settings
+            reader, writer = context.Pipe(duplex=False)
+            process = context.Process(
+                target=run_shard,
+                args=(settings, self._db_connection_settings, logger.level, reader, self._loop),
+                name=f'Monitor-{shard}',
+            )
+            process.start()
+            self._processes.append(process)
+            self._reloads.append(writer)
+        for process in self._processes:
+            process.join()
+        logger.info('Monitor completed')
+
+    def reload_from(self, load_settings: Callable[[], Optional[MonitorSettings]]):
+        # parent has no loop to stall, so settings are loaded right away and sent to the shards
+        if (settings := load_settings()) is not None:
+            self.reload(settings)
+
+    def reload(self, settings: MonitorSettings):
+        logger.info('Reloading settings of monitor processes')
+        self._settings = settings
+        for shard, (process, reloads) in enumerate(zip(self._processes, self._reloads)):
+            if process.is_alive():
+                # shard reads the pipe from its loop, big lists that don't fit into the pipe buffer just take a while
+                reloads.send(shard_settings(settings, shard, self._shards))
+
+    def stop(self):
+        logger.info('Stopping monitor processes')
+        # processes in the same group get SIGINT from the terminal anyway, but not when only this one is signalled
+        for process in self._processes:
+            if process.is_alive() and process.pid is not None:
+                os.kill(process.pid, signal.SIGINT)
@@ -0,0 +1,13 @@
+from .factory import create_sink
+from .files import FileSink
+from .postgres import PostgresSink
+from .sink import Sink
+from .sqlite import SqliteSink
+
+__all__ = [
+    'Sink',
+    'PostgresSink',
+    'SqliteSink',
+    'FileSink',
+    'create_sink',
+]
@@ -0,0 +1,22 @@
+from typing import Optional
+
+from monitor.db import ConnectionPool
+from monitor.serializers import DbConnectionSettings, DbWorkerSettings, SinkType
+from .files import FileSink
+from .postgres import PostgresSink
+from .sink import Sink
+from .sqlite import SqliteSink
+
+
+def create_sink(
+        settings: DbWorkerSettings,
+        connection_settings: Optional[DbConnectionSettings],
+        rollups: bool = False,
+) -> Sink:
+    if settings.sink == SinkType.SQLITE:
+        return SqliteSink(settings, rollups=rollups)
+    if settings.sink == SinkType.FILES:
+        return FileSink(settings)
+    if connection_settings is None:
+        raise ValueError('DB connection settings are required for the postgres sink')
+    return PostgresSink(ConnectionPool(dsn=connection_settings.dsn, settings=settings), settings, rollups=rollups)
@@ -0,0 +1,192 @@
+import csv
+import datetime
+import functools
+import importlib.util
+import itertools
+import json
+import os
+import pathlib
+import time
+from typing import Optional
+
+from monitor.db import COLUMN_TYPES
+from monitor.rollup import ROLLUP_COLUMN_TYPES
+from monitor.serializers import DbWorkerSettings, FileFormat, MonitoringResult, RollupResult
+from monitor.utils import logger
+from .sink import ThreadedSink
+
+# pyarrow is optional, so it's imported only by the formats which need it
+# pylint: disable = import-outside-toplevel, import-error
+
+
+def resolve_format(file_format: Optional[FileFormat]) -> FileFormat:
+    arrow = importlib.util.find_spec('pyarrow') is not None
+    if file_format is None:
+        return FileFormat.PARQUET if arrow else FileFormat.CSV
+    if file_format != FileFormat.CSV and not arrow:
+        logger.warning('pyarrow is not installed, results are written to CSV files instead of %s', file_format)
+        return FileFormat.CSV
+    return file_format
+
+
+def arrow_schema(column_types: dict):
+    import pyarrow  # type: ignore[import]
+
+    types = {
+        'VARCHAR(256)': pyarrow.string(),
+        'timestamp': pyarrow.timestamp('us'),
+        'INT': pyarrow.int32(),
+        'FLOAT': pyarrow.float64(),
+        'BOOLEAN': pyarrow.bool_(),
+        'JSONB': pyarrow.string(),
+    }
+    return pyarrow.schema([(str(column), types[column_type]) for column, column_type in column_types.items()])
+
+
+def arrow_table(schema, rows: list[tuple]):
+    import pyarrow
+
+    # types come from the schema, a batch of nothing but None in a column would make a column of nulls otherwise
+    columns = [pyarrow.array(column, type=field.type) for column, field in zip(zip(*rows), schema)]
+    return pyarrow.Table.from_arrays(columns, schema=schema)
+
+
+class TableFile:
+    # a file of one of the formats, opened for writing when created
+    extension = ''
+
+    def __init__(self, path: pathlib.Path, column_types: dict):
+        self._path = path
+        self._column_types = column_types
+
+    def write(self, rows: list[tuple]):
+        raise NotImplementedError  # pragma: nocover
+
+    def close(self):
+        raise NotImplementedError  # pragma: nocover
+
+
+class CsvFile(TableFile):
+    extension = 'csv'
+
+    def __init__(self, path: pathlib.Path, column_types: dict):
+        super().__init__(path, column_types)
+        # file lives as long as the sink writes into it
+        self._file = open(path, 'w', newline='', encoding='utf-8')  # pylint: disable = consider-using-with
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(column_types)
+
+    def write(self, rows: list[tuple]):
+        self._writer.writerows(rows)
+        # whole batches get to the file, so it is readable even if the monitor dies
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetFile(TableFile):
+    # file is readable only after it's closed, so it is only as fresh as the last roll
+    extension = 'parquet'
+
+    def __init__(self, path: pathlib.Path, column_types: dict):
+        import pyarrow.parquet  # type: ignore[import]
+
+        super().__init__(path, column_types)
+        self._schema = arrow_schema(column_types)
+        self._writer = pyarrow.parquet.ParquetWriter(str(path), self._schema)
+
+    def write(self, rows: list[tuple]):
+        # every batch makes a row group of its own
+        self._writer.write_table(arrow_table(self._schema, rows))
+
+    def close(self):
+        self._writer.close()
+
+
+class ArrowFile(TableFile):
+    # stream format, unlike the file one it can be read while it's still being written
+    extension = 'arrows'
+
+    def __init__(self, path: pathlib.Path, column_types: dict):
+        import pyarrow
+        import pyarrow.ipc  # type: ignore[import]
+
+        super().__init__(path, column_types)
+        self._schema = arrow_schema(column_types)
+        self._file = pyarrow.OSFile(str(path), 'wb')
+        self._writer = pyarrow.ipc.new_stream(self._file, self._schema)
+
+    def write(self, rows: list[tuple]):
+        self._writer.write_table(arrow_table(self._schema, rows))
+
+    def close(self):
+        self._writer.close()
+        self._file.close()
+
+
+FILE_TYPES: dict[FileFormat, type[TableFile]] = {
+    FileFormat.PARQUET: ParquetFile,
+    FileFormat.ARROW: ArrowFile,
+    FileFormat.CSV: CsvFile,
+}
+
+
+class RollingFile:
+    # a new file every `roll_interval` seconds, so finished ones can be shipped or removed
+    def __init__(self, prefix: pathlib.Path, column_types: dict, file_type: type[TableFile], roll_interval: float):
+        self._prefix = prefix
+        self._column_types = column_types
+        self._file_type = file_type
+        self._roll_interval = roll_interval
+        self._file: Optional[TableFile] = None
+        self._opened_at = 0.0
+        self._rolls = itertools.count()
+
+    def write(self, rows: list[tuple]):
+        now = time.monotonic()
+        if self._file is not None and now - self._opened_at >= self._roll_interval:
+            self.close()
+        if self._file is None:
+            # pid keeps apart the files of the processes of a sharded monitor, the number of the roll keeps apart
+            # the files of the same second, should the clock go back
+            name = f'{self._prefix.name}-{datetime.datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}-{next(self._rolls)}'
+            path = self._prefix.with_name(f'{name}.{self._file_type.extension}')
+            logger.info('Writing results to %s', path)
+            self._file = self._file_type(path, self._column_types)
+            self._opened_at = now
+        self._file.write(rows)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class FileSink(ThreadedSink):
+    def __init__(self, settings: DbWorkerSettings):
+        super().__init__()
+        self._directory = pathlib.Path(str(settings.path))
+        file_format = resolve_format(settings.file_format)
+        file_type = FILE_TYPES[file_format]
+        self._results = RollingFile(self._directory / 'results', COLUMN_TYPES, file_type, settings.roll_interval)
+        self._rollups = RollingFile(self._directory / 'rollups', ROLLUP_COLUMN_TYPES, file_type, settings.roll_interval)
+        self.errors = (OSError,)
+        if file_format != FileFormat.CSV:
+            import pyarrow
+
+            self.errors = (OSError, pyarrow.ArrowException)
+
+    async def setup(self):
+        await self._call(functools.partial(self._directory.mkdir, parents=True, exist_ok=True))
+
+    async def write(self, entries: list[MonitoringResult]):
+        await self._call(self._results.write, entries)
+
+    async def write_rollups(self, results: list[RollupResult]):
+        rows = [(*result[:5], json.dumps(result.statuses), *result[6:]) for result in results]
+        await self._call(self._rollups.write, rows)
+
+    async def close(self):
+        await self._call(self._results.close)
+        await self._call(self._rollups.close)
@@ -0,0 +1,36 @@
+import psycopg2
+
+from monitor.db import ConnectionPool, Schema, create_schema
+from monitor.rollup import Rollup
+from monitor.serializers import DbWorkerSettings, MonitoringResult, RollupResult
+from .sink import Sink
+
+
+class PostgresSink(Sink):
+    errors = (psycopg2.Error,)
+
+    def __init__(self, pool: ConnectionPool, settings: DbWorkerSettings, rollups: bool = False):
+        self._pool = pool
+        self._schema: Schema = create_schema(settings)
+        self._rollups = rollups
+
+    async def check(self) -> bool:
+        # the pool is reopened on demand, so it's enough to wait until the server answers again
+        return await self._pool.check()
+
+    async def setup(self):
+        async with self._pool.cursor() as cursor:
+            await self._schema.setup(cursor)
+            if self._rollups:
+                await Rollup.setup(cursor)
+
+    async def write(self, entries: list[MonitoringResult]):
+        async with self._pool.cursor() as cursor:
+            await self._schema.insert(cursor, entries)
+
+    async def write_rollups(self, results: list[RollupResult]):
+        async with self._pool.cursor() as cursor:
+            await Rollup.insert(cursor, results)
+
+    async def close(self):
+        await self._pool.close()
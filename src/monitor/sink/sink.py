@@ -0,0 +1,36 @@
+import asyncio
+from typing import Any, Callable
+
+from monitor.serializers import MonitoringResult, RollupResult
+
+
+class Sink:
+    # Storage of the results. Errors of the `errors` types mean that a batch wasn't written and the storage might be
+    # unusable until `setup` succeeds again, the batch is spilled meanwhile. Anything else is a bug.
+    errors: tuple[type[Exception], ...] = ()
+
+    async def check(self) -> bool:
+        return True
+
+    async def setup(self):
+        pass
+
+    async def write(self, entries: list[MonitoringResult]):
+        raise NotImplementedError  # pragma: nocover
+
+    async def write_rollups(self, results: list[RollupResult]):
+        raise NotImplementedError  # pragma: nocover
+
+    async def close(self):
+        pass
+
+
+class ThreadedSink(Sink):  # pylint: disable = abstract-method
+    # storages without asyncio drivers, their blocking calls are moved to a thread, so the loop goes on meanwhile,
+    # and go one at a time, so a storage is never used by two threads at once
+    def __init__(self):
+        self._lock = asyncio.Lock()
+
+    async def _call(self, function: Callable[..., Any], *args: Any) -> Any:
+        async with self._lock:
+            return await asyncio.to_thread(function, *args)
@@ -0,0 +1,75 @@
+import json
+import sqlite3
+from typing import Optional
+
+from monitor.db import COLUMN_TYPES, Columns, TABLE_NAME
+from monitor.rollup import ROLLUP_COLUMN_TYPES, ROLLUP_TABLE_NAME
+from monitor.serializers import DbWorkerSettings, MonitoringResult, RollupResult
+from monitor.utils import logger
+from .sink import ThreadedSink
+
+# seconds to wait for a lock of the database, shards of a monitor write to the same file
+SQLITE_TIMEOUT = 30.0
+
+
+class SqliteSink(ThreadedSink):
+    # Tables are the same as in postgres, sqlite takes their types for affinities.
+    errors = (sqlite3.Error,)
+
+    def __init__(self, settings: DbWorkerSettings, rollups: bool = False):
+        super().__init__()
+        self._path = str(settings.path)
+        self._rollups = rollups
+        self._connection: Optional[sqlite3.Connection] = None
+
+    async def setup(self):
+        await self._call(self._setup)
+
+    async def write(self, entries: list[MonitoringResult]):
+        # timestamps are stored as ISO strings, same as sqlite's own date functions produce
+        rows = [(entry.url, entry.timestamp.isoformat(sep=' '), *entry[2:]) for entry in entries]
+        await self._call(self._insert, TABLE_NAME, list(COLUMN_TYPES), rows)
+
+    async def write_rollups(self, results: list[RollupResult]):
+        rows = [
+            (result.url, result.window_start.isoformat(sep=' '), result.window_end.isoformat(sep=' '),
+             result.checks, result.availability, json.dumps(result.statuses), *result[6:])
+            for result in results
+        ]
+        await self._call(self._insert, ROLLUP_TABLE_NAME, list(ROLLUP_COLUMN_TYPES), rows)
+
+    async def close(self):
+        await self._call(self._close)
+
+    def _setup(self):
+        if self._connection is None:
+            logger.info('Opening SQLite database %s', self._path)
+            # used by one thread at a time, but not always by the same one
+            self._connection = sqlite3.connect(self._path, timeout=SQLITE_TIMEOUT, check_same_thread=False)
+            # readers don't block the writer and the other way round, and a commit doesn't wait for fsync
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+        tables = [(TABLE_NAME, COLUMN_TYPES)]
+        if self._rollups:
+            tables.append((ROLLUP_TABLE_NAME, ROLLUP_COLUMN_TYPES))
+        with self._connection:
+            for table, column_types in tables:
+                columns = ', '.join(f'{column} {column_type}' for column, column_type in column_types.items())
+                self._connection.execute(f'CREATE TABLE IF NOT EXISTS {table} ({columns})')
+            self._connection.execute(
+                f'CREATE INDEX IF NOT EXISTS {TABLE_NAME}_url_time_stamp_idx '
+                f'ON {TABLE_NAME} ({Columns.URL}, {Columns.TIME_STAMP})'
+            )
+
+    def _insert(self, table: str, columns: list[str], rows: list[tuple]):
+        if self._connection is None:
+            raise sqlite3.OperationalError('Database is not set up')
+        placeholders = ','.join('?' * len(columns))
+        # the whole batch is a single transaction
+        with self._connection:
+            self._connection.executemany(f'INSERT INTO {table} ({",".join(columns)}) VALUES ({placeholders})', rows)
+
+    def _close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -0,0 +1,9 @@
+from .results_queue import ResultsQueue
+from .spill_log import SpillLog
+from .spilling_queue import SpillingQueue
+
+__all__ = [
+    'ResultsQueue',
+    'SpillLog',
+    'SpillingQueue',
+]
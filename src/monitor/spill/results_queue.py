@@ -0,0 +1,8 @@
+import asyncio
+
+
+class ResultsQueue(asyncio.Queue):
+    # Queue of the results, its size follows the number of websites, which may change on reload
+    def resize(self, maxsize: int):
+        # results which are already queued stay there, even if there are more of them than the new size
+        self._maxsize = maxsize
@@ -0,0 +1,187 @@
+import asyncio
+import collections
+import datetime
+import math
+import pathlib
+import struct
+import zlib
+from typing import Awaitable, BinaryIO, Callable, Optional
+
+from monitor.serializers import MonitoringResult, SpillSettings
+from monitor.utils import logger
+
+SEGMENT_SUFFIX = '.seg'
+# payload length, flags
+FRAME_HEADER = struct.Struct('<IB')
+FLAG_COMPRESSED = 0x01
+URL_LENGTH = struct.Struct('<H')
+# timestamp, status code, response time, regexp match (-1 stands for None)
+RECORD = struct.Struct('<didb')
+# dns time, connect time, ttfb, body time (NaN stands for None)
+PHASES = struct.Struct('<dddd')
+
+
+def _pack_optional(value: Optional[float]) -> float:
+    return math.nan if value is None else value
+
+
+def _unpack_optional(value: float) -> Optional[float]:
+    return None if math.isnan(value) else value
+
+
+def encode_results(results: list[MonitoringResult]) -> bytes:
+    parts = []
+    for result in results:
+        url = result.url.encode()
+        regexp_match = -1 if result.regexp_match is None else int(result.regexp_match)
+        parts.append(URL_LENGTH.pack(len(url)))
+        parts.append(url)
+        parts.append(RECORD.pack(result.timestamp.timestamp(), result.status_code, result.response_time, regexp_match))
+        parts.append(
+            PHASES.pack(*(
+                _pack_optional(phase)
+                for phase in (result.dns_time, result.connect_time, result.ttfb, result.body_time)
+            ))
+        )
+    return b''.join(parts)
+
+
+def decode_results(payload: bytes) -> list[MonitoringResult]:
+    results = []
+    offset = 0
+    while offset < len(payload):
+        (url_length,) = URL_LENGTH.unpack_from(payload, offset)
+        offset += URL_LENGTH.size
+        url = payload[offset:offset + url_length].decode()
+        offset += url_length
+        timestamp, status_code, response_time, regexp_match = RECORD.unpack_from(payload, offset)
+        offset += RECORD.size
+        dns_time, connect_time, ttfb, body_time = (
+            _unpack_optional(phase) for phase in PHASES.unpack_from(payload, offset)
+        )
+        offset += PHASES.size
+        results.append(
+            MonitoringResult(
+                url=url,
+                timestamp=datetime.datetime.fromtimestamp(timestamp),
+                status_code=status_code,
+                response_time=response_time,
+                regexp_match=None if regexp_match < 0 else bool(regexp_match),
+                dns_time=dns_time,
+                connect_time=connect_time,
+                ttfb=ttfb,
+                body_time=body_time,
+            )
+        )
+    return results
+
+
+class SpillLog:
+    # Append-only log of results, split into segment files that are replayed and deleted oldest first
+    def __init__(self, settings: SpillSettings):
+        self._settings = settings
+        self._directory = pathlib.Path(settings.directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        # segments left from the previous run are replayed as well
+        self._segments: collections.deque[pathlib.Path] = collections.deque(
+            sorted(self._directory.glob(f'*{SEGMENT_SUFFIX}'))
+        )
+        self._sizes = {path: path.stat().st_size for path in self._segments}
+        # segment that is written at the moment
+        self._current: Optional[BinaryIO] = None
+        self._replay_lock = asyncio.Lock()
+
+    @property
+    def pending(self) -> bool:
+        return any(self._sizes.values())
+
+    @property
+    def size(self) -> int:
+        return sum(self._sizes.values())
+
+    def append(self, results: list[MonitoringResult]):
+        if not results:
+            return
+        payload = encode_results(results)
+        flags = 0
+        if self._settings.compress:
+            payload = zlib.compress(payload)
+            flags |= FLAG_COMPRESSED
+
+        current = self._current_segment()
+        current.write(FRAME_HEADER.pack(len(payload), flags))
+        current.write(payload)
+        current.flush()
+        path = self._segments[-1]
+        self._sizes[path] += FRAME_HEADER.size + len(payload)
+
+        if self._sizes[path] >= self._settings.segment_bytes:
+            self._close_current()
+        self._trim()
+
+    async def replay(self, write: Callable[[list[MonitoringResult]], Awaitable[None]], batch_size: int) -> int:
+        # one segment at a time and by one replayer at a time, so the order is preserved;
+        # segment is deleted only when all of it is written, so a failure may cause duplicates, but not losses
+        async with self._replay_lock:
+            if not self._segments:
+                return 0
+            path = self._segments[0]
+            if self._current is not None and len(self._segments) == 1:
+                # new results go to the next segment, while this one is being replayed
+                self._close_current()
+            results = self._read(path)
+            for start in range(0, len(results), batch_size):
+                await write(results[start:start + batch_size])
+            self._remove(path)
+            logger.info('Replayed %s spilled results from %s', len(results), path.name)
+            return len(results)
+
+    def close(self):
+        self._close_current()
+
+    def _current_segment(self) -> BinaryIO:
+        if self._current is None:
+            number = int(self._segments[-1].stem) + 1 if self._segments else 0
+            path = self._directory / f'{number:020d}{SEGMENT_SUFFIX}'
+            # pylint: disable = consider-using-with
+            self._current = open(path, 'ab')
+            self._segments.append(path)
+            self._sizes[path] = 0
+        return self._current
+
+    def _close_current(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+
+    def _trim(self):
+        # disk usage is bounded, so the oldest results are sacrificed first
+        while self.size > self._settings.max_bytes and len(self._segments) > 1:
+            path = self._segments[0]
+            logger.error('Spill is larger than %s bytes, dropping %s', self._settings.max_bytes, path.name)
+            self._remove(path)
+
+    def _remove(self, path: pathlib.Path):
+        if path in self._sizes:
+            self._segments.remove(path)
+            del self._sizes[path]
+        path.unlink(missing_ok=True)
+
+    @staticmethod
+    def _read(path: pathlib.Path) -> list[MonitoringResult]:
+        results = []
+        data = path.read_bytes()
+        offset = 0
+        while offset + FRAME_HEADER.size <= len(data):
+            length, flags = FRAME_HEADER.unpack_from(data, offset)
+            offset += FRAME_HEADER.size
+            payload = data[offset:offset + length]
+            if len(payload) < length:
+                # last frame wasn't fully written, e.g. the process was killed in the middle of it
+                logger.error('Truncated frame in %s, skipping the rest of it', path.name)
+                break
+            offset += length
+            if flags & FLAG_COMPRESSED:
+                payload = zlib.decompress(payload)
+            results.extend(decode_results(payload))
+        return results
@@ -0,0 +1,75 @@
+import asyncio
+
+from monitor.metrics import registry
+from monitor.utils import logger
+from .results_queue import ResultsQueue
+from .spill_log import SpillLog
+
+RESULTS_SPILLED = registry.counter(
+    'monitor_results_spilled_total', 'Results spilled to disk as the queue was full or DB writes failed'
+)
+
+
+class SpillingQueue(ResultsQueue):
+    # Queue that spills to disk instead of dropping results when it's full.
+    # Once it overflows, results are diverted from the queue until a writer catches up with the spill, so the order
+    # is kept. Diverted results are appended to the spill by batches, the last of them is written by the writer
+    # straight from memory.
+    def __init__(self, spill: SpillLog, maxsize: int = 0, batch_size: int = 1000):
+        super().__init__(maxsize=maxsize)
+        self._spill = spill
+        self._batch_size = batch_size
+        # segments left from the previous run are older than anything queued now
+        self._diverting = spill.pending
+        self._diverted: list = []
+
+    @property
+    def spill(self) -> SpillLog:
+        return self._spill
+
+    @property
+    def diverting(self) -> bool:
+        return self._diverting
+
+    def put_nowait(self, item):
+        if not self._diverting:
+            try:
+                super().put_nowait(item)
+                return
+            except asyncio.QueueFull:
+                logger.warning('Queue is full, spilling results to disk')
+                self._diverting = True
+        self._diverted.append(item)
+        if len(self._diverted) >= self._batch_size:
+            self._flush()
+
+    def divert(self, items: list):
+        # items that failed to be written go to the spill, and so does everything queued and diverted after them
+        self._diverting = True
+        self._diverted = items + self.drain() + self._diverted
+        self._flush()
+
+    def catch_up(self) -> list:
+        # Once the spill is replayed, the queue is used again and whatever was diverted since the last append is
+        # returned to be written. Nothing is awaited in between, so no result may slip past it.
+        if self._spill.pending:
+            return []
+        self._diverting = False
+        items, self._diverted = self._diverted, []
+        return items
+
+    def drain(self) -> list:
+        items = []
+        while not self.empty():
+            items.append(self.get_nowait())
+        return items
+
+    def close(self):
+        self._flush()
+        self._spill.close()
+
+    def _flush(self):
+        if self._diverted:
+            RESULTS_SPILLED.inc(len(self._diverted))
+            self._spill.append(self._diverted)
+            self._diverted = []
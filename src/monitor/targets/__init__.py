@@ -0,0 +1,9 @@
+from .loader import load_targets, read_csv, read_jsonl, read_table, validate
+
+__all__ = [
+    'load_targets',
+    'read_csv',
+    'read_jsonl',
+    'read_table',
+    'validate',
+]
@@ -0,0 +1,80 @@
+import csv
+import itertools
+import json
+from typing import Iterable, Iterator
+
+import pydantic
+
+from monitor.serializers import DbConnectionSettings, TargetsSettings, TargetsSource, WebsiteSetting
+from monitor.utils import logger
+
+# whole batch is validated by a single call, so the loop over the websites runs in pydantic-core, not in python
+WEBSITES = pydantic.TypeAdapter(list[WebsiteSetting])
+
+
+def read_csv(path: str) -> Iterator[dict]:
+    with open(path, 'r', newline='', encoding='utf-8') as targets_file:
+        for row in csv.DictReader(targets_file):
+            # empty cells fall back to the defaults
+            yield {column: value for column, value in row.items() if value}
+
+
+def read_jsonl(path: str) -> Iterator[dict]:
+    with open(path, 'r', encoding='utf-8') as targets_file:
+        for line in targets_file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_table(dsn: str, table: str, batch_size: int) -> Iterator[dict]:
+    # only the postgres source needs it, so reading files doesn't load the driver
+    # pylint: disable = import-outside-toplevel
+    import psycopg2
+
+    connection = psycopg2.connect(dsn)
+    try:
+        # server-side cursor, so the table is read by batches instead of at once
+        with connection, connection.cursor(name='monitor_targets') as cursor:
+            cursor.itersize = batch_size
+            cursor.execute(f'SELECT * FROM {table}')
+            columns = None
+            for row in cursor:
+                # description of a server-side cursor is known only after the first fetch
+                columns = columns or [column.name for column in cursor.description or ()]
+                yield {column: value for column, value in zip(columns, row) if value is not None}
+    finally:
+        connection.close()
+
+
+def validate(rows: Iterable[dict], batch_size: int) -> Iterator[WebsiteSetting]:
+    rows = iter(rows)
+    for offset in itertools.count(step=batch_size):
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return
+        try:
+            yield from WEBSITES.validate_python(batch)
+        except pydantic.ValidationError as error:
+            # index in the batch goes first in the location, field is missing for errors of the whole website
+            first_error = error.errors()[0]
+            index, *field = first_error['loc']
+            location = ''.join(f'.{part}' for part in field)
+            raise ValueError(f'Target {offset + int(index) + 1}{location}: {first_error["msg"]}') from error
+
+
+def read_rows(settings: TargetsSettings) -> Iterator[dict]:
+    if settings.source == TargetsSource.POSTGRES:
+        # all the fields come from the environment, same as for the results DB
+        dsn = DbConnectionSettings().dsn  # type: ignore[call-arg]
+        return read_table(dsn, settings.table, settings.batch_size)
+    # path is validated to be set for the file sources
+    path = str(settings.path)
+    if settings.source == TargetsSource.CSV:
+        return read_csv(path)
+    return read_jsonl(path)
+
+
+def load_targets(settings: TargetsSettings) -> list[WebsiteSetting]:
+    websites = list(validate(read_rows(settings), settings.batch_size))
+    logger.info('Loaded %s targets from %s', len(websites), settings.path or settings.table)
+    return websites
@@ -1,5 +1,12 @@
 from .logger import logger
+from .loop import LOOPS, setup_loop
+from .reload import setup_reload
+from .shutdown import setup_shutdown
 
 __all__ = [
     'logger',
+    'LOOPS',
+    'setup_loop',
+    'setup_reload',
+    'setup_shutdown',
 ]
@@ -0,0 +1,19 @@
+from .logger import logger
+
+LOOPS = ('asyncio', 'uvloop')
+
+
+def setup_loop(loop: str) -> str:
+    # imported here, so nothing of asyncio is loaded by commands that don't run the monitor
+    # pylint: disable = import-outside-toplevel
+    import asyncio
+
+    if loop == 'uvloop':
+        try:
+            import uvloop  # type: ignore[import]
+        except ImportError:
+            logger.warning('uvloop is not installed, the default asyncio loop is used')
+            return 'asyncio'
+        # asyncio.run() picks the loop from the policy, so nothing else has to know about it
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return loop
@@ -0,0 +1,26 @@
+import signal
+from typing import Any, Callable, Optional, Protocol
+
+from .logger import logger
+
+
+class Reloadable(Protocol):  # pylint: disable = too-few-public-methods
+    def reload_from(self, load_settings: Callable[[], Optional[Any]]):
+        ...
+
+
+def setup_reload(monitor: Reloadable, load_settings: Callable[[], Any]):
+    def load() -> Optional[Any]:
+        # broken settings must not bring down a running monitor
+        # pylint: disable = broad-exception-caught
+        try:
+            return load_settings()
+        except Exception as error:
+            logger.error('Failed to reload settings. %s: %s', error.__class__.__name__, error)
+            return None
+
+    def sig_handler(_signum, _stack_frame):
+        # settings may take a while to load, e.g. targets from a DB, so it's up to the monitor where to load them
+        monitor.reload_from(load)
+
+    signal.signal(signalnum=signal.SIGHUP, handler=sig_handler)
@@ -0,0 +1,14 @@
+import signal
+from typing import Protocol
+
+
+class Stoppable(Protocol):  # pylint: disable = too-few-public-methods
+    def stop(self):
+        ...
+
+
+def setup_shutdown(monitor: Stoppable):
+    def sig_handler(_signum, _stack_frame):
+        monitor.stop()
+
+    signal.signal(signalnum=signal.SIGINT, handler=sig_handler)
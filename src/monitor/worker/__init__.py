@@ -1,7 +1,9 @@
 from .website_worker import WebsiteWorker
 from .db_worker import DbWorker
+from .scheduler import Scheduler
 
 __all__ = [
     'WebsiteWorker',
     'DbWorker',
+    'Scheduler',
 ]
@@ -1,84 +1,154 @@
 import asyncio
-import enum
-
-import aiopg
+import time
+from typing import Optional
 
+from monitor.metrics import registry
+from monitor.rollup import Rollup
+from monitor.sink import Sink, create_sink
+from monitor.spill import SpillingQueue
 from monitor.serializers import DbConnectionSettings, MonitoringResult, DbWorkerSettings
 from monitor.utils import logger
 from .worker import Worker
 
-TABLE_NAME = 'monitoring'
-
+BATCH_SIZE = registry.histogram(
+    'monitor_db_batch_size', 'Number of results written at once', buckets=(1, 10, 50, 100, 500, 1000, 5000, 10000)
+)
+FLUSH_DURATION = registry.histogram('monitor_db_flush_duration_seconds', 'Duration of writing a batch to DB')
+FLUSH_FAILURES = registry.counter('monitor_db_flush_failures_total', 'Batches that failed to be written to DB')
 
-class Columns(enum.StrEnum):
-    URL = enum.auto()
-    TIME_STAMP = enum.auto()
-    STATUS_CODE = enum.auto()
-    RESPONSE_TIME = enum.auto()
-    REGEXP_MATCH = enum.auto()
+# how often closed rollup windows are looked for when there are no raw results to wake the worker up
+ROLLUP_FLUSH_INTERVAL = 1.0
 
 
 class DbWorker(Worker):
-    def __init__(
+    def __init__(  # pylint: disable = too-many-arguments
             self,
-            connection_settings: DbConnectionSettings,
+            connection_settings: Optional[DbConnectionSettings],
             worker_settings: DbWorkerSettings,
             queue: asyncio.Queue,
-            name: str = 'DBWorker'
+            name: str = 'DBWorker',
+            sink: Optional[Sink] = None,
+            rollup: Optional[Rollup] = None,
     ):
-        super().__init__(period=worker_settings.period, name=name)
+        # worker doesn't poll, it waits for entries and flushes as soon as a batch is full or old enough
+        super().__init__(period=0, name=name)
         self._queue = queue
-        self._dsn = connection_settings.dsn
-        self._max_batch_size = worker_settings.max_batch_size
+        self._settings = worker_settings
+        # sink may be shared between several writers, then it is owned by the monitor
+        self._owns_sink = sink is None
+        self._sink = sink or create_sink(worker_settings, connection_settings, rollups=rollup is not None)
+        # rollup is shared with the website workers, windows are flushed by whichever writer finds them closed
+        self._rollup = rollup
+        self._db_ready = False
+        self._retry_interval = worker_settings.retry_interval
 
     async def run(self):
         logger.info('Running db worker')
-        await self._setup_db()
-        await super().run()
+        try:
+            # table is created by the first task, so the worker doesn't die if DB isn't reachable at start
+            await super().run()
+        finally:
+            if self._owns_sink:
+                await self._sink.close()
 
     async def _setup_db(self):
-        async with aiopg.connect(dsn=self._dsn) as conn:
-            cursor = await conn.cursor()
-            await cursor.execute(
-                f'''
-                CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
-                    {Columns.URL} VARCHAR(256),
-                    {Columns.TIME_STAMP} timestamp,
-                    {Columns.STATUS_CODE} INT,
-                    {Columns.RESPONSE_TIME} FLOAT,
-                    {Columns.REGEXP_MATCH} BOOLEAN
-                )
-                '''
-            )
+        await self._sink.setup()
+        self._db_ready = True
 
     async def task(self):
-        entries = []
-        logger.debug('Extracting entries from queue. Entries %s', self._queue.qsize())
-        for _ in range(self._max_batch_size):
-            if self._queue.empty():
-                break
-            entry: MonitoringResult = await self._queue.get()
-            entries.append(entry)
+        if not self._db_ready:
+            if not await self._recover():
+                # give the DB some time before the next attempt, more of it the longer it's down
+                await asyncio.sleep(self._retry_interval)
+                self._retry_interval = min(self._retry_interval * 2, self._settings.max_retry_interval)
+                return
+            self._retry_interval = self._settings.retry_interval
+
+        queue = self._queue
+        if isinstance(queue, SpillingQueue) and queue.diverting and queue.empty():
+            # spilled results are older than anything that is queued after them
+            await self._replay(queue)
+            return
+
+        entries = await self._collect_batch()
         logger.debug('Extracted %s entries from queue', len(entries))
+        try:
+            if entries:
+                await self._write(entries)
+                entries = []
+            await self._write_rollups()
+        except self._sink.errors as error:
+            FLUSH_FAILURES.inc()
+            logger.error('Failed to write to DB. %s: %s', error.__class__.__name__, error)
+            self._db_ready = False
+            if entries and isinstance(self._queue, SpillingQueue):
+                self._queue.divert(entries)
 
-        if not entries:
+    async def _write(self, entries: list[MonitoringResult]):
+        start = time.monotonic()
+        await self._sink.write(entries)
+        FLUSH_DURATION.observe(time.monotonic() - start)
+        BATCH_SIZE.observe(len(entries))
+
+    async def _write_rollups(self):
+        if self._rollup is None:
+            return
+        results = self._rollup.pop_closed()
+        if not results:
             return
-        rows = []
-        for entry in entries:
-            # Can't do much about postgres syntax, so convert None/True/False to NULL/TRUE/FALSE
-            regexp_match = 'NULL' if entry.regexp_match is None else str(entry.regexp_match).upper()
-            # pylint: disable = invalid-string-quote
-            rows.append(
-                f"('{entry.url}', '{entry.timestamp}',{entry.status_code},{entry.response_time},{regexp_match})"
-            )
+        try:
+            await self._sink.write_rollups(results)
+        except self._sink.errors:
+            self._rollup.restore(results)
+            raise
+
+    async def _replay(self, queue: SpillingQueue):
+        entries: list[MonitoringResult] = []
+        try:
+            await queue.spill.replay(self._write, batch_size=self._settings.max_batch_size)
+            # results diverted since the last append to the spill are the newest ones, once they are written
+            # the queue is used again
+            entries = queue.catch_up()
+            if entries:
+                await self._write(entries)
+        except self._sink.errors as error:
+            FLUSH_FAILURES.inc()
+            logger.error('Failed to replay spilled results. %s: %s', error.__class__.__name__, error)
+            self._db_ready = False
+            if entries:
+                queue.divert(entries)
+
+    async def _collect_batch(self) -> list[MonitoringResult]:
+        # wait for the first entry as long as it takes, after that the batch has at most `period` to fill up
+        if self._rollup is None:
+            entries = [await self._queue.get()]
+        else:
+            # rollup windows close on time, whether there are raw results to write or not
+            try:
+                entries = [await asyncio.wait_for(self._queue.get(), timeout=ROLLUP_FLUSH_INTERVAL)]
+            except asyncio.TimeoutError:
+                return []
+        deadline = time.monotonic() + self._settings.period
+        while len(entries) < self._settings.max_batch_size:
+            if not self._queue.empty():
+                entries.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                entries.append(await asyncio.wait_for(self._queue.get(), timeout=timeout))
+            except asyncio.TimeoutError:
+                break
+        return entries
 
-        rows_to_insert = ','.join(rows)
-        command = f'''
-        INSERT INTO
-            {TABLE_NAME} ({",".join(Columns)})
-        VALUES
-        '''
-        command += rows_to_insert
-        async with aiopg.connect(dsn=self._dsn) as conn:
-            cursor = await conn.cursor()
-            await cursor.execute(command)
+    async def _recover(self) -> bool:
+        if not await self._sink.check():
+            return False
+        try:
+            await self._setup_db()
+        except self._sink.errors as error:
+            logger.error('Failed to set up DB. %s: %s', error.__class__.__name__, error)
+            return False
+        logger.info('DB is ready')
+        return True
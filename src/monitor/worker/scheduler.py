@@ -0,0 +1,173 @@
+import asyncio
+import collections
+import contextlib
+import heapq
+import itertools
+import math
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Optional
+
+from monitor.fetch import HostLimiter
+from monitor.metrics import registry
+from monitor.serializers import SchedulerSettings, SpreadPolicy
+from monitor.utils import logger
+from .worker import Worker
+
+# fractional part of the golden ratio, multiples of it fill [0, 1) evenly however many of them there are
+GOLDEN_RATIO_FRACTION = (math.sqrt(5) - 1) / 2
+
+SCHEDULER_LAG = registry.histogram('monitor_scheduler_lag_seconds', 'How late checks start compared to their due time')
+
+
+@dataclass
+class SchedulingLag:
+    last: float = 0.0
+    max: float = 0.0
+    total: float = 0.0
+    count: int = 0
+
+    def observe(self, lag: float):
+        self.last = lag
+        self.max = max(self.max, lag)
+        self.total += lag
+        self.count += 1
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class Scheduler:
+    # pylint: disable = too-many-instance-attributes
+    def __init__(self, settings: SchedulerSettings, name: str = 'Scheduler', limiter: Optional[HostLimiter] = None):
+        self._concurrency = settings.concurrency
+        self._name = name
+        # (due time, sequence number, worker), the sequence number breaks ties and identifies the entry
+        self._heap: list[tuple[float, int, Worker]] = []
+        self._counter = itertools.count()
+        # worker -> sequence number of its only valid entry, anything else in the heap is stale
+        self._entries: dict[Worker, int] = {}
+        self._wakeup = asyncio.Event()
+        self._lag = SchedulingLag()
+        self._limiter = limiter
+        self._spread = settings.spread
+        # number of workers spread so far, per period
+        self._spread_counts: collections.Counter[float] = collections.Counter()
+
+    @property
+    def lag(self) -> SchedulingLag:
+        return self._lag
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, worker: Worker, delay: Optional[float] = None):
+        if delay is None:
+            delay = self._phase(worker)
+        self._push(worker, time.monotonic() + delay)
+
+    def remove(self, worker: Worker):
+        # entry stays in the heap but is skipped once it gets due
+        self._entries.pop(worker, None)
+
+    def _phase(self, worker: Worker) -> float:
+        # runs stay on the grid of their first one, so it is enough to spread just the first runs
+        period = worker.period
+        if self._spread == SpreadPolicy.HASH:
+            return zlib.crc32(worker.phase_key.encode()) / 2 ** 32 * period
+        if self._spread == SpreadPolicy.EVEN:
+            # workers added later, e.g. on reload, don't know how many others there will be,
+            # so instead of equal slots each one lands in one of the largest gaps left by the previous ones
+            index = self._spread_counts[period]
+            self._spread_counts[period] += 1
+            return index * GOLDEN_RATIO_FRACTION % 1 * period
+        return 0.0
+
+    def _push(self, worker: Worker, due: float):
+        sequence = next(self._counter)
+        self._entries[worker] = sequence
+        heapq.heappush(self._heap, (due, sequence, worker))
+        self._wakeup.set()
+
+    async def run(self):
+        logger.info('Running scheduler %s with %s fetchers', self._name, self._concurrency)
+        ready: asyncio.Queue = asyncio.Queue(maxsize=self._concurrency)
+        fetchers = [asyncio.create_task(self._fetch(ready)) for _ in range(self._concurrency)]
+        # checks waiting for a slot of their host
+        waiters: set[asyncio.Task] = set()
+        try:
+            await self._dispatch(ready, waiters)
+        except asyncio.CancelledError:
+            logger.info('Scheduler %s is stopped', self._name)
+        finally:
+            tasks = [*fetchers, *waiters]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _dispatch(self, ready: asyncio.Queue, waiters: set[asyncio.Task]):
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            due, sequence, worker = self._heap[0]
+            delay = due - time.monotonic()
+            if delay > 0:
+                # sleep until the earliest check is due, unless something earlier gets scheduled meanwhile
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                continue
+
+            heapq.heappop(self._heap)
+            if self._entries.get(worker) != sequence:
+                continue
+            if self._limiter is not None and worker.host is not None:
+                # busy host is waited for aside, so neither the dispatcher nor fetchers are held up by it
+                entry = (due, sequence, worker)
+                waiter = asyncio.create_task(self._wait_for_host(ready, self._limiter, worker.host, entry))
+                waiters.add(waiter)
+                waiter.add_done_callback(waiters.discard)
+                continue
+            # blocks when all fetchers are busy, which shows up as scheduling lag
+            await ready.put((due, sequence, worker))
+
+    @staticmethod
+    async def _wait_for_host(ready: asyncio.Queue, limiter: HostLimiter, host: str, entry: tuple[float, int, Worker]):
+        await limiter.acquire(host)
+        try:
+            await ready.put(entry)
+        except asyncio.CancelledError:
+            limiter.release(host)
+            raise
+
+    async def _fetch(self, ready: asyncio.Queue):
+        # a failing check must not take the whole fetcher down
+        # pylint: disable = broad-exception-caught
+        while True:
+            due, sequence, worker = await ready.get()
+            lag = time.monotonic() - due
+            self._lag.observe(lag)
+            SCHEDULER_LAG.observe(lag)
+            try:
+                await worker.task()
+            except Exception as error:
+                logger.error('Worker %s failed. %s: %s', worker.name, error.__class__.__name__, error)
+            finally:
+                if self._limiter is not None and worker.host is not None:
+                    self._limiter.release(worker.host)
+            if self._entries.get(worker) == sequence:
+                self._push(worker, self._next_due(due, worker.period))
+
+    @staticmethod
+    def _next_due(due: float, period: float) -> float:
+        # next run is counted from the previous due time, not from the end of the check, so there is no drift
+        next_due = due + period
+        now = time.monotonic()
+        if next_due < now:
+            # check took longer than its period, skip the missed runs but stay on the same grid
+            next_due += math.ceil((now - next_due) / period) * period
+        return next_due
@@ -2,64 +2,282 @@ import asyncio
 import datetime
 import re
 import time
+from http import HTTPStatus
 from typing import Optional
 
 import aiohttp
+from aiohttp import hdrs
 
-from monitor.serializers import WebsiteSetting, MonitoringResult
+from monitor.fetch import SessionPool, StreamingMatcher, RegexpEngine, PhaseTimer, CircuitBreaker
+from monitor.metrics import registry
+from monitor.rollup import Rollup
+from monitor.serializers import WebsiteSetting, MonitoringResult, HttpSettings, CheckMode, BreakerSettings
 from monitor.utils import logger
 from .worker import Worker
 
+CHUNK_SIZE = 64 * 1024
+# unread rest of a body up to that size is read only to keep the connection, larger ones are dropped along with it
+DRAIN_MAX_BYTES = 64 * 1024
+
+FETCH_DURATION = registry.histogram('monitor_fetch_duration_seconds', 'Duration of website checks')
+RESULTS_DROPPED = registry.counter('monitor_results_dropped_total', 'Results dropped because the queue was full')
+
 
 class WebsiteWorker(Worker):
-    def __init__(self, settings: WebsiteSetting, queue: asyncio.Queue, name: str = 'BaseWorker'):
+    # pylint: disable = too-many-instance-attributes
+    def __init__(  # pylint: disable = too-many-arguments
+            self,
+            settings: WebsiteSetting,
+            queue: asyncio.Queue,
+            name: str = 'BaseWorker',
+            session_pool: Optional[SessionPool] = None,
+            regexp_engine: Optional[RegexpEngine] = None,
+            rollup: Optional[Rollup] = None,
+            breaker: Optional[BreakerSettings] = None,
+    ):
         super().__init__(period=settings.period, name=name)
+        self._settings = settings
         self._url = str(settings.url)
         self._regexp = re.compile(settings.regexp) if settings.regexp else None
         self._queue = queue
+        # standalone worker gets a pool of its own, otherwise the pool is shared and owned by the monitor
+        self._owns_session_pool = session_pool is None
+        self._session_pool = session_pool or SessionPool(HttpSettings())
+        self._regexp_engine = regexp_engine or RegexpEngine()
+        self._rollup = rollup
+        self._breaker = CircuitBreaker(breaker, name=self._url) if breaker is not None else None
+        # validators of the last full response and the regexp result it had, for conditional checks
+        self._validators: dict[str, str] = {}
+        self._last_match: Optional[bool] = None
+        # other checks of the same url, they are fetched along with this one instead of on their own
+        self._followers: dict[WebsiteWorker, float] = {}
+
+    @property
+    def settings(self) -> WebsiteSetting:
+        return self._settings
+
+    @property
+    def host(self) -> Optional[str]:
+        return self._settings.url.host
+
+    @property
+    def phase_key(self) -> str:
+        # same as grouping of the checks, the leader of a group is the one being scheduled
+        return f'{self._url} {self._settings.check_mode}'
+
+    @property
+    def key(self) -> tuple[str, Optional[str]]:
+        return self._url, self._settings.regexp
+
+    @property
+    def last_match(self) -> Optional[bool]:
+        # regexp result of the last full check, reused while the page isn't modified
+        return self._last_match
+
+    @last_match.setter
+    def last_match(self, regexp_match: Optional[bool]):
+        self._last_match = regexp_match
+
+    def create_matcher(self, encoding: str) -> Optional[StreamingMatcher]:
+        if self._regexp is None:
+            return None
+        return StreamingMatcher(
+            regexp=self._regexp,
+            overlap=self._settings.regexp_overlap,
+            engine=self._regexp_engine,
+            encoding=encoding,
+        )
+
+    @property
+    def period(self) -> float:
+        # leader runs as often as the most frequent of the checks it fetches for, unless the website is failing
+        period = min([self._period, *(follower.period for follower in self._followers)])
+        return self._breaker.period(period) if self._breaker is not None else period
+
+    def set_followers(self, followers: list['WebsiteWorker']):
+        # checks joining the group have no results of the page the validators are for, so the next check is a full one
+        if any(follower not in self._followers for follower in followers):
+            self._validators = {}
+        # followers keep their due times, so regrouping doesn't reset their schedules
+        self._followers = {follower: self._followers.get(follower, 0.0) for follower in followers}
+
+    def update(self, settings: WebsiteSetting):
+        # url and regexp identify the worker, everything else can be retuned on the fly,
+        # new period is picked up when the worker is rescheduled next time
+        self._settings = settings
+        self._period = settings.period
+        # check mode might have changed, so the next check is a full one
+        self._validators = {}
+
+    async def run(self):
+        try:
+            await super().run()
+        finally:
+            if self._owns_session_pool:
+                await self._session_pool.close()
 
     async def task(self):
-        result = await self._check_website_status()
-        logger.debug('Monitoring result for %s: %s', self._url, result.model_dump())
+        if self._breaker is not None:
+            self._breaker.before_check()
+        checks = [self, *self._due_followers()]
+        results = await self._check_website_status(checks)
+        for check, result in zip(checks, results):
+            check.emit(result)
+
+    def emit(self, result: MonitoringResult):
+        logger.debug('Monitoring result: %s', result)
+        if self._rollup is not None:
+            # aggregated before the queue, so rollups don't depend on how fast raw results are written
+            self._rollup.add(result)
+            if not self._rollup.raw_rows:
+                return
         try:
             self._queue.put_nowait(result)
         except asyncio.QueueFull as error:
+            RESULTS_DROPPED.inc()
             logger.error('Queue overflow! %s: %s', error.__class__.__name__, error)
 
-    async def _check_website_status(self) -> MonitoringResult:
+    def _due_followers(self) -> list['WebsiteWorker']:
+        now = time.monotonic()
+        due = []
+        for follower, due_time in self._followers.items():
+            # runs of the leader rarely hit the due time exactly, so whatever is closer to this run than
+            # to the next one goes now
+            if due_time > now + self.period / 2:
+                continue
+            due.append(follower)
+            next_due = due_time + follower.period
+            self._followers[follower] = next_due if next_due > now else now + follower.period
+        return due
+
+    async def _check_website_status(self, checks: list['WebsiteWorker']) -> list[MonitoringResult]:
         timestamp = datetime.datetime.now()
-        start_time = time.time()
-        status_code, text = await self._get_url_status()
-        response_time = time.time() - start_time
-        regexp_match = await self._parse_by_regexp(text)
-        return MonitoringResult(
-            url=self._url,
-            timestamp=timestamp,
-            status_code=status_code,
-            response_time=response_time,
-            regexp_match=regexp_match,
-        )
+        # durations are measured with the monotonic clock, so they aren't affected by clock adjustments
+        timer = PhaseTimer()
+        start_time = time.monotonic()
+        status_code, matches = await self._get_url_status(timer, checks)
+        response_time = time.monotonic() - start_time
+        FETCH_DURATION.observe(response_time)
+        return [
+            MonitoringResult(
+                url=self._url,
+                timestamp=timestamp,
+                status_code=status_code,
+                response_time=response_time,
+                regexp_match=regexp_match,
+                dns_time=timer.dns_time,
+                connect_time=timer.connect_time,
+                ttfb=timer.ttfb,
+                body_time=timer.body_time,
+            )
+            for regexp_match in matches
+        ]
 
-    async def _get_url_status(self) -> tuple[int, str]:
-        async with aiohttp.ClientSession() as session:
-            try:
-                # timeout for cases when site doesn't respond for too long
-                async with session.get(self._url, timeout=self._period) as response:
-                    status_code = response.status
-                    text = await response.text()
-                    return status_code, text
-            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as error:
-                logger.error('Failed to get status for %s. %s: %s', self._url, error.__class__.__name__, error)
-                # assume that connection error is not our fault, but the error log should give a clue
-                return 500, ''
-
-    async def _parse_by_regexp(self, text) -> Optional[bool]:
-        if not self._regexp:
-            return None
-        loop = asyncio.get_running_loop()
+    async def _get_url_status(
+            self,
+            timer: PhaseTimer,
+            checks: list['WebsiteWorker'],
+    ) -> tuple[int, list[Optional[bool]]]:
+        check_mode = self._settings.check_mode
+        try:
+            # timeout for cases when site doesn't respond for too long
+            async with self._session_pool.session.request(
+                    'HEAD' if check_mode == CheckMode.HEAD else 'GET',
+                    self._url,
+                    headers=self._validators if check_mode == CheckMode.CONDITIONAL else None,
+                    timeout=self._settings.timeout or self._period,
+                    trace_request_ctx=timer,
+            ) as response:
+                if response.status == HTTPStatus.NOT_MODIFIED:
+                    # page is the same as during the last full check, so are the regexp results
+                    matches = [check.last_match for check in checks]
+                elif check_mode == CheckMode.CONDITIONAL:
+                    # results are reused until the page changes again, so the followers which aren't due yet
+                    # need them as well
+                    everyone = [self, *self._followers]
+                    all_matches = await self._match_body(response, everyone)
+                    self._remember_validators(response, everyone, all_matches)
+                    matches = [match for check, match in zip(everyone, all_matches) if check in checks]
+                else:
+                    matches = await self._match_body(response, checks)
+                timer.mark('body_end')
+                await self._drain(response)
+                # any response means the website is up, failing status codes are up to the checks to report
+                self._record(success=True)
+                return response.status, matches
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as error:
+            logger.error('Failed to get status for %s. %s: %s', self._url, error.__class__.__name__, error)
+            self._record(success=False)
+            # assume that connection error is not our fault, but the error log should give a clue
+            return 500, [None if not check.settings.regexp else False for check in checks]
+
+    @staticmethod
+    async def _drain(response: aiohttp.ClientResponse):
+        # aiohttp returns the connection to the pool only when the whole body is read, otherwise it's closed
+        if response.content_length is not None and response.content_length > DRAIN_MAX_BYTES:
+            response.close()
+            return
+        bytes_read = 0
+        try:
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                bytes_read += len(chunk)
+                if bytes_read > DRAIN_MAX_BYTES:
+                    response.close()
+                    return
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            # the check is done already, only the connection is lost
+            response.close()
+
+    def _record(self, success: bool):
+        if self._breaker is not None:
+            self._breaker.record(success)
 
-        # in case there are some heavy calculations
-        if await loop.run_in_executor(None, self._regexp.search, text):
-            return True
+    def _remember_validators(
+            self,
+            response: aiohttp.ClientResponse,
+            checks: list['WebsiteWorker'],
+            matches: list[Optional[bool]],
+    ):
+        self._validators = {}
+        # a search that took too long has no result to reuse, so the next check is a full one
+        timed_out = any(check.settings.regexp and match is None for check, match in zip(checks, matches))
+        if response.status != HTTPStatus.OK or timed_out:
+            return
+        if etag := response.headers.get(hdrs.ETAG):
+            self._validators[hdrs.IF_NONE_MATCH] = etag
+        if last_modified := response.headers.get(hdrs.LAST_MODIFIED):
+            self._validators[hdrs.IF_MODIFIED_SINCE] = last_modified
+        for check, regexp_match in zip(checks, matches):
+            check.last_match = regexp_match
 
-        return False
+    async def _match_body(
+            self,
+            response: aiohttp.ClientResponse,
+            checks: list['WebsiteWorker'],
+    ) -> list[Optional[bool]]:
+        # body is needed only to look for regexps, without any it isn't matched at all
+        encoding = response.charset or 'utf-8'
+        matchers = {check: matcher for check in checks if (matcher := check.create_matcher(encoding)) is not None}
+        found: dict[WebsiteWorker, Optional[bool]] = {}
+        if matchers:
+            # every check reads the body up to its own limit, the download stops once all of them are done
+            bytes_read = 0
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                for check, matcher in list(matchers.items()):
+                    max_body_bytes = check.settings.max_body_bytes
+                    matched = await matcher.feed(chunk[:max(max_body_bytes - bytes_read, 0)])
+                    if matched is not False:
+                        found[check] = matched
+                    elif bytes_read + len(chunk) >= max_body_bytes:
+                        logger.warning('Body of %s is larger than %s bytes, the rest is not checked',
+                                       self._url, max_body_bytes)
+                        found[check] = await matcher.finish()
+                    else:
+                        continue
+                    del matchers[check]
+                bytes_read += len(chunk)
+                if not matchers:
+                    break
+            for check, matcher in matchers.items():
+                found[check] = await matcher.finish()
+        return [found.get(check) for check in checks]
@@ -1,6 +1,7 @@
 import asyncio
 import asyncio.exceptions
 import time
+from typing import Optional
 
 from monitor.utils import logger
 
@@ -10,6 +11,24 @@ class Worker:
         self._period = period
         self._name = name
 
+    @property
+    def period(self) -> float:
+        return self._period
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def phase_key(self) -> str:
+        # identifies the worker when its runs are spread, so it has to be the same between restarts
+        return self._name
+
+    @property
+    def host(self) -> Optional[str]:
+        # host the worker talks to, checks of the same host can be limited by the scheduler
+        return None
+
     async def run(self):
         logger.info('Running worker %s', self._name)
         try:
@@ -0,0 +1,39 @@
+import datetime
+from typing import Optional
+
+from monitor.serializers import DbWorkerSettings, MonitoringResult
+
+
+def make_result(
+    url: str = 'https://foo.com', timestamp: Optional[datetime.datetime] = None, **kwargs
+) -> MonitoringResult:
+    fields = {'status_code': 200, 'response_time': 0.1, 'regexp_match': None, **kwargs}
+    return MonitoringResult(url=url, timestamp=timestamp or datetime.datetime.now(), **fields)
+
+
+def make_results(
+    count: int,
+    url: str = 'https://foo.com',
+    start: Optional[datetime.datetime] = None,
+    step: datetime.timedelta = datetime.timedelta(seconds=1),
+) -> list[MonitoringResult]:
+    # every field varies, so the results can be told apart and each kind of value goes through what's tested
+    start = start or datetime.datetime.now().replace(microsecond=0)
+    return [
+        MonitoringResult(
+            url=url,
+            timestamp=start + i * step,
+            status_code=500 if i % 7 == 0 else 200,
+            response_time=0.05 * (1 + i * 5 % 17),
+            regexp_match=(None, True, False)[i % 3],
+            dns_time=None if i % 2 else 0.01 * i,
+            connect_time=0.02 * i,
+            ttfb=0.03 * i,
+            body_time=None,
+        )
+        for i in range(count)
+    ]
+
+
+def make_settings(**kwargs) -> DbWorkerSettings:
+    return DbWorkerSettings(**{'period': 0.1, 'max_batch_size': 10, **kwargs})
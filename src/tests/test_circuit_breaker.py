@@ -0,0 +1,52 @@
+from monitor.fetch import CircuitBreaker, BreakerState
+from monitor.fetch.circuit_breaker import BREAKER_TRANSITIONS
+from monitor.serializers import BreakerSettings
+
+
+def check(breaker: CircuitBreaker, success: bool):
+    breaker.before_check()
+    breaker.record(success)
+
+
+def test_breaker_opens_after_failures_in_row():
+    breaker = CircuitBreaker(BreakerSettings(failures=3, backoff=2, max_period=600), name='foo')
+    check(breaker, False)
+    check(breaker, False)
+    # a success in between starts the count over
+    check(breaker, True)
+    check(breaker, False)
+    check(breaker, False)
+    assert breaker.state == BreakerState.CLOSED
+    assert breaker.period(10) == 10
+
+    check(breaker, False)
+    assert breaker.state == BreakerState.OPEN
+    assert breaker.period(10) == 20
+
+
+def test_breaker_backs_off_and_recovers():
+    opened = BREAKER_TRANSITIONS.get(labels=(BreakerState.HALF_OPEN, BreakerState.OPEN))
+    breaker = CircuitBreaker(BreakerSettings(failures=1, backoff=2, max_period=50), name='foo')
+    check(breaker, False)
+
+    periods = []
+    for _ in range(4):
+        breaker.before_check()
+        assert breaker.state == BreakerState.HALF_OPEN
+        breaker.record(False)
+        periods.append(breaker.period(10))
+    assert periods == [40, 50, 50, 50]
+    assert BREAKER_TRANSITIONS.get(labels=(BreakerState.HALF_OPEN, BreakerState.OPEN)) == opened + 4
+
+    check(breaker, True)
+    assert breaker.state == BreakerState.CLOSED
+    assert breaker.period(10) == 10
+    # and it takes the whole number of failures to open it again
+    check(breaker, False)
+    assert breaker.period(10) == 20
+
+
+def test_breaker_never_shortens_period():
+    breaker = CircuitBreaker(BreakerSettings(failures=1, backoff=2, max_period=60), name='foo')
+    check(breaker, False)
+    assert breaker.period(300) == 300
@@ -0,0 +1,22 @@
+import pytest
+
+from monitor.db import ConnectionPool
+from monitor.serializers import DbConnectionSettings, DbWorkerSettings
+
+UNREACHABLE_DB = DbConnectionSettings(
+    host='localhost',
+    port='1',  # nothing should listen here
+    username='username',
+    password='password',
+    db='defaultdb',
+    ssl=False,
+)
+
+
+@pytest.mark.asyncio
+async def test_check_fails_for_unreachable_db():
+    pool = ConnectionPool(dsn=UNREACHABLE_DB.dsn, settings=DbWorkerSettings(period=1, max_batch_size=1))
+    assert not await pool.check()
+    # failed pool is dropped, so it can be recreated later
+    assert pool._pool is None  # pylint: disable = protected-access
+    await pool.close()
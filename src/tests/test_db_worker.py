@@ -1,12 +1,23 @@
 import asyncio
 import datetime
+from unittest import mock
 
 import aiopg
 import pytest
 from pytest_postgresql.janitor import DatabaseJanitor
 
-from monitor.serializers import DbConnectionSettings, DbWorkerSettings, MonitoringResult
-from monitor.worker.db_worker import DbWorker, TABLE_NAME
+from monitor.db import TABLE_NAME, PARTITIONED_TABLE_NAME, URLS_TABLE_NAME
+from monitor.rollup import Rollup, ROLLUP_TABLE_NAME
+from monitor.serializers import (
+    DbConnectionSettings,
+    DbWorkerSettings,
+    MonitoringResult,
+    InsertMode,
+    SchemaMode,
+    RollupSettings,
+)
+from monitor.worker.db_worker import DbWorker
+from .conftest import make_result
 
 
 @pytest.fixture(name='db_connection_settings', scope='session')
@@ -104,3 +115,207 @@ async def test_worker_creates_entries(db_connection_settings):
         async for row in cursor:
             ret.append(row)
     assert ret[0][0] == entries_count
+
+
+@pytest.mark.asyncio
+async def test_worker_reuses_pool(db_connection_settings):
+    worker_settings = DbWorkerSettings(period=0.1, max_batch_size=100, pool_min_size=1, pool_max_size=1)
+    queue = asyncio.Queue()
+    worker = DbWorker(connection_settings=db_connection_settings, worker_settings=worker_settings, queue=queue)
+
+    loop = asyncio.get_event_loop()
+    worker_task = loop.create_task(worker.run())
+
+    async def fill_queue():
+        for _ in range(3):
+            await queue.put(
+                MonitoringResult(
+                    url='https://bar.com',
+                    timestamp=datetime.datetime.now(),
+                    status_code=200,
+                    response_time=0.1,
+                    regexp_match=True
+                )
+            )
+            await asyncio.sleep(worker_settings.period)
+        await asyncio.sleep(worker_settings.period)
+        worker_task.cancel()
+
+    test_task = loop.create_task(fill_queue())
+
+    await asyncio.gather(worker_task, test_task)
+
+    async with aiopg.connect(dsn=db_connection_settings.dsn) as conn:
+        cursor = await conn.cursor()
+        await cursor.execute(f'SELECT count(*) FROM {TABLE_NAME} WHERE url = %s;', ('https://bar.com',))
+        ret = []
+        async for row in cursor:
+            ret.append(row)
+    assert ret[0][0] == 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('insert_mode', tuple(InsertMode))
+async def test_worker_inserts_unsafe_url(db_connection_settings, insert_mode: InsertMode):
+    worker_settings = DbWorkerSettings(period=0.1, max_batch_size=100, insert_mode=insert_mode)
+    queue = asyncio.Queue()
+    worker = DbWorker(connection_settings=db_connection_settings, worker_settings=worker_settings, queue=queue)
+    url = f'https://foo.com/?q=it\'s-{insert_mode}'
+
+    for regexp_match in (None, True, False):
+        await queue.put(
+            MonitoringResult(
+                url=url,
+                timestamp=datetime.datetime.now(),
+                status_code=200,
+                response_time=0.1,
+                regexp_match=regexp_match
+            )
+        )
+
+    loop = asyncio.get_event_loop()
+    worker_task = loop.create_task(worker.run())
+
+    async def stop_test():
+        await asyncio.sleep(worker_settings.period + 0.1)
+        worker_task.cancel()
+
+    test_task = loop.create_task(stop_test())
+
+    await asyncio.gather(worker_task, test_task)
+
+    async with aiopg.connect(dsn=db_connection_settings.dsn) as conn:
+        cursor = await conn.cursor()
+        await cursor.execute(f'SELECT regexp_match FROM {TABLE_NAME} WHERE url = %s;', (url,))
+        ret = []
+        async for row in cursor:
+            ret.append(row[0])
+    assert sorted(ret, key=str) == sorted([None, True, False], key=str)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('insert_mode', tuple(InsertMode))
+async def test_worker_writes_partitioned(db_connection_settings, insert_mode: InsertMode):
+    worker_settings = DbWorkerSettings(
+        period=0.1, max_batch_size=100, insert_mode=insert_mode, schema_mode=SchemaMode.PARTITIONED
+    )
+    queue = asyncio.Queue()
+    worker = DbWorker(connection_settings=db_connection_settings, worker_settings=worker_settings, queue=queue)
+    url = f'https://partitioned.com/{insert_mode}'
+
+    for _ in range(3):
+        await queue.put(make_result(url))
+
+    loop = asyncio.get_event_loop()
+    worker_task = loop.create_task(worker.run())
+
+    async def stop_test():
+        await asyncio.sleep(worker_settings.period + 0.1)
+        worker_task.cancel()
+
+    test_task = loop.create_task(stop_test())
+
+    await asyncio.gather(worker_task, test_task)
+
+    async with aiopg.connect(dsn=db_connection_settings.dsn) as conn:
+        cursor = await conn.cursor()
+        await cursor.execute(
+            f'SELECT count(*) FROM {PARTITIONED_TABLE_NAME} JOIN {URLS_TABLE_NAME} ON url_id = id WHERE url = %s;',
+            (url,)
+        )
+        ret = []
+        async for row in cursor:
+            ret.append(row)
+    assert ret[0][0] == 3
+
+
+@pytest.mark.asyncio
+async def test_worker_writes_rollups(db_connection_settings):
+    worker_settings = DbWorkerSettings(period=0.1, max_batch_size=100)
+    queue = asyncio.Queue()
+    rollup = Rollup(RollupSettings(window=1, grace=0, raw_rows=False))
+    worker = DbWorker(
+        connection_settings=db_connection_settings, worker_settings=worker_settings, queue=queue, rollup=rollup
+    )
+    url = 'https://rollup.com'
+    for _ in range(3):
+        rollup.add(make_result(url))
+
+    loop = asyncio.get_event_loop()
+    worker_task = loop.create_task(worker.run())
+
+    async def stop_test():
+        # window has to close first, then the worker wakes up to flush it
+        await asyncio.sleep(2.5)
+        worker_task.cancel()
+
+    test_task = loop.create_task(stop_test())
+
+    await asyncio.gather(worker_task, test_task)
+
+    async with aiopg.connect(dsn=db_connection_settings.dsn) as conn:
+        cursor = await conn.cursor()
+        await cursor.execute(f'SELECT checks, statuses FROM {ROLLUP_TABLE_NAME} WHERE url = %s;', (url,))
+        ret = []
+        async for row in cursor:
+            ret.append(row)
+    assert ret == [(3, {'200': 3})]
+
+
+@pytest.mark.asyncio
+async def test_batch_flushed_when_full():
+    # collecting a batch doesn't touch the DB, so any connection settings will do
+    connection_settings = DbConnectionSettings(host='localhost', port='1', username='', password='', db='')
+    worker_settings = DbWorkerSettings(period=10, max_batch_size=3)
+    queue = asyncio.Queue()
+    worker = DbWorker(connection_settings=connection_settings, worker_settings=worker_settings, queue=queue)
+    for _ in range(5):
+        queue.put_nowait(make_result())
+
+    batch = await asyncio.wait_for(worker._collect_batch(), timeout=1)  # pylint: disable = protected-access
+
+    assert len(batch) == worker_settings.max_batch_size
+    assert queue.qsize() == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_flushed_on_deadline():
+    connection_settings = DbConnectionSettings(host='localhost', port='1', username='', password='', db='')
+    worker_settings = DbWorkerSettings(period=0.1, max_batch_size=100)
+    queue = asyncio.Queue()
+    worker = DbWorker(connection_settings=connection_settings, worker_settings=worker_settings, queue=queue)
+
+    async def produce():
+        queue.put_nowait(make_result())
+        await asyncio.sleep(worker_settings.period / 2)
+        queue.put_nowait(make_result())
+        await asyncio.sleep(worker_settings.period)
+        queue.put_nowait(make_result())
+
+    producer = asyncio.create_task(produce())
+    batch = await worker._collect_batch()  # pylint: disable = protected-access
+    await producer
+
+    assert len(batch) == 2
+    assert queue.qsize() == 1
+
+
+@pytest.mark.asyncio
+async def test_recovery_backs_off():
+    connection_settings = DbConnectionSettings(host='localhost', port='1', username='', password='', db='')
+    # the period is 0, but an unreachable DB is still not retried in a tight loop
+    worker_settings = DbWorkerSettings(period=0, max_batch_size=10, retry_interval=0.5, max_retry_interval=3)
+    worker = DbWorker(connection_settings=connection_settings, worker_settings=worker_settings, queue=asyncio.Queue())
+    with (
+        mock.patch.object(worker, '_recover', mock.AsyncMock(return_value=False)),
+        mock.patch('monitor.worker.db_worker.asyncio.sleep', mock.AsyncMock()) as sleep,
+    ):
+        for _ in range(5):
+            await worker.task()
+        assert [call.args[0] for call in sleep.call_args_list] == [0.5, 1, 2, 3, 3]
+
+        # once the DB is back, the next outage starts from the shortest interval again
+        worker._recover.return_value = True  # pylint: disable = protected-access
+        with mock.patch.object(worker, '_collect_batch', mock.AsyncMock(return_value=[])):
+            await worker.task()
+    assert worker._retry_interval == 0.5  # pylint: disable = protected-access
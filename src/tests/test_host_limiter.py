@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+from monitor.fetch import HostLimiter
+
+
+@pytest.mark.asyncio
+async def test_limiter_queues_checks_of_same_host():
+    limiter = HostLimiter(limit=2)
+    running = {'foo.com': 0, 'bar.com': 0}
+    max_running = dict(running)
+
+    async def check(host: str):
+        await limiter.acquire(host)
+        running[host] += 1
+        max_running[host] = max(max_running[host], running[host])
+        await asyncio.sleep(0.01)
+        running[host] -= 1
+        limiter.release(host)
+
+    await asyncio.gather(*(check(host) for host in ('foo.com', 'bar.com') for _ in range(5)))
+
+    assert max_running == {'foo.com': 2, 'bar.com': 2}
+    # hosts nobody waits for are forgotten
+    assert len(limiter) == 0
+
+
+@pytest.mark.asyncio
+async def test_limiter_forgets_cancelled_waiter():
+    limiter = HostLimiter(limit=1)
+    await limiter.acquire('foo.com')
+    waiter = asyncio.create_task(limiter.acquire('foo.com'))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    limiter.release('foo.com')
+    assert len(limiter) == 0
@@ -0,0 +1,25 @@
+import asyncio
+import subprocess
+import sys
+from unittest import mock
+
+from monitor.utils import setup_loop
+
+
+def test_default_loop():
+    assert setup_loop('asyncio') == 'asyncio'
+
+
+def test_uvloop_falls_back_when_missing():
+    policy = asyncio.get_event_loop_policy()
+    # None in sys.modules makes the import fail, whether uvloop is installed or not
+    with mock.patch.dict(sys.modules, {'uvloop': None}):
+        assert setup_loop('uvloop') == 'asyncio'
+    assert asyncio.get_event_loop_policy() is policy
+
+
+def test_entry_point_does_not_import_asyncio():
+    # --help and --validate don't need the loop, so they don't pay for importing it
+    code = 'import sys, monitor.main; print("asyncio" in sys.modules)'
+    output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+    assert output.strip() == 'False'
@@ -0,0 +1,70 @@
+import re
+from typing import Optional
+
+import pytest
+
+from monitor.fetch import StreamingMatcher, RegexpEngine
+
+
+async def feed_all(matcher: StreamingMatcher, chunks: list[bytes]) -> Optional[bool]:
+    for chunk in chunks:
+        found = await matcher.feed(chunk)
+        if found is not False:
+            return found
+    return await matcher.finish()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('chunks,found', (
+        pytest.param([b'foo Dummy data bar'], True, id='single_chunk'),
+        pytest.param([b'foo Dum', b'my da', b'ta bar'], True, id='across_chunks'),
+        pytest.param([b'foo Dum', b'my', b' dat'], False, id='not_found'),
+        pytest.param([], False, id='empty_body'),
+))
+async def test_matcher(chunks: list[bytes], found: bool):
+    matcher = StreamingMatcher(regexp=re.compile('Dummy data'), overlap=16, engine=RegexpEngine(batch_size=1))
+    assert await feed_all(matcher, chunks) is found
+
+
+@pytest.mark.asyncio
+async def test_matcher_without_overlap_misses_split_match():
+    matcher = StreamingMatcher(regexp=re.compile('Dummy data'), overlap=0, engine=RegexpEngine(batch_size=1))
+    assert not await feed_all(matcher, [b'Dummy', b' data'])
+
+
+@pytest.mark.asyncio
+async def test_matcher_batches_chunks():
+    matcher = StreamingMatcher(regexp=re.compile('Dummy data'), overlap=0, engine=RegexpEngine(batch_size=1024))
+    # chunks are searched together, so overlap doesn't matter here
+    assert not await matcher.feed(b'Dummy')
+    assert await feed_all(matcher, [b' data'])
+
+
+@pytest.mark.asyncio
+async def test_matcher_decodes_split_characters():
+    data = 'привет'.encode()
+    matcher = StreamingMatcher(regexp=re.compile('привет'), overlap=16, engine=RegexpEngine(batch_size=1))
+    assert await feed_all(matcher, [data[:3], data[3:]])
+
+
+@pytest.mark.asyncio
+async def test_matcher_unknown_encoding():
+    matcher = StreamingMatcher(
+        regexp=re.compile('data'),
+        overlap=16,
+        engine=RegexpEngine(batch_size=1),
+        encoding='no-such-encoding',
+    )
+    assert await feed_all(matcher, [b'data'])
+
+
+class TimingOutEngine(RegexpEngine):
+    async def search(self, regexp: re.Pattern, text: str) -> Optional[bool]:
+        return None
+
+
+@pytest.mark.asyncio
+async def test_matcher_stops_when_search_times_out():
+    matcher = StreamingMatcher(regexp=re.compile('Dummy data'), overlap=16, engine=TimingOutEngine(batch_size=1))
+    # the result is unknown, there is no point in searching the rest of the body
+    assert await matcher.feed(b'foo') is None
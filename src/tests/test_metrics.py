@@ -0,0 +1,73 @@
+import asyncio
+import socket
+
+import aiohttp
+import pytest
+
+from monitor.metrics import Registry, MetricsServer
+from monitor.serializers import MetricsSettings
+
+
+def test_counter():
+    counter = Registry().counter('test_total', 'Test counter', ('worker',))
+    counter.inc(labels=('a',))
+    counter.inc(2, labels=('a',))
+    counter.inc(labels=('b',))
+    assert counter.get(('a',)) == 3
+    assert counter.render() == [
+        '# HELP test_total Test counter',
+        '# TYPE test_total counter',
+        'test_total{worker="a"} 3.0',
+        'test_total{worker="b"} 1.0',
+    ]
+
+
+def test_gauge_function():
+    gauge = Registry().gauge('test_gauge', 'Test gauge')
+    gauge.set(1)
+    assert gauge.get() == 1
+    gauge.set_function(lambda: 5)
+    assert gauge.render()[-1] == 'test_gauge 5.0'
+
+
+def test_histogram():
+    histogram = Registry().histogram('test_seconds', 'Test histogram', buckets=(0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value)
+    assert histogram.count == 3
+    assert histogram.render()[2:] == [
+        'test_seconds_bucket{le="0.1"} 1',
+        'test_seconds_bucket{le="1.0"} 2',
+        'test_seconds_bucket{le="+Inf"} 3',
+        'test_seconds_sum 5.55',
+        'test_seconds_count 3',
+    ]
+
+
+def test_registry_rejects_duplicates():
+    test_registry = Registry()
+    test_registry.counter('test_total', 'Test counter')
+    with pytest.raises(ValueError):
+        test_registry.gauge('test_total', 'Test gauge')
+
+
+@pytest.mark.asyncio
+async def test_metrics_server():
+    server_socket = socket.socket(socket.AF_INET, type=socket.SOCK_STREAM)
+    server_socket.bind(('127.0.0.1', 0))
+    _, port = server_socket.getsockname()
+    server_socket.close()
+
+    server = MetricsServer(MetricsSettings(port=port, loop_lag_interval=0.01))
+    server_task = asyncio.create_task(server.run())
+    await asyncio.sleep(0.1)
+
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f'http://127.0.0.1:{port}/metrics') as response:
+            assert response.status == 200
+            text = await response.text()
+    server_task.cancel()
+    await server_task
+
+    assert '# TYPE monitor_event_loop_lag_seconds gauge' in text
+    assert 'monitor_event_loop_lag_seconds ' in text
@@ -0,0 +1,156 @@
+import asyncio
+import multiprocessing
+import pathlib
+import time
+
+import pytest
+
+from monitor.monitor import Monitor
+from monitor.serializers import MonitorSettings, DbConnectionSettings
+
+
+def make_settings(websites: list[dict]) -> MonitorSettings:
+    return MonitorSettings(db={'period': 1, 'max_batch_size': 10}, websites=websites)
+
+
+@pytest.fixture(name='db_connection_settings')
+def db_connection_settings_fixture() -> DbConnectionSettings:
+    return DbConnectionSettings(host='localhost', port='5432', username='user', password='password', db='db')
+
+
+def test_reload_diffs_websites(db_connection_settings):
+    monitor = Monitor(
+        settings=make_settings([
+            {'url': 'https://kept.com/', 'period': 10},
+            {'url': 'https://retuned.com/', 'period': 10},
+            {'url': 'https://removed.com/', 'period': 10},
+        ]),
+        db_connection_settings=db_connection_settings,
+    )
+    kept, retuned, _ = monitor._website_workers  # pylint: disable = protected-access, unbalanced-tuple-unpacking
+
+    monitor.reload_from(lambda: make_settings([
+        {'url': 'https://kept.com/', 'period': 10},
+        {'url': 'https://retuned.com/', 'period': 30},
+        {'url': 'https://added.com/', 'period': 10},
+    ]))
+
+    workers = monitor._website_workers  # pylint: disable = protected-access
+    assert [str(worker.settings.url) for worker in workers] == [
+        'https://kept.com/', 'https://retuned.com/', 'https://added.com/',
+    ]
+    assert workers[0] is kept
+    assert workers[1] is retuned
+    assert retuned.period == 30
+    assert len(monitor.scheduler) == 3
+
+
+def test_reload_handles_duplicates_and_regexps(db_connection_settings):
+    monitor = Monitor(
+        settings=make_settings([
+            {'url': 'https://foo.com/', 'period': 10},
+            {'url': 'https://foo.com/', 'period': 10},
+            {'url': 'https://foo.com/', 'period': 10, 'regexp': 'foo'},
+        ]),
+        db_connection_settings=db_connection_settings,
+    )
+    before = list(monitor._website_workers)  # pylint: disable = protected-access
+
+    # changed regexp means a different check, so the worker is replaced
+    monitor.reload_from(lambda: make_settings([
+        {'url': 'https://foo.com/', 'period': 10},
+        {'url': 'https://foo.com/', 'period': 10, 'regexp': 'bar'},
+    ]))
+
+    after = monitor._website_workers  # pylint: disable = protected-access
+    assert len(after) == 2
+    assert after[0] in before[:2]
+    assert after[1] not in before
+    assert after[1].key == ('https://foo.com/', 'bar')
+    # both checks share the url, so only one of them is scheduled
+    assert len(monitor.scheduler) == 1
+
+
+def test_checks_of_same_url_grouped(db_connection_settings):
+    monitor = Monitor(
+        settings=make_settings([
+            {'url': 'https://foo.com/', 'period': 30, 'regexp': 'foo'},
+            {'url': 'https://foo.com/', 'period': 10, 'regexp': 'bar'},
+            {'url': 'https://foo.com/', 'period': 10, 'check_mode': 'head'},
+            {'url': 'https://bar.com/', 'period': 10},
+        ]),
+        db_connection_settings=db_connection_settings,
+    )
+    slow, fast, head, other = monitor._website_workers  # pylint: disable = protected-access, unbalanced-tuple-unpacking
+
+    # head requests can't serve regexp checks, so they make a group of their own
+    assert monitor._leaders == {fast, head, other}  # pylint: disable = protected-access
+    assert len(monitor.scheduler) == 3
+    assert fast.period == 10
+    assert slow.period == 30
+
+    # the most frequent check leads the group, even if it was a follower before
+    monitor.reload_from(lambda: make_settings([
+        {'url': 'https://foo.com/', 'period': 5, 'regexp': 'foo'},
+        {'url': 'https://foo.com/', 'period': 10, 'regexp': 'bar'},
+    ]))
+    assert monitor._leaders == {slow}  # pylint: disable = protected-access
+    assert len(monitor.scheduler) == 1
+
+
+def test_reload_resizes_queue(db_connection_settings):
+    settings = MonitorSettings(db={'period': 1, 'max_batch_size': 3, 'writers': 2}, websites=[])
+    monitor = Monitor(settings=settings, db_connection_settings=db_connection_settings)
+    # without websites there is still room for a batch of every writer
+    assert monitor._queue.maxsize == 6  # pylint: disable = protected-access
+
+    websites = [{'url': f'https://foo{i}.com/', 'period': 10} for i in range(5)]
+    monitor.reload_from(lambda: settings.model_copy(update={'websites': make_settings(websites).websites}))
+    assert monitor._queue.maxsize == 10  # pylint: disable = protected-access
+
+
+def make_sqlite_settings(path: pathlib.Path) -> MonitorSettings:
+    return MonitorSettings(db={'period': 1, 'max_batch_size': 10, 'sink': 'sqlite', 'path': str(path)}, websites=[])
+
+
+@pytest.mark.asyncio
+async def test_reloads_are_read_by_loop(tmp_path: pathlib.Path):
+    monitor = Monitor(settings=make_sqlite_settings(tmp_path / 'results.db'))
+    reader, writer = multiprocessing.Pipe(duplex=False)
+    monitor.receive_reloads(reader)
+    run = asyncio.create_task(monitor._run())  # pylint: disable = protected-access
+    await asyncio.sleep(0.1)
+
+    writer.send(make_settings([{'url': 'http://localhost:1/', 'period': 60}]))
+    await asyncio.sleep(0.1)
+    assert len(monitor.scheduler) == 1
+    # sender is gone, the loop stops watching the pipe and goes on
+    writer.close()
+    await asyncio.sleep(0.1)
+
+    monitor.stop()
+    await run
+
+
+@pytest.mark.asyncio
+async def test_reload_loads_settings_off_loop(tmp_path: pathlib.Path):
+    monitor = Monitor(settings=make_sqlite_settings(tmp_path / 'results.db'))
+    run = asyncio.create_task(monitor._run())  # pylint: disable = protected-access
+    await asyncio.sleep(0.1)
+
+    def load_settings() -> MonitorSettings:
+        # e.g. a large targets table
+        time.sleep(0.5)
+        return make_settings([{'url': 'http://localhost:1/', 'period': 60}])
+
+    monitor.reload_from(load_settings)
+    start = time.monotonic()
+    await asyncio.sleep(0.1)
+    # loop went on while the settings were being loaded
+    assert time.monotonic() - start < 0.3
+    assert len(monitor.scheduler) == 0
+    await asyncio.sleep(0.6)
+    assert len(monitor.scheduler) == 1
+
+    monitor.stop()
+    await run
@@ -0,0 +1,64 @@
+import asyncio
+import re
+
+import pytest
+
+from monitor.fetch import RegexpEngine, ProcessRegexpEngine, create_regexp_engine
+from monitor.serializers import RegexpSettings, RegexpEngineType
+
+
+@pytest.mark.parametrize('engine_type,engine_class', (
+        pytest.param(RegexpEngineType.THREAD, RegexpEngine, id='thread'),
+        pytest.param(RegexpEngineType.PROCESS, ProcessRegexpEngine, id='process'),
+))
+def test_create_engine(engine_type: RegexpEngineType, engine_class: type):
+    engine = create_regexp_engine(RegexpSettings(engine=engine_type, processes=1))
+    assert type(engine) is engine_class  # pylint: disable = unidiomatic-typecheck
+    engine.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('engine_type', tuple(RegexpEngineType))
+@pytest.mark.parametrize('pattern,found', (
+        pytest.param('Dummy data', True, id='found'),
+        pytest.param('(?i)DUMMY', True, id='found_with_flags'),
+        pytest.param('Data dummy', False, id='not_found'),
+))
+async def test_engine_search(engine_type: RegexpEngineType, pattern: str, found: bool):
+    engine = create_regexp_engine(RegexpSettings(engine=engine_type, processes=1))
+    assert await engine.search(re.compile(pattern), 'foo Dummy data bar') is found
+    engine.close()
+
+
+@pytest.mark.asyncio
+async def test_process_engine_timeout():
+    engine = ProcessRegexpEngine(RegexpSettings(engine=RegexpEngineType.PROCESS, processes=1, timeout=0.1))
+    # catastrophic backtracking, takes way longer than the timeout, so the result is unknown
+    assert await engine.search(re.compile(r'(a+)+$'), 'a' * 40 + 'b') is None
+    engine.close()
+
+
+@pytest.mark.asyncio
+async def test_process_engine_recovers_from_timeout():
+    engine = ProcessRegexpEngine(RegexpSettings(engine=RegexpEngineType.PROCESS, processes=1, timeout=1))
+    runaway = asyncio.create_task(engine.search(re.compile(r'(a+)+$'), 'a' * 40 + 'b'))
+    await asyncio.sleep(0.1)
+    # waits behind the runaway search, and is made again once the pool is replaced
+    queued = asyncio.create_task(engine.search(re.compile('Dummy'), 'foo Dummy data bar'))
+    assert await runaway is None
+    assert await queued
+    # the only process isn't busy anymore, so the next search doesn't time out
+    assert await engine.search(re.compile('data'), 'foo Dummy data bar')
+    engine.close()
+
+
+@pytest.mark.asyncio
+async def test_process_engine_doesnt_count_waiting():
+    # spawning the processes and waiting for a free one take longer than the timeout, but they don't count
+    engine = ProcessRegexpEngine(RegexpSettings(engine=RegexpEngineType.PROCESS, processes=2, timeout=0.05))
+    pool = engine._pool  # pylint: disable = protected-access
+    searches = [engine.search(re.compile('Dummy'), 'foo Dummy data bar') for _ in range(50)]
+    assert await asyncio.gather(*searches) == [True] * 50
+    # nothing ran past the timeout, so the pool is still the same
+    assert engine._pool is pool  # pylint: disable = protected-access
+    engine.close()
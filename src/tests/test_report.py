@@ -0,0 +1,270 @@
+# When testing, we can do all sort of weird stuff
+# pylint: disable = protected-access
+import datetime
+import io
+import json
+import re
+from unittest import mock
+
+import psycopg2
+import pytest
+from pytest_postgresql.janitor import DatabaseJanitor
+
+from monitor.db import TABLE_NAME, PARTITIONED_TABLE_NAME, URLS_TABLE_NAME
+from monitor.db.schema import SCHEMA_LOCK_ID
+from monitor.report import Report, TimeRange, SUMMARY_TABLE_NAME, write_report
+from monitor.report.queries import SUMMARY_ACCURACY, floor_hour, split_range
+from monitor.serializers import DbConnectionSettings, MonitoringResult, RollupResult, SchemaMode
+from monitor.sink import create_sink
+from .conftest import make_results, make_settings
+
+START = datetime.datetime(2023, 3, 1, 10, 30)
+END = datetime.datetime(2023, 3, 1, 15, 15)
+
+
+def hour(value: int) -> datetime.datetime:
+    return datetime.datetime(2023, 3, 1, value)
+
+
+@pytest.mark.parametrize('coverage, expected', [
+    pytest.param(
+        TimeRange(hour(0), hour(23)),
+        (TimeRange(START, hour(11)), TimeRange(hour(11), hour(15)), TimeRange(hour(15), END)),
+        id='whole_hours_inside',
+    ),
+    pytest.param(
+        TimeRange(hour(0), hour(13)),
+        (TimeRange(START, hour(11)), TimeRange(hour(11), hour(13)), TimeRange(hour(13), END)),
+        id='summary_behind',
+    ),
+    pytest.param(
+        TimeRange(hour(0), hour(11)),
+        (TimeRange(START, END), TimeRange(END, END), TimeRange(END, END)),
+        id='nothing_summarized',
+    ),
+    pytest.param(
+        None,
+        (TimeRange(START, END), TimeRange(END, END), TimeRange(END, END)),
+        id='no_summary',
+    ),
+])
+def test_split_range(coverage, expected):
+    assert split_range(TimeRange(START, END), coverage) == expected
+
+
+@pytest.mark.parametrize('schema_mode', list(SchemaMode))
+@pytest.mark.parametrize('summary', [True, False])
+@pytest.mark.parametrize('urls', [None, ['https://example.com/']])
+def test_query_parameters(schema_mode, summary, urls):
+    with mock.patch('monitor.report.report.psycopg2.connect'):
+        report = Report(dsn='', schema_mode=schema_mode, urls=urls)
+    with mock.patch.object(Report, 'refresh_summary', return_value=TimeRange(hour(0), hour(12))):
+        query, parameters = report._query(TimeRange(START, END), summary)
+
+    placeholders = set(re.findall(r'%\((\w+)\)s', query))
+    assert placeholders <= set(parameters)
+    assert ('urls' in placeholders) == (urls is not None)
+
+
+def test_write_report():
+    result = RollupResult(
+        url='https://example.com/',
+        window_start=START,
+        window_end=END,
+        checks=3,
+        availability=2 / 3,
+        statuses={200: 2, 503: 1},
+        min_response_time=0.1,
+        max_response_time=0.3,
+        mean_response_time=0.2,
+        p50_response_time=0.2,
+        p90_response_time=0.3,
+        p99_response_time=0.3,
+    )
+
+    stream = io.StringIO()
+    write_report([result], stream, 'csv')
+    header, row = stream.getvalue().splitlines()
+    assert header.split(',') == list(RollupResult._fields)
+    assert '"{""200"": 2, ""503"": 1}"' in row
+
+    stream = io.StringIO()
+    write_report([result], stream, 'jsonl')
+    line = json.loads(stream.getvalue())
+    assert line['statuses'] == {'200': 2, '503': 1}
+    assert line['window_start'] == str(START)
+
+
+@pytest.fixture(name='report_db', scope='session')
+def report_db_fixture(postgresql_proc):
+    # a database of its own, so reported results are only the ones written by these tests
+    dbname = f'{postgresql_proc.dbname}_report'
+    with DatabaseJanitor(
+            user=postgresql_proc.user,
+            host=postgresql_proc.host,
+            port=postgresql_proc.port,
+            dbname=dbname,
+            version=postgresql_proc.version,
+            password=postgresql_proc.password,
+    ):
+        yield DbConnectionSettings(
+            host=postgresql_proc.host,
+            port=str(postgresql_proc.port),
+            username=postgresql_proc.user,
+            password=postgresql_proc.password,
+            db=dbname,
+            ssl=False,
+        )
+
+
+@pytest.fixture(name='db_connection_settings')
+def db_connection_settings_fixture(report_db):
+    yield report_db
+    with psycopg2.connect(report_db.dsn) as connection, connection.cursor() as cursor:
+        for table in (TABLE_NAME, PARTITIONED_TABLE_NAME, URLS_TABLE_NAME, SUMMARY_TABLE_NAME):
+            cursor.execute(f'DROP TABLE IF EXISTS {table} CASCADE')
+    connection.close()
+
+
+async def write_results(db_connection_settings: DbConnectionSettings, schema_mode: SchemaMode, results: list):
+    # written the same way the monitor writes them
+    sink = create_sink(make_settings(max_batch_size=100, schema_mode=schema_mode), db_connection_settings)
+    await sink.setup()
+    await sink.write(results)
+    await sink.close()
+
+
+def percentile(values: list[float], level: float, interpolate: bool) -> float:
+    # exact report interpolates between the closest values like percentile_cont, the summary one approximates
+    # the value at the rank, same as the rollup sketch
+    values = sorted(values)
+    position = level * (len(values) - 1)
+    lower = int(position)
+    if not interpolate:
+        return values[lower]
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def expected_report(results: list[MonitoringResult], report_range: TimeRange, summary: bool) -> RollupResult:
+    results = [result for result in results if report_range.start <= result.timestamp < report_range.end]
+    response_times = [result.response_time for result in results]
+    statuses: dict[int, int] = {}
+    for result in results:
+        statuses[result.status_code] = statuses.get(result.status_code, 0) + 1
+    return RollupResult(
+        url=results[0].url,
+        window_start=report_range.start,
+        window_end=report_range.end,
+        checks=len(results),
+        availability=sum(result.status_code < 400 for result in results) / len(results),
+        statuses=statuses,
+        min_response_time=min(response_times),
+        max_response_time=max(response_times),
+        mean_response_time=sum(response_times) / len(response_times),
+        p50_response_time=percentile(response_times, 0.5, interpolate=not summary),
+        p90_response_time=percentile(response_times, 0.9, interpolate=not summary),
+        p99_response_time=percentile(response_times, 0.99, interpolate=not summary),
+    )
+
+
+def assert_report(actual: RollupResult, expected: RollupResult, summary: bool):
+    assert actual[:6] == expected[:6]
+    assert actual.min_response_time == pytest.approx(expected.min_response_time)
+    assert actual.max_response_time == pytest.approx(expected.max_response_time)
+    assert actual.mean_response_time == pytest.approx(expected.mean_response_time)
+    accuracy = SUMMARY_ACCURACY if summary else 1e-6
+    for field in ('p50_response_time', 'p90_response_time', 'p99_response_time'):
+        assert getattr(actual, field) == pytest.approx(getattr(expected, field), rel=accuracy), field
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('schema_mode', list(SchemaMode))
+@pytest.mark.parametrize('summary', [False, True], ids=['exact', 'summary'])
+async def test_report(db_connection_settings, schema_mode: SchemaMode, summary: bool):
+    # three whole hours of results, the report starts in the middle of the first one, so with the summary
+    # its head still comes from the raw results
+    start = floor_hour(datetime.datetime.now()) - datetime.timedelta(hours=3)
+    frequent = make_results(60, 'https://foo.com/', start, datetime.timedelta(minutes=3))
+    sparse = make_results(30, 'https://bar.com/', start, datetime.timedelta(minutes=6))
+    await write_results(db_connection_settings, schema_mode, frequent + sparse)
+    report_range = TimeRange(start + datetime.timedelta(minutes=30), datetime.datetime.now())
+
+    report = Report(dsn=db_connection_settings.dsn, schema_mode=schema_mode)
+    try:
+        actual_sparse, actual_frequent = report.results(report_range, summary=summary)
+    finally:
+        report.close()
+
+    assert_report(actual_frequent, expected_report(frequent, report_range, summary), summary)
+    assert_report(actual_sparse, expected_report(sparse, report_range, summary), summary)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('schema_mode', list(SchemaMode))
+async def test_report_of_urls(db_connection_settings, schema_mode: SchemaMode):
+    start = floor_hour(datetime.datetime.now()) - datetime.timedelta(hours=2)
+    reported = make_results(20, 'https://foo.com/', start, datetime.timedelta(minutes=5))
+    other = make_results(20, 'https://bar.com/', start, datetime.timedelta(minutes=5))
+    await write_results(db_connection_settings, schema_mode, reported + other)
+    report_range = TimeRange(start, datetime.datetime.now())
+
+    report = Report(dsn=db_connection_settings.dsn, schema_mode=schema_mode, urls=['https://foo.com/'])
+    try:
+        for summary in (False, True):
+            [actual] = report.results(report_range, summary=summary)
+            assert_report(actual, expected_report(reported, report_range, summary), summary)
+    finally:
+        report.close()
+
+
+def summarized_checks(db_connection_settings: DbConnectionSettings) -> dict[datetime.datetime, int]:
+    with psycopg2.connect(db_connection_settings.dsn) as connection, connection.cursor() as cursor:
+        cursor.execute(f'SELECT hour, sum(checks) FROM {SUMMARY_TABLE_NAME} GROUP BY hour')
+        checks = {hour: int(count) for hour, count in cursor.fetchall()}
+    connection.close()
+    return checks
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('schema_mode', list(SchemaMode))
+async def test_refresh_summary_is_incremental(db_connection_settings, schema_mode: SchemaMode):
+    now = floor_hour(datetime.datetime.now())
+    hours = [now - datetime.timedelta(hours=offset) for offset in range(5, 0, -1)]
+    step = datetime.timedelta(minutes=10)
+    await write_results(db_connection_settings, schema_mode, make_results(6, 'https://foo.com/', hours[2], step))
+
+    report = Report(dsn=db_connection_settings.dsn, schema_mode=schema_mode)
+    try:
+        # nothing is summarized yet, so the summary starts from the given moment
+        assert report.refresh_summary(since=hours[2]) == TimeRange(hours[2], hours[3])
+        assert summarized_checks(db_connection_settings) == {hours[2]: 6}
+
+        # results written late to the last summarized hour and to the ones after it are picked up,
+        # the ones older than that are not summarized anymore
+        late = (
+            make_results(6, 'https://foo.com/', hours[0], step)
+            + make_results(3, 'https://bar.com/', hours[2], step)
+            + make_results(12, 'https://bar.com/', hours[3], step / 2)
+        )
+        await write_results(db_connection_settings, schema_mode, late)
+        assert report.refresh_summary(since=hours[0]) == TimeRange(hours[2], hours[4])
+        assert summarized_checks(db_connection_settings) == {hours[2]: 9, hours[3]: 12}
+    finally:
+        report.close()
+
+
+def test_refresh_summary_does_not_wait_for_schema_lock(db_connection_settings):
+    # a writer setting up the schema holds its lock
+    writer = psycopg2.connect(db_connection_settings.dsn)
+    writer.autocommit = True
+    report = Report(dsn=db_connection_settings.dsn, schema_mode=SchemaMode.PLAIN)
+    try:
+        with writer.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_lock(%s)', (SCHEMA_LOCK_ID,))
+        with report._connection, report._connection.cursor() as cursor:
+            cursor.execute('SET lock_timeout = 5000')
+        assert report.refresh_summary(since=datetime.datetime.now()) is None
+    finally:
+        report.close()
+        writer.close()
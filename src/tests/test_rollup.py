@@ -0,0 +1,73 @@
+import datetime
+import random
+
+import pytest
+
+from monitor.rollup import Rollup, Sketch
+from monitor.serializers import RollupResult, RollupSettings
+from .conftest import make_result
+
+
+def test_sketch_quantiles_within_accuracy():
+    generator = random.Random(42)
+    values = sorted(generator.lognormvariate(-2, 1) for _ in range(10000))
+    sketch = Sketch(accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+
+    assert sketch.count == len(values)
+    assert sketch.min == values[0]
+    assert sketch.max == values[-1]
+    for level in (0.5, 0.9, 0.99):
+        expected = values[int(level * (len(values) - 1))]
+        assert sketch.quantile(level) == pytest.approx(expected, rel=0.01)
+
+
+def test_sketch_handles_zeros_and_empty():
+    sketch = Sketch()
+    assert sketch.quantile(0.5) is None
+    for value in (0, 0, 0, 1):
+        sketch.add(value)
+    assert sketch.quantile(0.5) == 0
+    assert sketch.quantile(1) == pytest.approx(1, rel=0.01)
+
+
+def test_rollup_aggregates_closed_windows():
+    rollup = Rollup(RollupSettings(window=60, grace=10))
+    start = datetime.datetime(2023, 1, 1, 12, 0)
+    for second, status_code, response_time in ((0, 200, 0.1), (20, 200, 0.3), (40, 500, 0.2)):
+        timestamp = start + datetime.timedelta(seconds=second)
+        rollup.add(make_result('https://foo.com', timestamp, status_code=status_code, response_time=response_time))
+    rollup.add(make_result('https://bar.com', start))
+    # next window is still open
+    rollup.add(make_result('https://foo.com', start + datetime.timedelta(seconds=60)))
+
+    # window has ended, but late results may still come
+    assert not rollup.pop_closed(now=(start + datetime.timedelta(seconds=65)).timestamp())
+
+    closed = rollup.pop_closed(now=(start + datetime.timedelta(seconds=70)).timestamp())
+    results = {result.url: result for result in closed}
+    assert set(results) == {'https://foo.com', 'https://bar.com'}
+    result: RollupResult = results['https://foo.com']
+    assert result.window_start == start
+    assert result.window_end == start + datetime.timedelta(seconds=60)
+    assert result.checks == 3
+    assert result.availability == pytest.approx(2 / 3)
+    assert result.statuses == {200: 2, 500: 1}
+    assert result.min_response_time == pytest.approx(0.1)
+    assert result.max_response_time == pytest.approx(0.3)
+    assert result.mean_response_time == pytest.approx(0.2)
+    assert result.p50_response_time == pytest.approx(0.2, rel=0.01)
+
+    # already flushed windows are not returned again
+    assert not rollup.pop_closed(now=(start + datetime.timedelta(seconds=70)).timestamp())
+
+
+def test_rollup_restores_failed_windows():
+    rollup = Rollup(RollupSettings(window=60, grace=0))
+    rollup.add(make_result('https://foo.com', datetime.datetime(2023, 1, 1, 12, 0)))
+    results = rollup.pop_closed()
+    assert len(results) == 1
+
+    rollup.restore(results)
+    assert rollup.pop_closed() == results
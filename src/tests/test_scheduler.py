@@ -0,0 +1,182 @@
+# When testing, we can do all sort of weird stuff
+# pylint: disable = protected-access
+import asyncio
+from typing import Optional
+from unittest import mock
+
+import pytest
+
+from monitor.fetch import HostLimiter
+from monitor.serializers import SchedulerSettings
+from monitor.worker import Scheduler
+from monitor.worker.worker import Worker
+
+
+class SlowWorker(Worker):
+    def __init__(self, period: float, duration: float, counter: dict, host: Optional[str] = None):
+        super().__init__(period=period)
+        self._duration = duration
+        self._counter = counter
+        self._host = host
+
+    @property
+    def host(self) -> Optional[str]:
+        return self._host
+
+    async def task(self):
+        self._counter['running'] += 1
+        self._counter['max_running'] = max(self._counter['max_running'], self._counter['running'])
+        await asyncio.sleep(self._duration)
+        self._counter['running'] -= 1
+
+
+async def run_for(scheduler: Scheduler, duration: float):
+    scheduler_task = asyncio.create_task(scheduler.run())
+    await asyncio.sleep(duration)
+    scheduler_task.cancel()
+    await scheduler_task
+
+
+@pytest.mark.asyncio
+async def test_scheduler_runs_workers_periodically():
+    period = 0.1
+    calls = 3
+    scheduler = Scheduler(SchedulerSettings())
+    workers = [Worker(period=period) for _ in range(2)]
+    for worker in workers:
+        worker.task = mock.AsyncMock()
+        scheduler.add(worker)
+
+    await run_for(scheduler, period * calls - period / 2)
+
+    for worker in workers:
+        assert worker.task.call_count == calls
+    assert scheduler.lag.count == calls * len(workers)
+
+
+@pytest.mark.asyncio
+async def test_scheduler_respects_delay():
+    period = 0.1
+    scheduler = Scheduler(SchedulerSettings())
+    worker = Worker(period=period)
+    worker.task = mock.AsyncMock()
+    scheduler.add(worker, delay=period)
+
+    await run_for(scheduler, period / 2)
+
+    assert worker.task.call_count == 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_removes_worker():
+    period = 0.1
+    scheduler = Scheduler(SchedulerSettings())
+    worker = Worker(period=period)
+    worker.task = mock.AsyncMock()
+    scheduler.add(worker)
+    scheduler.remove(worker)
+    assert len(scheduler) == 0
+
+    await run_for(scheduler, period)
+
+    assert worker.task.call_count == 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_limits_concurrency():
+    concurrency = 2
+    counter = {'running': 0, 'max_running': 0}
+    scheduler = Scheduler(SchedulerSettings(concurrency=concurrency))
+    for _ in range(5):
+        scheduler.add(SlowWorker(period=1, duration=0.05, counter=counter))
+
+    await run_for(scheduler, 0.2)
+
+    assert counter['max_running'] == concurrency
+    # checks waiting for a free fetcher are late
+    assert scheduler.lag.max > 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_limits_checks_per_host():
+    busy = {'running': 0, 'max_running': 0}
+    other = {'running': 0, 'max_running': 0}
+    limiter = HostLimiter(limit=1)
+    scheduler = Scheduler(SchedulerSettings(concurrency=2), limiter=limiter)
+    for _ in range(5):
+        scheduler.add(SlowWorker(period=1, duration=0.05, counter=busy, host='busy.com'))
+    scheduler.add(SlowWorker(period=1, duration=0.05, counter=other, host='other.com'))
+
+    await run_for(scheduler, 0.1)
+
+    assert busy['max_running'] == 1
+    # checks waiting for the busy host don't hold the fetchers, so the other host is checked right away
+    assert other['max_running'] == 1
+    # nothing is left behind once the scheduler is stopped
+    assert len(limiter) == 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_survives_failing_worker():
+    period = 0.1
+    scheduler = Scheduler(SchedulerSettings())
+    worker = Worker(period=period)
+    worker.task = mock.AsyncMock(side_effect=RuntimeError('boom'))
+    scheduler.add(worker)
+
+    await run_for(scheduler, period * 2 - period / 2)
+
+    assert worker.task.call_count == 2
+
+
+@pytest.mark.parametrize('due,period,now,expected', (
+        pytest.param(10.0, 5.0, 12.0, 15.0, id='on_time'),
+        pytest.param(10.0, 5.0, 16.0, 20.0, id='late'),
+        pytest.param(10.0, 5.0, 27.0, 30.0, id='skips_missed_runs'),
+))
+def test_next_due_stays_on_grid(due: float, period: float, now: float, expected: float):
+    with mock.patch('monitor.worker.scheduler.time.monotonic', return_value=now):
+        assert Scheduler._next_due(due, period) == expected
+
+
+def test_first_runs_are_not_spread_by_default():
+    scheduler = Scheduler(SchedulerSettings())
+    assert [scheduler._phase(Worker(period=10, name=f'Worker-{i}')) for i in range(3)] == [0.0, 0.0, 0.0]
+
+
+def test_hash_spread_is_deterministic():
+    settings = SchedulerSettings(spread='hash')
+    workers = [Worker(period=10, name=f'Worker-{i}') for i in range(20)]
+    phases = [Scheduler(settings)._phase(worker) for worker in workers]
+
+    assert phases == [Scheduler(settings)._phase(worker) for worker in workers]
+    assert all(0 <= phase < 10 for phase in phases)
+    assert len(set(phases)) == len(phases)
+
+
+def test_even_spread_fills_period():
+    period = 10
+    count = 8
+    scheduler = Scheduler(SchedulerSettings(spread='even'))
+    phases = sorted(scheduler._phase(Worker(period=period)) for _ in range(count))
+
+    gaps = [later - earlier for earlier, later in zip(phases, [*phases[1:], phases[0] + period])]
+    # no gap is more than a couple of times longer than with equal slots
+    assert max(gaps) < 2 * period / count
+    # workers of other periods are spread on their own
+    assert scheduler._phase(Worker(period=5)) == 0.0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_spreads_first_runs():
+    period = 0.2
+    scheduler = Scheduler(SchedulerSettings(spread='even'))
+    workers = [Worker(period=period) for _ in range(2)]
+    for worker in workers:
+        worker.task = mock.AsyncMock()
+        scheduler.add(worker)
+
+    await run_for(scheduler, period / 4)
+
+    # second worker is shifted by more than a half of the period
+    assert [worker.task.call_count for worker in workers] == [1, 0]
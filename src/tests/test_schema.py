@@ -0,0 +1,92 @@
+import datetime
+
+import pytest
+
+from monitor.db import PartitionedSchema, PARTITIONED_TABLE_NAME
+from monitor.db.schema import partition_bounds
+from monitor.serializers import PartitionInterval, SchemaMode
+from .conftest import make_result, make_settings
+
+
+class FakeCursor:
+    # records statements and answers the few queries the schema makes
+    def __init__(self, url_ids: dict[str, int], partitions: list[str]):
+        self.statements: list[str] = []
+        self._url_ids = url_ids
+        self._partitions = partitions
+        self._rows: list[tuple] = []
+
+    async def execute(self, command: str, parameters=None):
+        self.statements.append(command)
+        if 'FROM pg_inherits' in command:
+            self._rows = [(name,) for name in self._partitions]
+        elif command.startswith('SELECT url, id'):
+            self._rows = [(url, self._url_ids[url]) for url in parameters[0]]
+
+    async def fetchall(self) -> list[tuple]:
+        return self._rows
+
+
+def created_partitions(cursor: FakeCursor) -> list[str]:
+    return [statement.split()[5] for statement in cursor.statements if 'PARTITION OF' in statement]
+
+
+@pytest.mark.parametrize('day, interval, expected', [
+    (datetime.date(2023, 2, 14), PartitionInterval.DAY, (datetime.date(2023, 2, 14), datetime.date(2023, 2, 15))),
+    (datetime.date(2023, 1, 31), PartitionInterval.MONTH, (datetime.date(2023, 1, 1), datetime.date(2023, 2, 1))),
+    (datetime.date(2023, 12, 5), PartitionInterval.MONTH, (datetime.date(2023, 12, 1), datetime.date(2024, 1, 1))),
+])
+def test_partition_bounds(day, interval, expected):
+    assert partition_bounds(day, interval) == expected
+
+
+@pytest.mark.asyncio
+async def test_setup_creates_current_partition_only_once():
+    today = datetime.date.today()
+    settings = make_settings(schema_mode=SchemaMode.PARTITIONED, partition_interval=PartitionInterval.DAY)
+    schema = PartitionedSchema(settings)
+
+    cursor = FakeCursor(url_ids={}, partitions=[])
+    await schema.setup(cursor)
+    assert created_partitions(cursor) == [f'{PARTITIONED_TABLE_NAME}_p{today:%Y%m%d}']
+
+    # partition already exists in DB, so it isn't created again
+    cursor = FakeCursor(url_ids={}, partitions=[f'{PARTITIONED_TABLE_NAME}_p{today:%Y%m%d}'])
+    await schema.setup(cursor)
+    assert not created_partitions(cursor)
+
+
+@pytest.mark.asyncio
+async def test_insert_resolves_urls_once():
+    schema = PartitionedSchema(make_settings(schema_mode=SchemaMode.PARTITIONED))
+    now = datetime.datetime.now()
+    cursor = FakeCursor(url_ids={'https://foo.com': 1, 'https://bar.com': 2}, partitions=[])
+    await schema.setup(cursor)
+
+    await schema.insert(cursor, [make_result('https://foo.com', now), make_result('https://bar.com', now)])
+    await schema.insert(cursor, [make_result('https://foo.com', now)])
+
+    lookups = [statement for statement in cursor.statements if statement.startswith('SELECT url, id')]
+    assert len(lookups) == 1
+    prefix = f'INSERT INTO {PARTITIONED_TABLE_NAME} '
+    inserts = [statement for statement in cursor.statements if statement.startswith(prefix)]
+    assert len(inserts) == 2
+
+
+@pytest.mark.asyncio
+async def test_expired_partitions_dropped():
+    today = datetime.date.today()
+    old = today - datetime.timedelta(days=10)
+    settings = make_settings(
+        schema_mode=SchemaMode.PARTITIONED, partition_interval=PartitionInterval.DAY, retention_days=3
+    )
+    schema = PartitionedSchema(settings)
+    cursor = FakeCursor(url_ids={'https://foo.com': 1}, partitions=[f'{PARTITIONED_TABLE_NAME}_p{old:%Y%m%d}'])
+
+    await schema.setup(cursor)
+    assert f'DROP TABLE IF EXISTS {PARTITIONED_TABLE_NAME}_p{old:%Y%m%d}' in cursor.statements
+
+    # results older than retention are not written, so dropped partitions don't come back
+    cursor.statements.clear()
+    await schema.insert(cursor, [make_result('https://foo.com', datetime.datetime.combine(old, datetime.time()))])
+    assert not cursor.statements
@@ -4,7 +4,8 @@ import pydantic
 import pytest
 import yaml
 
-from monitor.serializers.settings import MonitorSettings, WebsiteSetting, DbConnectionSettings
+from monitor.serializers.settings import MonitorSettings, WebsiteSetting, DbConnectionSettings, DbWorkerSettings
+from monitor.serializers import CheckMode
 
 
 def test_valid_yaml():
@@ -76,3 +77,20 @@ def test_db_connection_serializer(ssl_required: bool):
 
     serialized_data = DbConnectionSettings(**data)
     assert serialized_data.dsn == expected_dsn
+
+
+def test_invalid_db_pool_size():
+    with pytest.raises(pydantic.ValidationError):
+        _ = DbWorkerSettings(period=1, max_batch_size=1, pool_min_size=5, pool_max_size=1)
+
+
+def test_head_check_without_regexp():
+    _ = WebsiteSetting(url='https://foo.com', period=10, check_mode=CheckMode.HEAD)
+    with pytest.raises(pydantic.ValidationError):
+        _ = WebsiteSetting(url='https://foo.com', period=10, regexp='foo', check_mode=CheckMode.HEAD)
+
+
+def test_timeout_fits_period():
+    assert WebsiteSetting(url='https://foo.com', period=10, timeout=3).timeout == 3
+    with pytest.raises(pydantic.ValidationError):
+        _ = WebsiteSetting(url='https://foo.com', period=10, timeout=30)
@@ -0,0 +1,32 @@
+import pytest
+
+from monitor.fetch import SessionPool
+from monitor.serializers import HttpSettings
+
+
+@pytest.mark.asyncio
+async def test_session_is_shared():
+    pool = SessionPool(HttpSettings())
+    session = pool.session
+    assert pool.session is session
+    await pool.close()
+    assert session.closed
+
+
+@pytest.mark.asyncio
+async def test_session_recreated_after_close():
+    pool = SessionPool(HttpSettings())
+    session = pool.session
+    await pool.close()
+    assert pool.session is not session
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_connector_limits():
+    settings = HttpSettings(limit=10, limit_per_host=2, keepalive_timeout=30)
+    pool = SessionPool(settings)
+    connector = pool.session.connector
+    assert connector.limit == settings.limit
+    assert connector.limit_per_host == settings.limit_per_host
+    await pool.close()
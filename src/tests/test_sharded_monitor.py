@@ -0,0 +1,36 @@
+from monitor.serializers import MonitorSettings
+from monitor.sharded_monitor import get_shard, shard_settings
+
+
+def make_settings(websites_count: int, spill: bool = False) -> MonitorSettings:
+    data: dict = {
+        'db': {'period': 1, 'max_batch_size': 10},
+        'websites': [{'url': f'https://foo{i}.com/', 'period': 10} for i in range(websites_count)],
+    }
+    if spill:
+        data['spill'] = {'directory': '/tmp/spill'}
+    return MonitorSettings(**data)
+
+
+def test_get_shard_is_stable():
+    assert get_shard('https://foo.com/', 4) == get_shard('https://foo.com/', 4)
+    assert all(0 <= get_shard(f'https://foo{i}.com/', 4) < 4 for i in range(100))
+
+
+def test_shards_cover_all_websites():
+    shards = 4
+    settings = make_settings(100)
+    sharded = [shard_settings(settings, shard, shards) for shard in range(shards)]
+
+    urls = sorted(str(website.url) for shard in sharded for website in shard.websites)
+    assert urls == sorted(str(website.url) for website in settings.websites)
+    assert all(shard.db == settings.db for shard in sharded)
+
+
+def test_shards_have_own_spill():
+    shards = 2
+    settings = make_settings(10, spill=True)
+    directories = {shard_settings(settings, shard, shards).spill.directory for shard in range(shards)}
+    assert directories == {'/tmp/spill/shard-0', '/tmp/spill/shard-1'}
+    # original settings stay untouched
+    assert settings.spill.directory == '/tmp/spill'
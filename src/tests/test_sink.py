@@ -0,0 +1,150 @@
+# When testing, we can do all sort of weird stuff
+# pylint: disable = protected-access
+import asyncio
+import csv
+import datetime
+import pathlib
+import sqlite3
+from unittest import mock
+
+import pytest
+
+from monitor.db import TABLE_NAME
+from monitor.rollup import ROLLUP_TABLE_NAME
+from monitor.serializers import DbWorkerSettings, FileFormat, RollupResult, SinkType
+from monitor.sink import FileSink, SqliteSink, create_sink
+from monitor.sink.files import resolve_format
+from monitor.worker import DbWorker
+from .conftest import make_result, make_settings
+
+TIMESTAMP = datetime.datetime(2023, 3, 1, 12, 30)
+RESULT = make_result(timestamp=TIMESTAMP, regexp_match=True)
+
+
+def make_rollup() -> RollupResult:
+    return RollupResult(
+        url='https://foo.com',
+        window_start=TIMESTAMP,
+        window_end=TIMESTAMP + datetime.timedelta(minutes=1),
+        checks=2,
+        availability=0.5,
+        statuses={200: 1, 500: 1},
+        min_response_time=0.1,
+        max_response_time=0.2,
+        mean_response_time=0.15,
+        p50_response_time=0.1,
+        p90_response_time=0.2,
+        p99_response_time=0.2,
+    )
+
+
+@pytest.mark.asyncio
+async def test_sqlite_sink(tmp_path: pathlib.Path):
+    path = tmp_path / 'results.db'
+    sink = SqliteSink(make_settings(sink=SinkType.SQLITE, path=str(path)), rollups=True)
+    await sink.setup()
+    await sink.write([RESULT, RESULT._replace(url='https://bar.com')])
+    await sink.write_rollups([make_rollup()])
+    await sink.close()
+
+    with sqlite3.connect(path) as connection:
+        assert connection.execute('PRAGMA journal_mode').fetchone() == ('wal',)
+        rows = connection.execute(f'SELECT url, time_stamp, regexp_match FROM {TABLE_NAME} ORDER BY url').fetchall()
+        assert rows == [('https://bar.com', str(TIMESTAMP), 1), ('https://foo.com', str(TIMESTAMP), 1)]
+        rollups = connection.execute(f'SELECT checks, statuses FROM {ROLLUP_TABLE_NAME}').fetchall()
+        assert rollups == [(2, '{"200": 1, "500": 1}')]
+
+
+@pytest.mark.asyncio
+async def test_sqlite_sink_needs_setup(tmp_path: pathlib.Path):
+    sink = SqliteSink(make_settings(sink=SinkType.SQLITE, path=str(tmp_path / 'results.db')))
+    with pytest.raises(sink.errors):
+        await sink.write([RESULT])
+
+
+@pytest.mark.asyncio
+async def test_csv_files_sink_rolls(tmp_path: pathlib.Path):
+    directory = tmp_path / 'results'
+    sink = FileSink(make_settings(sink=SinkType.FILES, path=str(directory), file_format=FileFormat.CSV))
+    await sink.setup()
+    await sink.write([RESULT])
+    # next batch is past the roll interval
+    with mock.patch('monitor.sink.files.time.monotonic', return_value=float('inf')):
+        await sink.write([RESULT, RESULT])
+    await sink.write_rollups([make_rollup()])
+    await sink.close()
+
+    results = sorted(directory.glob('results-*.csv'))
+    assert len(results) == 2
+    with open(results[0], newline='', encoding='utf-8') as results_file:
+        rows = list(csv.DictReader(results_file))
+    assert rows[0]['url'] == 'https://foo.com'
+    assert rows[0]['time_stamp'] == str(TIMESTAMP)
+    assert len(list(directory.glob('rollups-*.csv'))) == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('file_format', [FileFormat.PARQUET, FileFormat.ARROW])
+async def test_arrow_files_sink(tmp_path: pathlib.Path, file_format: FileFormat):
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.ipc  # pylint: disable = import-outside-toplevel, import-error
+    import pyarrow.parquet  # pylint: disable = import-outside-toplevel, import-error
+
+    read = {
+        FileFormat.PARQUET: pyarrow.parquet.read_table,
+        FileFormat.ARROW: lambda path: pyarrow.ipc.open_stream(pyarrow.OSFile(str(path))).read_all(),
+    }[file_format]
+    directory = tmp_path / 'results'
+    sink = FileSink(make_settings(sink=SinkType.FILES, path=str(directory), file_format=file_format))
+    assert pyarrow.ArrowException in sink.errors
+    await sink.setup()
+    await sink.write([RESULT])
+    # a batch without a single regexp match still makes a boolean column
+    await sink.write([RESULT._replace(url='https://bar.com', regexp_match=None)])
+    await sink.write_rollups([make_rollup()])
+    await sink.close()
+
+    [results_path] = directory.glob('results-*')
+    results = read(results_path)
+    assert results.schema.field('regexp_match').type == pyarrow.bool_()
+    assert results.schema.field('time_stamp').type == pyarrow.timestamp('us')
+    assert results.column('url').to_pylist() == ['https://foo.com', 'https://bar.com']
+    assert results.column('regexp_match').to_pylist() == [True, None]
+    assert results.column('time_stamp').to_pylist() == [TIMESTAMP, TIMESTAMP]
+
+    [rollups_path] = directory.glob('rollups-*')
+    rollups = read(rollups_path)
+    assert rollups.column('checks').to_pylist() == [2]
+    assert rollups.column('statuses').to_pylist() == ['{"200": 1, "500": 1}']
+
+
+def test_file_format_falls_back_to_csv():
+    with mock.patch('monitor.sink.files.importlib.util.find_spec', return_value=None):
+        assert resolve_format(None) == FileFormat.CSV
+        assert resolve_format(FileFormat.PARQUET) == FileFormat.CSV
+    with mock.patch('monitor.sink.files.importlib.util.find_spec', return_value=object()):
+        assert resolve_format(None) == FileFormat.PARQUET
+        assert resolve_format(FileFormat.ARROW) == FileFormat.ARROW
+
+
+def test_postgres_sink_needs_connection_settings():
+    with pytest.raises(ValueError):
+        create_sink(DbWorkerSettings(period=1, max_batch_size=10), connection_settings=None)
+
+
+@pytest.mark.asyncio
+async def test_worker_writes_to_sqlite(tmp_path: pathlib.Path):
+    path = tmp_path / 'results.db'
+    queue = asyncio.Queue()
+    worker_settings = make_settings(sink=SinkType.SQLITE, path=str(path))
+    worker = DbWorker(connection_settings=None, worker_settings=worker_settings, queue=queue)
+    for _ in range(3):
+        queue.put_nowait(RESULT)
+
+    worker_task = asyncio.create_task(worker.run())
+    await asyncio.sleep(0.3)
+    worker_task.cancel()
+    await worker_task
+
+    with sqlite3.connect(path) as connection:
+        assert connection.execute(f'SELECT count(*) FROM {TABLE_NAME}').fetchone() == (3,)
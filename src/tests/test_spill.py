@@ -0,0 +1,203 @@
+import pathlib
+
+import pytest
+
+from monitor.serializers import MonitoringResult, RollupResult, SpillSettings
+from monitor.sink import Sink
+from monitor.spill import SpillLog, SpillingQueue
+from monitor.worker import DbWorker
+from .conftest import make_results, make_settings
+
+
+async def replay_all(spill: SpillLog, batch_size: int = 100) -> list[MonitoringResult]:
+    written: list[MonitoringResult] = []
+
+    async def write(batch: list[MonitoringResult]):
+        written.extend(batch)
+
+    while spill.pending:
+        await spill.replay(write, batch_size=batch_size)
+    return written
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('compress', (True, False), ids=('compressed', 'not_compressed'))
+async def test_spill_roundtrip(tmp_path: pathlib.Path, compress: bool):
+    spill = SpillLog(SpillSettings(directory=str(tmp_path), compress=compress))
+    results = make_results(10)
+    spill.append(results[:4])
+    spill.append(results[4:])
+    assert spill.pending
+
+    assert await replay_all(spill, batch_size=3) == results
+    assert not spill.pending
+    assert not list(tmp_path.iterdir())
+    spill.close()
+
+
+@pytest.mark.asyncio
+async def test_spill_keeps_order_across_segments(tmp_path: pathlib.Path):
+    spill = SpillLog(SpillSettings(directory=str(tmp_path), segment_bytes=64))
+    results = make_results(20)
+    for result in results:
+        spill.append([result])
+    assert len(list(tmp_path.iterdir())) > 1
+
+    assert await replay_all(spill) == results
+    spill.close()
+
+
+@pytest.mark.asyncio
+async def test_spill_survives_restart(tmp_path: pathlib.Path):
+    settings = SpillSettings(directory=str(tmp_path))
+    results = make_results(5)
+    spill = SpillLog(settings)
+    spill.append(results)
+    spill.close()
+
+    spill = SpillLog(settings)
+    assert await replay_all(spill) == results
+    spill.close()
+
+
+@pytest.mark.asyncio
+async def test_spill_skips_truncated_frame(tmp_path: pathlib.Path):
+    settings = SpillSettings(directory=str(tmp_path))
+    results = make_results(5)
+    spill = SpillLog(settings)
+    spill.append(results[:3])
+    spill.append(results[3:])
+    spill.close()
+    segment = next(tmp_path.iterdir())
+    segment.write_bytes(segment.read_bytes()[:-1])
+
+    spill = SpillLog(settings)
+    assert await replay_all(spill) == results[:3]
+    spill.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_replay_keeps_segment(tmp_path: pathlib.Path):
+    spill = SpillLog(SpillSettings(directory=str(tmp_path)))
+    results = make_results(5)
+    spill.append(results)
+
+    async def fail(_batch: list[MonitoringResult]):
+        raise RuntimeError('DB is down')
+
+    with pytest.raises(RuntimeError):
+        await spill.replay(fail, batch_size=10)
+    assert spill.pending
+
+    assert await replay_all(spill) == results
+    spill.close()
+
+
+def test_spill_disk_usage_is_bounded(tmp_path: pathlib.Path):
+    spill = SpillLog(SpillSettings(directory=str(tmp_path), segment_bytes=100, max_bytes=300))
+    for result in make_results(50):
+        spill.append([result])
+    assert spill.size <= 300 + 100
+    assert sum(path.stat().st_size for path in tmp_path.iterdir()) == spill.size
+    spill.close()
+
+
+@pytest.mark.asyncio
+async def test_queue_spills_when_full(tmp_path: pathlib.Path):
+    spill = SpillLog(SpillSettings(directory=str(tmp_path)))
+    queue = SpillingQueue(spill=spill, maxsize=1, batch_size=2)
+    results = make_results(4)
+    for result in results:
+        queue.put_nowait(result)
+
+    # overflowing results are appended by batches
+    assert queue.qsize() == 1
+    assert queue.diverting
+    assert await replay_all(spill) == results[1:3]
+    assert queue.catch_up() == results[3:]
+
+    # once the spill is caught up with, the queue is used again
+    queue.drain()
+    queue.put_nowait(results[0])
+    assert queue.qsize() == 1
+    assert not queue.diverting
+    assert not spill.pending
+    queue.close()
+
+
+@pytest.mark.asyncio
+async def test_queue_diverts_until_spill_is_caught_up(tmp_path: pathlib.Path):
+    settings = SpillSettings(directory=str(tmp_path))
+    results = make_results(3)
+    spill = SpillLog(settings)
+    spill.append(results[:1])
+    spill.close()
+
+    # segments of the previous run are older than anything queued now
+    spill = SpillLog(settings)
+    queue = SpillingQueue(spill=spill, maxsize=10)
+    for result in results[1:]:
+        queue.put_nowait(result)
+    assert queue.empty()
+    assert queue.catch_up() == []
+
+    assert await replay_all(spill) == results[:1]
+    assert queue.catch_up() == results[1:]
+    assert not queue.diverting
+    queue.close()
+
+
+@pytest.mark.asyncio
+async def test_queue_diverts_failed_batch(tmp_path: pathlib.Path):
+    spill = SpillLog(SpillSettings(directory=str(tmp_path)))
+    queue = SpillingQueue(spill=spill, maxsize=10)
+    results = make_results(4)
+    queue.put_nowait(results[2])
+    queue.divert(results[:2])
+    queue.put_nowait(results[3])
+
+    # failed batch goes before whatever was queued after it
+    assert queue.empty()
+    assert await replay_all(spill) == results[:3]
+    assert queue.catch_up() == results[3:]
+    queue.close()
+
+
+class RecordingSink(Sink):
+    def __init__(self):
+        self.written: list[MonitoringResult] = []
+
+    async def write(self, entries: list[MonitoringResult]):
+        self.written.extend(entries)
+
+    async def write_rollups(self, results: list[RollupResult]):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_writer_catches_up_with_spill(tmp_path: pathlib.Path):
+    spill = SpillLog(SpillSettings(directory=str(tmp_path)))
+    queue = SpillingQueue(spill=spill, maxsize=2, batch_size=3)
+    sink = RecordingSink()
+    worker = DbWorker(
+        connection_settings=None,
+        worker_settings=make_settings(period=0.01),
+        queue=queue,
+        sink=sink,
+    )
+    results = make_results(40)
+    # a single overflow, after that results keep coming while the writer catches up
+    for result in results[:10]:
+        queue.put_nowait(result)
+    for result in results[10:]:
+        await worker.task()
+        queue.put_nowait(result)
+    while not queue.empty() or queue.diverting:
+        await worker.task()
+
+    assert sink.written == results
+    assert not spill.pending
+    assert queue.qsize() == 0
+    queue.put_nowait(results[0])
+    assert queue.qsize() == 1
+    queue.close()
@@ -0,0 +1,64 @@
+import json
+import pathlib
+
+import pydantic
+import pytest
+
+from monitor.serializers import CheckMode, TargetsSettings, TargetsSource
+from monitor.targets import load_targets, read_csv, validate
+
+
+def test_csv_targets(tmp_path: pathlib.Path):
+    path = tmp_path / 'targets.csv'
+    path.write_text(
+        'url,period,regexp,check_mode\n'
+        'https://foo.com/,10,,\n'
+        'https://bar.com/,30,bar,conditional\n',
+        encoding='utf-8',
+    )
+
+    websites = load_targets(TargetsSettings(source=TargetsSource.CSV, path=str(path), batch_size=1))
+
+    assert [str(website.url) for website in websites] == ['https://foo.com/', 'https://bar.com/']
+    assert [website.period for website in websites] == [10, 30]
+    # empty cells get the defaults
+    assert websites[0].regexp == ''
+    assert websites[0].check_mode == CheckMode.GET
+    assert websites[1].check_mode == CheckMode.CONDITIONAL
+
+
+def test_jsonl_targets(tmp_path: pathlib.Path):
+    path = tmp_path / 'targets.jsonl'
+    rows = [{'url': f'https://foo.com/{i}', 'period': 10, 'regexp': 'foo'} for i in range(5)]
+    path.write_text('\n'.join(json.dumps(row) for row in rows) + '\n\n', encoding='utf-8')
+
+    websites = load_targets(TargetsSettings(source=TargetsSource.JSONL, path=str(path), batch_size=2))
+
+    assert [str(website.url) for website in websites] == [row['url'] for row in rows]
+    assert all(website.regexp == 'foo' for website in websites)
+
+
+@pytest.mark.parametrize('row, expected', [
+    pytest.param({'url': 'https://foo.com/', 'period': 1}, 'Target 4.period:', id='field'),
+    pytest.param({'url': 'https://foo.com/', 'period': 10, 'check_mode': 'head', 'regexp': 'foo'}, 'Target 4:',
+                 id='whole_website'),
+])
+def test_invalid_target_is_reported_by_row(row: dict, expected: str):
+    rows = [{'url': f'https://foo.com/{i}', 'period': 10} for i in range(3)] + [row]
+    with pytest.raises(ValueError, match=expected):
+        list(validate(rows, batch_size=2))
+
+
+def test_csv_reads_lazily(tmp_path: pathlib.Path):
+    path = tmp_path / 'targets.csv'
+    path.write_text('url,period\n' + ''.join(f'https://foo.com/{i},10\n' for i in range(3)), encoding='utf-8')
+
+    rows = read_csv(str(path))
+
+    assert next(rows) == {'url': 'https://foo.com/0', 'period': '10'}
+
+
+def test_file_targets_need_path():
+    with pytest.raises(pydantic.ValidationError):
+        TargetsSettings(source=TargetsSource.CSV)
+    assert TargetsSettings(source=TargetsSource.POSTGRES).table == 'targets'
@@ -0,0 +1,36 @@
+# When testing, we can do all sort of weird stuff
+# pylint: disable = protected-access
+import pytest
+
+from monitor.fetch import PhaseTimer
+
+
+def make_timer(**marks: float) -> PhaseTimer:
+    timer = PhaseTimer()
+    timer._marks.update(marks)
+    return timer
+
+
+def test_new_connection_phases():
+    timer = make_timer(
+        request_start=0.0, connect_start=0.0, dns_start=0.1, dns_end=0.3, connect_end=0.6, headers=1.0, body_end=1.5
+    )
+    assert timer.dns_time == pytest.approx(0.3 - 0.1)
+    assert timer.connect_time == pytest.approx(0.6 - 0.2)
+    assert timer.ttfb == pytest.approx(1.0 - 0.6)
+    assert timer.body_time == pytest.approx(1.5 - 1.0)
+
+
+def test_reused_connection_phases():
+    timer = make_timer(request_start=0.0, headers=1.0, body_end=1.5)
+    assert timer.dns_time is None
+    assert timer.connect_time is None
+    assert timer.ttfb == 1.0
+    assert timer.body_time == 0.5
+
+
+def test_failed_request_phases():
+    timer = make_timer(request_start=0.0, connect_start=0.0)
+    assert timer.connect_time is None
+    assert timer.ttfb is None
+    assert timer.body_time is None
@@ -3,12 +3,23 @@
 import asyncio
 import socket
 import threading
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
 
 import pytest
 
-from monitor.serializers import WebsiteSetting, MonitoringResult
+from monitor.fetch import BreakerState, SessionPool
+from monitor.rollup import Rollup
+from monitor.serializers import (
+    WebsiteSetting,
+    MonitoringResult,
+    RollupSettings,
+    CheckMode,
+    BreakerSettings,
+    HttpSettings,
+)
 from monitor.worker import WebsiteWorker
+from monitor.worker.website_worker import DRAIN_MAX_BYTES
 
 
 class CallCounter:
@@ -24,10 +35,15 @@ class CallCounter:
 
 server_call_counter = CallCounter()
 
+LARGE_BODY_SIZE = 256 * 1024
+ETAG = '"dummy"'
+
 
 class MockServerRequestHandler(BaseHTTPRequestHandler):
 
+    # counted before answering, responses without a body may reach the client before the handler returns
     def do_GET(self):  # pylint: disable = invalid-name
+        server_call_counter.increase()
         if self.path == '/ok':
             self.send_response(200)
             self.end_headers()
@@ -35,13 +51,56 @@ class MockServerRequestHandler(BaseHTTPRequestHandler):
             self.send_response(200)
             self.end_headers()
             self.wfile.write(b'Dummy data')
+        elif self.path == '/large':
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b'x' * LARGE_BODY_SIZE + b'Dummy data')
         elif self.path == '/not_found':
             self.send_response(404)
             self.end_headers()
         elif self.path == '/server_error':
             self.send_response(500)
             self.end_headers()
+        elif self.path == '/etag':
+            if self.headers.get('If-None-Match') == ETAG:
+                self.send_response(304)
+                self.end_headers()
+            else:
+                self.send_response(200)
+                self.send_header('ETag', ETAG)
+                self.end_headers()
+                self.wfile.write(b'Dummy data')
+
+    def do_HEAD(self):  # pylint: disable = invalid-name
         server_call_counter.increase()
+        self.send_response(200)
+        self.end_headers()
+
+
+# client ports of the connections to the keep-alive server
+keep_alive_connections: set[int] = set()
+
+
+class KeepAliveRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1, so the client may send more requests over the same connection
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):  # pylint: disable = invalid-name
+        keep_alive_connections.add(self.client_address[1])
+        size = DRAIN_MAX_BYTES * 2 if self.path == '/large' else DRAIN_MAX_BYTES // 2
+        body = b'Dummy data' + b'x' * size
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        # rest of the body comes later, so it isn't there already when the client is done with the response
+        self.wfile.write(body[:1024])
+        self.wfile.flush()
+        time.sleep(0.05)
+        try:
+            self.wfile.write(body[1024:])
+        except ConnectionError:
+            # client doesn't wait for large bodies
+            return
 
 
 def get_free_port():
@@ -291,3 +350,223 @@ class TestMockServer:
             assert result.status_code == 500
             queue.task_done()
         await queue.join()
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('max_body_bytes,regexp_found', (
+            pytest.param(LARGE_BODY_SIZE * 2, True, id='whole_body_read'),
+            pytest.param(LARGE_BODY_SIZE // 2, False, id='body_cut'),
+    ))
+    async def test_worker_max_body_bytes(self, max_body_bytes: int, regexp_found: bool):
+        settings = WebsiteSetting(
+            url=f'http://localhost:{self.mock_server_port}/large',
+            period=5.0,
+            regexp='Dummy data',
+            max_body_bytes=max_body_bytes,
+        )
+        queue = asyncio.Queue()
+        worker = WebsiteWorker(settings=settings, queue=queue)
+
+        await worker.task()
+        await worker._session_pool.close()
+
+        assert server_call_counter.value == 1
+        server_call_counter.reset()
+
+        result: MonitoringResult = queue.get_nowait()
+        assert result.status_code == 200
+        assert result.regexp_match is regexp_found
+
+    @pytest.mark.asyncio
+    async def test_worker_measures_phases(self):
+        settings = WebsiteSetting(
+            url=f'http://localhost:{self.mock_server_port}/regexp',
+            period=5.0,
+            regexp='Dummy data',
+        )
+        queue = asyncio.Queue()
+        worker = WebsiteWorker(settings=settings, queue=queue)
+
+        await worker.task()
+        await worker._session_pool.close()
+        server_call_counter.reset()
+
+        result: MonitoringResult = queue.get_nowait()
+        # fresh session, so the connection is new and the host isn't cached yet
+        assert result.dns_time is not None
+        assert result.connect_time is not None
+        assert result.ttfb is not None
+        assert result.body_time is not None
+        phases = result.dns_time + result.connect_time + result.ttfb + result.body_time
+        assert phases <= result.response_time
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('raw_rows', (True, False))
+    async def test_worker_feeds_rollup(self, raw_rows: bool):
+        settings = WebsiteSetting(url=f'http://localhost:{self.mock_server_port}', period=5.0)
+        queue = asyncio.Queue()
+        rollup = Rollup(RollupSettings(window=60, grace=0, raw_rows=raw_rows))
+        worker = WebsiteWorker(settings=settings, queue=queue, rollup=rollup)
+
+        await worker.task()
+        await worker._session_pool.close()
+        server_call_counter.reset()
+
+        assert queue.qsize() == (1 if raw_rows else 0)
+        results = rollup.pop_closed(now=float('inf'))
+        assert len(results) == 1
+        assert results[0].checks == 1
+
+    @pytest.mark.asyncio
+    async def test_worker_head_check(self):
+        settings = WebsiteSetting(
+            url=f'http://localhost:{self.mock_server_port}/ok',
+            period=5.0,
+            check_mode=CheckMode.HEAD,
+        )
+        queue = asyncio.Queue()
+        worker = WebsiteWorker(settings=settings, queue=queue)
+
+        await worker.task()
+        await worker._session_pool.close()
+
+        assert server_call_counter.value == 1
+        server_call_counter.reset()
+
+        result: MonitoringResult = queue.get_nowait()
+        assert result.status_code == 200
+        assert result.regexp_match is None
+
+    @pytest.mark.asyncio
+    async def test_worker_conditional_check_reuses_match(self):
+        settings = WebsiteSetting(
+            url=f'http://localhost:{self.mock_server_port}/etag',
+            period=5.0,
+            regexp='Dummy data',
+            check_mode=CheckMode.CONDITIONAL,
+        )
+        queue = asyncio.Queue()
+        worker = WebsiteWorker(settings=settings, queue=queue)
+
+        await worker.task()
+        await worker.task()
+        await worker._session_pool.close()
+
+        assert server_call_counter.value == 2
+        server_call_counter.reset()
+
+        full: MonitoringResult = queue.get_nowait()
+        assert full.status_code == 200
+        assert full.regexp_match is True
+        not_modified: MonitoringResult = queue.get_nowait()
+        assert not_modified.status_code == 304
+        assert not_modified.regexp_match is True
+
+    @pytest.mark.asyncio
+    async def test_worker_conditional_check_refetches_for_new_follower(self):
+        url = f'http://localhost:{self.mock_server_port}/etag'
+        queue = asyncio.Queue()
+        leader = WebsiteWorker(
+            settings=WebsiteSetting(url=url, period=5.0, check_mode=CheckMode.CONDITIONAL), queue=queue
+        )
+        await leader.task()
+        # e.g. added by a reload, it has no result of its own to reuse on 304
+        follower = WebsiteWorker(
+            settings=WebsiteSetting(url=url, period=5.0, regexp='Dummy', check_mode=CheckMode.CONDITIONAL),
+            queue=queue,
+        )
+        leader.set_followers([follower])
+        await leader.task()
+        leader._followers[follower] = 0.0
+        await leader.task()
+        await leader._session_pool.close()
+        server_call_counter.reset()
+
+        results = [queue.get_nowait() for _ in range(queue.qsize())]
+        assert [(result.status_code, result.regexp_match) for result in results] == [
+            (200, None), (200, None), (200, True), (304, None), (304, True),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_worker_fetches_for_followers(self):
+        queue = asyncio.Queue()
+        url = f'http://localhost:{self.mock_server_port}/regexp'
+        leader = WebsiteWorker(settings=WebsiteSetting(url=url, period=5.0, regexp='Dummy'), queue=queue)
+        followers = [
+            WebsiteWorker(settings=WebsiteSetting(url=url, period=5.0, regexp='data'), queue=queue),
+            WebsiteWorker(settings=WebsiteSetting(url=url, period=5.0, regexp='missing'), queue=queue),
+            # not due on the next run of the leader
+            WebsiteWorker(settings=WebsiteSetting(url=url, period=300.0), queue=queue),
+        ]
+        leader.set_followers(followers)
+        leader._followers[followers[2]] = float('inf')
+
+        await leader.task()
+        await leader._session_pool.close()
+
+        # one request for all the due checks
+        assert server_call_counter.value == 1
+        server_call_counter.reset()
+
+        results = [queue.get_nowait() for _ in range(queue.qsize())]
+        assert [result.regexp_match for result in results] == [True, True, False]
+        assert len({result.response_time for result in results}) == 1
+
+    @pytest.mark.asyncio
+    async def test_worker_timeout_opens_circuit(self):
+        # accepts connections, but never answers
+        silent_server = socket.socket(socket.AF_INET, type=socket.SOCK_STREAM)
+        silent_server.bind(('localhost', 0))
+        silent_server.listen()
+        _, port = silent_server.getsockname()
+
+        queue = asyncio.Queue()
+        settings = WebsiteSetting(url=f'http://localhost:{port}/', period=10.0, timeout=0.2)
+        worker = WebsiteWorker(settings=settings, queue=queue, breaker=BreakerSettings(failures=1, backoff=3))
+        try:
+            await asyncio.wait_for(worker.task(), timeout=1)
+        finally:
+            await worker._session_pool.close()
+            silent_server.close()
+
+        assert queue.get_nowait().status_code == 500
+        assert worker._breaker.state == BreakerState.OPEN
+        assert worker.period == 30.0
+
+        # website is back, so is its period
+        worker._url = f'http://localhost:{self.mock_server_port}/ok'
+        worker._session_pool = SessionPool(HttpSettings())
+        await worker.task()
+        await worker._session_pool.close()
+        server_call_counter.reset()
+
+        assert queue.get_nowait().status_code == 200
+        assert worker._breaker.state == BreakerState.CLOSED
+        assert worker.period == 10.0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('path,regexp,connections', (
+        pytest.param('/small', '', 1, id='no_regexp'),
+        pytest.param('/small', 'Dummy', 1, id='body_cut_by_regexp_check'),
+        pytest.param('/large', '', 2, id='body_over_drain_limit'),
+))
+async def test_worker_reuses_connection(path: str, regexp: str, connections: int):
+    keep_alive_connections.clear()
+    server = ThreadingHTTPServer(('localhost', 0), KeepAliveRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _, port = server.server_address
+    # regexp check stops reading the body after the first chunk
+    settings = WebsiteSetting(url=f'http://localhost:{port}{path}', period=5.0, regexp=regexp, max_body_bytes=1024)
+    queue = asyncio.Queue()
+    worker = WebsiteWorker(settings=settings, queue=queue)
+
+    try:
+        await worker.task()
+        await worker.task()
+    finally:
+        await worker._session_pool.close()
+        server.shutdown()
+        server.server_close()
+
+    assert len(keep_alive_connections) == connections
+    assert [queue.get_nowait().status_code for _ in range(2)] == [200, 200]